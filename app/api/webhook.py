@@ -1,13 +1,15 @@
 from datetime import datetime
 import json
 from typing import List, Optional
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Body
 from loguru import logger
 from pydantic import BaseModel, Field
 
 from config import AGENT_ENGAGED_TAG
 from integrations.lead_connector.leadconnector import LeadConnector
 from services.lead_connector_messaging_service import LeadConnectorMessageingService
+from utils.metrics import WEBHOOK_EVENTS, WEBHOOK_EVENTS_IN_PROGRESS
+from utils.tracing import start_span
 
 
 class LeadConnectorWHTypeInboundMessage(BaseModel):
@@ -54,8 +56,7 @@ def is_lc_location_accepted(location_id: str) -> bool:
 
 
 @router.post("/leadconnector")
-def leadconnector(request: Request):
-    request = request.json()
+def leadconnector(request: dict = Body(...)):
     logger.info(f"webhooked by leadconnector location id: {request['locationId']}")
 
     # if not is_lc_location_accepted(request["locationId"]):
@@ -68,34 +69,45 @@ def leadconnector(request: Request):
     request_type = request["type"]
     logger.info(f"Leadconnector webhook type {request_type} recieved")
 
+    WEBHOOK_EVENTS.labels(type=request_type).inc()
+    with WEBHOOK_EVENTS_IN_PROGRESS.labels(type=request_type).track_inprogress():
+        handle_leadconnector_event(request)
+
+
+def handle_leadconnector_event(request: dict):
+    request_type = request["type"]
+
     if request_type == "ContactTagUpdate":
         logger.info(json.dumps(request, indent=4))      
 
     if request_type == "OutboundMessage":
-        leadconnector = LeadConnector(location_id=request["locationId"])
-        contact_id = request["contactId"]
-        message_type = request["messageType"]
+        with start_span("webhook.outbound_message", contact_id=request["contactId"]):
+            leadconnector = LeadConnector(location_id=request["locationId"])
+            contact_id = request["contactId"]
+            message_type = request["messageType"]
 
-        if message_type == "SMS": 
-            # this is so that we know that agnet responded the contact,
-            # we will use this tag later to nor respond to the contact
-            leadconnector.add_tag_to_contact(contact_id, AGENT_ENGAGED_TAG)
+            if message_type == "SMS": 
+                # this is so that we know that agnet responded the contact,
+                # we will use this tag later to nor respond to the contact
+                leadconnector.add_tag_to_contact(contact_id, AGENT_ENGAGED_TAG)
 
     if request_type == "InboundMessage":
         logger.info(json.dumps(request, indent=4))
 
         wh_message = LeadConnectorWHTypeInboundMessage(**request)
-        lc_messaging_service = LeadConnectorMessageingService(
-            location_id=wh_message.locationId
-        )
-
-        # if the incomming message is a special code, process it and return, dont go further
-        if lc_messaging_service.process_special_codes(
-            message=wh_message.body, conversation_id=wh_message.conversationId
-        ):
-            return
-        # if the message is not a special code, respond to the message
-        lc_messaging_service.process_to_inbound_message(
-            contact_id=wh_message.contactId,
-            conversation_id=wh_message.conversationId,
-        )
+        with start_span("webhook.inbound_message", contact_id=wh_message.contactId):
+            with start_span("messaging_service_init"):
+                lc_messaging_service = LeadConnectorMessageingService(
+                    location_id=wh_message.locationId
+                )
+
+            # if the incomming message is a special code, process it and return, dont go further
+            if lc_messaging_service.process_special_codes(
+                message=wh_message.body, conversation_id=wh_message.conversationId
+            ):
+                return
+            # if the message is not a special code, respond to the message
+            lc_messaging_service.process_to_inbound_message(
+                contact_id=wh_message.contactId,
+                conversation_id=wh_message.conversationId,
+            )
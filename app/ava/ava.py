@@ -5,16 +5,26 @@ import json
 
 from llama_index.core.base.llms.types import ChatMessage, ChatResponse
 from llama_index.core.llms.llm import LLM
-from llama_index.core.postprocessor import SimilarityPostprocessor
 from dotenv import load_dotenv
 from loguru import logger
 from pydantic import BaseModel, Field
 from ava.llm.llama_index_llms import get_azure_openai_client
+from ava.objection_cache import ObjectionCache, get_objection_cache
+from ava.objection_classifier import ObjectionClassifier, get_objection_classifier
 from ava.retriever.base_retriever import BaseRetriever
-from ava.retriever.obj_handelling_retriever import ObjectionHandelingRetriever
+from ava.retriever.knowledge_base_retriever import get_knowledge_base_retriever
+from ava.retriever.obj_handelling_retriever import get_objection_handelling_retriever
+from ava.retriever.postprocessing import (
+    PostprocessingConfig,
+    get_objection_postprocessing_config,
+    postprocess_nodes,
+    truncate_to_token_budget,
+)
 from services.azure_openai_service import get_azureopenai_service
-
-azure_llm = get_azure_openai_client()
+from utils.history import format_history
+from utils.metrics import OBJECTION_CHECKS, RETRIEVER_NODES, RETRIEVER_QUERIES, record_openai_usage
+from utils.tokens import count_messages_tokens, count_tokens, get_turn_budget
+from utils.tracing import start_span, traced
 
 
 def get_system_message_template(file: str = "prompt/main_v1.txt"):
@@ -35,7 +45,16 @@ def str_to_bool(string_value: str):
         raise ValueError(f"Cannot convert {string_value} to boolean")
 
 
-def is_message_an_objection(messages: List[ChatMessage], llm: LLM) -> bool:
+# the objection check's own instruction and its JSON answer
+OBJECTION_CHECK_PROMPT_TOKENS = 40
+
+
+def is_message_an_objection(
+    messages: List[ChatMessage],
+    llm: LLM,
+    cache: Optional[ObjectionCache] = None,
+    classifier: Optional[ObjectionClassifier] = None,
+) -> bool:
 
     if not isinstance(llm, LLM):
         logger.error(f"llm must be an instance of LLM, got {type(llm)}")
@@ -49,6 +68,26 @@ def is_message_an_objection(messages: List[ChatMessage], llm: LLM) -> bool:
         logger.error("messages must be a list of ChatMessage")
         raise ValueError("messages must be a list of ChatMessage")
 
+    # results are cached by the lead's last message, AVA's own follow ups are always checked by the LLM
+    lead_message = messages[-1].content if len(messages) > 0 and messages[-1].role == "user" else None
+    if cache is not None and lead_message:
+        is_objection, source = cache.lookup_with_source(lead_message)
+        if is_objection is not None:
+            OBJECTION_CHECKS.labels(source=source).inc()
+            logger.info(f"Is message an objection (cached, {source}): {is_objection}")
+            return is_objection
+
+    # the local classifier works on the embedding the cache computed for the lookup, if there is a cache
+    embedding = None
+    if classifier is not None and lead_message:
+        embedding = cache.get_embedding(lead_message) if cache is not None else classifier.get_embedding(lead_message)
+        if embedding is not None:
+            is_objection, confidence = classifier.classify(embedding)
+            if is_objection is not None:
+                OBJECTION_CHECKS.labels(source="classifier").inc()
+                logger.info(f"Is message an objection (classifier, {confidence:.2f}): {is_objection}")
+                return is_objection
+
     messages_for_obj_check = [
         ChatMessage(
             role="system",
@@ -58,9 +97,17 @@ def is_message_an_objection(messages: List[ChatMessage], llm: LLM) -> bool:
 
     # get the last 3 messages from the messages
     messages_for_obj_check += messages[-min(3, len(messages)) :]
-    obj_resp = llm.chat(messages_for_obj_check, response_format={"type": "json_object"})
+    with start_span("llm.objection"):
+        obj_resp = llm.chat(messages_for_obj_check, response_format={"type": "json_object"})
+    record_openai_usage("objection", getattr(llm, "model", None), getattr(obj_resp.raw, "usage", None))
     resp_json = json.loads(obj_resp.message.content)
-    is_objection = resp_json.get("is_objection", False)
+    is_objection = bool(resp_json.get("is_objection", False))
+    OBJECTION_CHECKS.labels(source="llm").inc()
+    if cache is not None and lead_message:
+        cache.add(lead_message, is_objection, embedding=embedding)
+    if classifier is not None and embedding is not None:
+        # only LLM answers are used for training, never the classifier's own
+        classifier.add_label(embedding, is_objection)
 
     # obj_resp_content = str(obj_resp.message.content).lower().strip()
     # logger.debug(f"obj resp content: {obj_resp_content}")
@@ -76,50 +123,114 @@ def is_message_an_objection(messages: List[ChatMessage], llm: LLM) -> bool:
     return is_objection
 
 
-def add_obj_handelling_examples_to_system_messsage(
-    retriever: BaseRetriever, system_message: str, user_message: ChatMessage
-) -> ChatMessage:
+def can_afford_objection_check(messages: List[ChatMessage], system_message: str) -> bool:
+    """
+    Whether the turn's token budget still covers the objection check on top of the main completion.
 
-    # get objection handelling response
-    objection_handelling_resp = retriever.retrieve(user_message.content)
-    # postprecessing nodes
+    The objection check is optional, when the budget is tight it is skipped so the
+    main completion still fits.
 
-    processors = [
-        SimilarityPostprocessor(similarity_cutoff=0.5),
-    ]
+    Args:
+        messages (List[ChatMessage]): The conversation sent with the main completion.
+        system_message (str): The system message of the main completion.
 
-    filtered_nodes = []
-    for node in objection_handelling_resp:
-        logger.debug(node)
+    Returns:
+        bool: True if there is no budget or the budget covers both calls.
+    """
+    budget = get_turn_budget()
+    if budget is None:
+        return True
 
-    for processor in processors:
-        logger.debug(f"Postprocessing with {processor.__class__.__name__}")
-        filtered_nodes = processor.postprocess_nodes(
-            objection_handelling_resp, query_str=user_message.content
-        )
-        logger.debug(
-            f"Postprocessing dropped {len(objection_handelling_resp) - len(filtered_nodes)} nodes"
-        )
+    chat_tokens = count_tokens(system_message) + count_messages_tokens(messages)
+    objection_tokens = count_messages_tokens(messages[-min(3, len(messages)) :]) + OBJECTION_CHECK_PROMPT_TOKENS
+    if budget.can_afford(chat_tokens + objection_tokens):
+        return True
+    budget.skip("objection")
+    return False
+
+
+def add_obj_handelling_examples_to_system_messsage(
+    retriever: BaseRetriever,
+    system_message: str,
+    user_message: ChatMessage,
+    config: Optional[PostprocessingConfig] = None,
+) -> str:
 
-    if len(filtered_nodes) > 0:
+    config = config or get_objection_postprocessing_config()
+
+    # get objection handelling response
+    with start_span("retriever.objection") as span:
+        objection_handelling_resp = retriever.retrieve(user_message.content)
+        span.set_attribute("nodes", len(objection_handelling_resp))
+    RETRIEVER_QUERIES.labels(retriever="objection").inc()
+    RETRIEVER_NODES.labels(retriever="objection", stage="retrieved").inc(len(objection_handelling_resp))
+
+    # postprecessing nodes: similarity cutoff, diversity and the token budget of the examples
+    filtered_nodes = postprocess_nodes(objection_handelling_resp, config)
+    examples = truncate_to_token_budget(
+        [
+            f"Objection {i+1}: {node.text}\nRebuttal:{node.metadata['rebuttal']}\n\n"
+            for i, node in enumerate(filtered_nodes)
+        ],
+        config.max_tokens,
+    )
+    logger.debug(f"Postprocessing kept {len(examples)} of {len(objection_handelling_resp)} nodes")
+
+    RETRIEVER_NODES.labels(retriever="objection", stage="kept").inc(len(examples))
+
+    if len(examples) > 0:
         template = "**Objection Handelling Examples**: \n{objections}"
-        obj_str = ""
-        for i, obj in enumerate(objection_handelling_resp):
-            obj_str += (
-                f"Objection {i+1}: {obj.text}\nRebuttal:{obj.metadata['rebuttal']}\n\n"
-            )
+        obj_str = "".join(examples)
 
         logger.debug(template.format(objections=obj_str))
         system_message = system_message + "\n\n" + template.format(objections=obj_str)
 
     return system_message
 
+def add_domain_knowledge_to_system_message(
+    retriever: BaseRetriever, system_message: str, user_message: ChatMessage
+) -> str:
+    """
+    Append the knowledge base chunks relevant to the lead's message to the system message.
+
+    Args:
+        retriever (BaseRetriever): The knowledge base retriever.
+        system_message (str): The system message.
+        user_message (ChatMessage): The lead's message.
+
+    Returns:
+        str: The system message, unchanged if nothing relevant was found.
+    """
+    with start_span("retriever.knowledge_base") as span:
+        nodes = retriever.retrieve(user_message.content)
+        span.set_attribute("nodes", len(nodes))
+    RETRIEVER_QUERIES.labels(retriever="knowledge_base").inc()
+    RETRIEVER_NODES.labels(retriever="knowledge_base", stage="retrieved").inc(len(nodes))
+
+    chunks = truncate_to_token_budget(
+        [node.node.get_content() for node in nodes], int(os.getenv("KNOWLEDGE_BASE_MAX_TOKENS", 600))
+    )
+    RETRIEVER_NODES.labels(retriever="knowledge_base", stage="kept").inc(len(chunks))
+    if len(chunks) == 0:
+        return system_message
+
+    return (
+        system_message
+        + "\n\n**Domain Knowledge**, use it to answer factual questions:\n"
+        + "\n\n".join(chunks)
+    )
+
+
 class Ava:
     def __init__(self):
         self.llm: LLM = get_azure_openai_client()
-        self.objection_handelling_retriver = ObjectionHandelingRetriever(
-            similarity_top_k=2
+        # more candidates than examples, so post-processing can pick diverse ones
+        self.objection_handelling_retriver = get_objection_handelling_retriever(
+            similarity_top_k=get_objection_postprocessing_config().similarity_top_k
         )
+        self.objection_cache = get_objection_cache()
+        self.objection_classifier = get_objection_classifier()
+        self.knowledge_base_retriever = get_knowledge_base_retriever()
 
     def _get_chat_response(self, messages: List[ChatMessage]) -> ChatResponse:
         return self.llm.chat(messages)
@@ -142,10 +253,12 @@ class Ava:
             logger.error("message_history must be a list of ChatMessage")
             raise ValueError("message_history must be a list of ChatMessage")
 
+    @traced("ava.respond")
     def respond(
         self,
         conversation_messages: List[ChatMessage] = list(),
         system_message: Optional[str] = None,
+        summary: Optional[str] = None,
     ) -> ChatResponse:
 
         # validation -------------
@@ -181,7 +294,7 @@ class Ava:
                 # followup mode
                 # get last 5 messages from the conversation history, there might be less than 5 messages, so get all of them.
                 conversation_messages = conversation_messages[-min(5, len(conversation_messages)) :]
-                conversation_messages_str = "\n".join([f"{message.role}:{message.content}\n" for message in conversation_messages])
+                conversation_messages_str = format_history(conversation_messages, summary=summary)
 
                 system_message = (
                     system_message
@@ -191,8 +304,31 @@ class Ava:
                 )
                 conversation_messages = [] # we dont want to send the conversation history again, as it is in system message already.
 
+            elif summary is not None:
+                # the messages before conversation_messages are only sent as their summary
+                system_message = (
+                    system_message
+                    + "\n\nSummary of your earlier conversation with the lead:\n"
+                    + summary
+                )
+
+            # factual questions of the lead are answered from the knowledge base, follow ups have no question
+            if (
+                self.knowledge_base_retriever is not None
+                and len(conversation_messages) > 0
+                and conversation_messages[-1].role == "user"
+            ):
+                system_message = add_domain_knowledge_to_system_message(
+                    self.knowledge_base_retriever, system_message, conversation_messages[-1]
+                )
+
             # objection are handelled seperately by ava, here system message is appended with sample objection handeling QA, not sure if this is the right way to go about it, but will see.
-            if is_message_an_objection(messages=conversation_messages, llm=self.llm):
+            if can_afford_objection_check(conversation_messages, system_message) and is_message_an_objection(
+                messages=conversation_messages,
+                llm=self.llm,
+                cache=self.objection_cache,
+                classifier=self.objection_classifier,
+            ):
                 user_message = (
                     conversation_messages[-1]
                     if conversation_messages[-1].role == "user"
@@ -234,14 +370,16 @@ class Ava:
         try:
             client = get_azureopenai_service().get_client()
 
-            chat_resp = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": message.role, "content": message.content}
-                    for message in messages
-                ],
-                response_format={"type": "json_object"}
-            )
+            with start_span("llm.chat"):
+                chat_resp = client.chat.completions.create(
+                    model="gpt-4o",
+                    messages=[
+                        {"role": message.role, "content": message.content}
+                        for message in messages
+                    ],
+                    response_format={"type": "json_object"}
+                )
+            record_openai_usage("chat", "gpt-4o", chat_resp.usage)
 
             response = json.loads(chat_resp.choices[0].message.content)
 
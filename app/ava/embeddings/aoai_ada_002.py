@@ -1,18 +1,70 @@
 import os
+from typing import Any, Dict, List, Optional
+from llama_index.core.callbacks import CallbackManager, CBEventType, EventPayload
+from llama_index.core.callbacks.base_handler import BaseCallbackHandler
 from llama_index.embeddings.azure_openai import AzureOpenAIEmbedding
 from loguru import logger
 
+from ava.embeddings.ingestion import get_embedding_batch_size
+from utils.metrics import EMBEDDING_INPUTS, record_openai_usage
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+
+
+class EmbeddingMetricsHandler(BaseCallbackHandler):
+    """Counts embedding requests and embedded texts, llama_index emits one embedding event per request."""
+
+    def __init__(self, model: str = EMBEDDING_MODEL):
+        super().__init__(event_starts_to_ignore=[], event_ends_to_ignore=[])
+        self.model = model
+
+    def on_event_start(
+        self,
+        event_type: CBEventType,
+        payload: Optional[Dict[str, Any]] = None,
+        event_id: str = "",
+        parent_id: str = "",
+        **kwargs: Any,
+    ) -> str:
+        return event_id
+
+    def on_event_end(
+        self,
+        event_type: CBEventType,
+        payload: Optional[Dict[str, Any]] = None,
+        event_id: str = "",
+        **kwargs: Any,
+    ) -> None:
+        if event_type != CBEventType.EMBEDDING or payload is None:
+            return
+        record_openai_usage("embedding", self.model)
+        EMBEDDING_INPUTS.labels(model=self.model).inc(len(payload.get(EventPayload.CHUNKS, [])))
+
+    def start_trace(self, trace_id: Optional[str] = None) -> None:
+        pass
+
+    def end_trace(
+        self,
+        trace_id: Optional[str] = None,
+        trace_map: Optional[Dict[str, List[str]]] = None,
+    ) -> None:
+        pass
+
+
 def get_embedding_model():
     api_key = os.getenv("AZURE_OPENAI_API_KEY")
     azure_endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
     logger.info(f"{api_key} {azure_endpoint}")
 
     return AzureOpenAIEmbedding(
-        model="text-embedding-ada-002",
-        deployment_name="text-embedding-ada-002",
+        model=EMBEDDING_MODEL,
+        deployment_name=EMBEDDING_MODEL,
         api_key=api_key,
         azure_endpoint=azure_endpoint,
         api_version="2024-02-01",
+        # the default of 10 texts per request makes building an index needlessly chatty
+        embed_batch_size=get_embedding_batch_size(),
+        callback_manager=CallbackManager([EmbeddingMetricsHandler()]),
     )
 
 if __name__ == "__main__":
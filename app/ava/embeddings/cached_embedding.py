@@ -0,0 +1,171 @@
+import asyncio
+import os
+from functools import lru_cache
+from typing import Any, List, Optional
+
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+from loguru import logger
+
+from ava.embeddings.aoai_ada_002 import get_embedding_model
+from ava.embeddings.local_embedding import get_local_embedding_model
+from config import LOCAL_STORE_QUERY_EMBEDDING_NAMESPACE
+from utils.cache import MISSING, TTLCache
+from utils.local_store import LocalStore, get_local_store
+from utils.text import normalize_text
+
+EMBEDDING_PROVIDERS = ("azure", "local")
+DEFAULT_QUERY_EMBEDDING_CACHE_SIZE = 2048
+DEFAULT_QUERY_EMBEDDING_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+
+
+def is_query_embedding_cache_persisted() -> bool:
+    return os.getenv("QUERY_EMBEDDING_CACHE_PERSIST", "false").lower() in ["true", "1", "yes"]
+
+
+def get_query_embedding_cache_ttl() -> float:
+    return float(
+        os.getenv("QUERY_EMBEDDING_CACHE_TTL_SECONDS", DEFAULT_QUERY_EMBEDDING_CACHE_TTL_SECONDS)
+    )
+
+
+class CachedQueryEmbedding(BaseEmbedding):
+    """
+    Wraps an embedding model, caching query embeddings by their normalized text.
+
+    Lead messages recur across leads ("too expensive", "not interested"), so most
+    query embeddings are served from an in-memory LRU cache, optionally backed by
+    the local store so they survive restarts. Text (node) embeddings are passed
+    through uncached, they are only computed when an index is built.
+
+    The wrapper has no callbacks of its own, embedding requests are counted by the
+    wrapped model, so cache hits do not show up as requests.
+
+    Args:
+        embed_model (BaseEmbedding): The model that embeds cache misses.
+        maxsize (int): Maximum number of cached query embeddings.
+        ttl (Optional[float]): Time to live of a cached embedding in seconds.
+        store (Optional[LocalStore]): Where embeddings are persisted, None keeps them in memory only.
+        cache_name (str): Name of the in-memory cache in metrics.
+    """
+
+    embed_model: BaseEmbedding
+    _cache: TTLCache = PrivateAttr()
+    _ttl: Optional[float] = PrivateAttr()
+    _store: Optional[LocalStore] = PrivateAttr()
+
+    def __init__(
+        self,
+        embed_model: BaseEmbedding,
+        maxsize: int = DEFAULT_QUERY_EMBEDDING_CACHE_SIZE,
+        ttl: Optional[float] = DEFAULT_QUERY_EMBEDDING_CACHE_TTL_SECONDS,
+        store: Optional[LocalStore] = None,
+        cache_name: str = "query_embedding",
+        **kwargs: Any,
+    ):
+        super().__init__(
+            embed_model=embed_model,
+            model_name=embed_model.model_name,
+            embed_batch_size=embed_model.embed_batch_size,
+            **kwargs,
+        )
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl, name=cache_name)
+        self._ttl = ttl
+        self._store = store
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedQueryEmbedding"
+
+    def _get_store_key(self, key: str) -> str:
+        # the store is shared by every embedding model
+        return f"{self.model_name}:{key}"
+
+    def _get_cached(self, key: str) -> Optional[Embedding]:
+        embedding = self._cache.get(key)
+        if embedding is not MISSING:
+            return embedding
+        if self._store is not None:
+            embedding = self._store.get(
+                LOCAL_STORE_QUERY_EMBEDDING_NAMESPACE, self._get_store_key(key), max_age=self._ttl
+            )
+            if embedding is not None:
+                self._cache.set(key, embedding)
+                return embedding
+        return None
+
+    def _set_cached(self, key: str, embedding: Embedding) -> None:
+        self._cache.set(key, embedding)
+        if self._store is not None:
+            self._store.set(LOCAL_STORE_QUERY_EMBEDDING_NAMESPACE, self._get_store_key(key), embedding)
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        key = normalize_text(query)
+        embedding = self._get_cached(key)
+        if embedding is None:
+            logger.debug(f"Query embedding cache miss: {key}")
+            embedding = self.embed_model.get_query_embedding(query)
+            self._set_cached(key, embedding)
+        return embedding
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        key = normalize_text(query)
+        embedding = self._get_cached(key)
+        if embedding is None:
+            embedding = await self.embed_model.aget_query_embedding(query)
+            self._set_cached(key, embedding)
+        return embedding
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self.embed_model.get_text_embedding(text)
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return await self.embed_model.aget_text_embedding(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return self.embed_model.get_text_embedding_batch(texts)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return await asyncio.gather(*[self.embed_model.aget_text_embedding(text) for text in texts])
+
+
+def get_embedding_provider(purpose: Optional[str] = None) -> str:
+    """
+    Embedding provider for a purpose, {PURPOSE}_EMBEDDING_PROVIDER if set, else EMBEDDING_PROVIDER.
+
+    Args:
+        purpose (Optional[str]): What the embeddings are for, e.g. objection or knowledge_base.
+
+    Returns:
+        str: azure (the default) or local.
+    """
+    provider = os.getenv(f"{purpose.upper()}_EMBEDDING_PROVIDER") if purpose else None
+    provider = (provider or os.getenv("EMBEDDING_PROVIDER", "azure")).lower()
+    if provider not in EMBEDDING_PROVIDERS:
+        logger.error(f"Unknown embedding provider {provider}")
+        raise ValueError(f"Unknown embedding provider {provider}, expected one of {EMBEDDING_PROVIDERS}")
+    return provider
+
+
+def get_cached_embedding_model(provider: Optional[str] = None) -> CachedQueryEmbedding:
+    """
+    Returns the process wide embedding model of a provider, shared by everything that embeds lead messages.
+
+    Args:
+        provider (Optional[str]): azure or local, EMBEDDING_PROVIDER if None.
+
+    Returns:
+        CachedQueryEmbedding: The model, caching query embeddings.
+    """
+    return _get_cached_embedding_model(provider or get_embedding_provider())
+
+
+@lru_cache()
+def _get_cached_embedding_model(provider: str) -> CachedQueryEmbedding:
+    embed_model = get_local_embedding_model() if provider == "local" else get_embedding_model()
+    return CachedQueryEmbedding(
+        embed_model=embed_model,
+        ttl=get_query_embedding_cache_ttl(),
+        store=get_local_store() if is_query_embedding_cache_persisted() else None,
+        cache_name="query_embedding" if provider == "azure" else f"query_embedding_{provider}",
+    )
@@ -0,0 +1,229 @@
+"""
+Batched, concurrent and resumable embedding of the nodes of an index.
+
+Node embeddings are stored in the local store as soon as their batch is done,
+keyed by the embedding model and the embedded text. Rebuilding an index only
+embeds rows that are new or changed, and a failed build resumes where it
+stopped instead of embedding everything again.
+
+Every build marks the embeddings it reused as recently written, and the store
+keeps the EMBEDDING_STORE_LIMIT most recent ones. Embeddings of edited rows and
+of a previous embedding model are dropped once newer ones push them out.
+"""
+import base64
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Sequence
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.schema import MetadataMode, TextNode
+from loguru import logger
+
+from config import LOCAL_STORE_EMBEDDING_NAMESPACE
+from utils.local_store import LocalStore
+from utils.tracing import start_span
+
+# ada-002 takes up to 2048 inputs per request, a few hundred keeps requests well under the token limit
+DEFAULT_EMBEDDING_BATCH_SIZE = 256
+DEFAULT_EMBEDDING_MAX_CONCURRENCY = 4
+DEFAULT_EMBEDDING_MAX_ATTEMPTS = 5
+# ~8KB per ada-002 embedding, well above the objection sheet and knowledge base together
+DEFAULT_EMBEDDING_STORE_LIMIT = 20000
+
+
+def get_embedding_batch_size() -> int:
+    return int(os.getenv("EMBEDDING_BATCH_SIZE", DEFAULT_EMBEDDING_BATCH_SIZE))
+
+
+def get_embedding_max_concurrency() -> int:
+    return int(os.getenv("EMBEDDING_MAX_CONCURRENCY", DEFAULT_EMBEDDING_MAX_CONCURRENCY))
+
+
+def get_embedding_store_limit() -> int:
+    return int(os.getenv("EMBEDDING_STORE_LIMIT", DEFAULT_EMBEDDING_STORE_LIMIT))
+
+
+def get_embedding_key(model_name: str, text: str) -> str:
+    return hashlib.sha256(f"{model_name}\n{text}".encode("utf-8")).hexdigest()
+
+
+def encode_embedding(embedding: Embedding) -> str:
+    # float32 bytes are a quarter of the size of the JSON list and load without parsing
+    return base64.b64encode(np.asarray(embedding, dtype=np.float32).tobytes()).decode("ascii")
+
+
+def decode_embedding(value: str) -> Embedding:
+    return np.frombuffer(base64.b64decode(value), dtype=np.float32).tolist()
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    return getattr(error, "status_code", None) == 429 or type(error).__name__ == "RateLimitError"
+
+
+class RateLimitGuard:
+    """
+    Pauses every worker after a rate limit error, instead of letting each one retry on its own.
+
+    Args:
+        initial_backoff (float): First pause in seconds, doubled on every consecutive rate limit error.
+        max_backoff (float): Longest pause in seconds.
+    """
+
+    def __init__(self, initial_backoff: float = 1.0, max_backoff: float = 60.0):
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self._backoff = initial_backoff
+        self._resume_at = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        with self._lock:
+            delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def rate_limited(self) -> None:
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + self._backoff)
+            logger.warning(f"Embedding requests rate limited, pausing for {self._backoff:.1f}s")
+            self._backoff = min(self._backoff * 2, self.max_backoff)
+
+    def succeeded(self) -> None:
+        with self._lock:
+            self._backoff = self.initial_backoff
+
+
+def embed_texts(
+    texts: Sequence[str],
+    embed_model: BaseEmbedding,
+    store: Optional[LocalStore] = None,
+    batch_size: Optional[int] = None,
+    max_concurrency: Optional[int] = None,
+    max_attempts: int = DEFAULT_EMBEDDING_MAX_ATTEMPTS,
+    rate_limit_guard: Optional[RateLimitGuard] = None,
+) -> List[Embedding]:
+    """
+    Embed texts in batches, several batches at a time, reusing embeddings stored earlier.
+
+    Args:
+        texts (Sequence[str]): The texts to embed.
+        embed_model (BaseEmbedding): The embedding model.
+        store (Optional[LocalStore]): Where embeddings are stored and looked up, None embeds everything.
+        batch_size (Optional[int]): Texts per request, EMBEDDING_BATCH_SIZE if None.
+        max_concurrency (Optional[int]): Requests in flight, EMBEDDING_MAX_CONCURRENCY if None.
+        max_attempts (int): Attempts per batch before the ingestion fails.
+        rate_limit_guard (Optional[RateLimitGuard]): Shared pause on rate limit errors, a new one if None.
+
+    Raises:
+        Exception: The error of the first batch that failed every attempt, after the other batches are done and stored.
+
+    Returns:
+        List[Embedding]: One embedding per text.
+    """
+    batch_size = batch_size or get_embedding_batch_size()
+    max_concurrency = max_concurrency or get_embedding_max_concurrency()
+    rate_limit_guard = rate_limit_guard or RateLimitGuard()
+
+    keys = [get_embedding_key(embed_model.model_name, text) for text in texts]
+    embeddings: List[Optional[Embedding]] = [None] * len(texts)
+    if store is not None:
+        for i, key in enumerate(keys):
+            value = store.get(LOCAL_STORE_EMBEDDING_NAMESPACE, key)
+            if value is not None:
+                embeddings[i] = decode_embedding(value)
+        # reused embeddings count as recent, so pruning only drops the ones no build uses anymore
+        reused = {key for key, embedding in zip(keys, embeddings) if embedding is not None}
+        store.touch(LOCAL_STORE_EMBEDDING_NAMESPACE, reused)
+
+    # equal texts are embedded once
+    missing: dict = {}
+    for i, embedding in enumerate(embeddings):
+        if embedding is None:
+            missing.setdefault(keys[i], []).append(i)
+    missing_keys = list(missing)
+    batches = [missing_keys[i : i + batch_size] for i in range(0, len(missing_keys), batch_size)]
+    logger.info(
+        f"Embedding {len(missing_keys)} of {len(texts)} texts in {len(batches)} batches, "
+        f"{len(texts) - sum(len(indices) for indices in missing.values())} reused"
+    )
+
+    def embed_batch(batch_keys: List[str]) -> None:
+        batch_texts = [texts[missing[key][0]] for key in batch_keys]
+        for attempt in range(1, max_attempts + 1):
+            rate_limit_guard.wait()
+            try:
+                batch_embeddings = embed_model.get_text_embedding_batch(batch_texts)
+                break
+            except Exception as e:
+                if attempt == max_attempts:
+                    raise
+                if is_rate_limit_error(e):
+                    rate_limit_guard.rate_limited()
+                else:
+                    logger.warning(f"Embedding batch failed (attempt {attempt}): {e}")
+                    time.sleep(min(2**attempt, 30))
+        rate_limit_guard.succeeded()
+
+        for key, embedding in zip(batch_keys, batch_embeddings):
+            for i in missing[key]:
+                embeddings[i] = embedding
+            if store is not None:
+                store.set(LOCAL_STORE_EMBEDDING_NAMESPACE, key, encode_embedding(embedding))
+
+    error = None
+    with start_span("embedding.ingest", texts=len(texts), batches=len(batches)):
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            futures = [executor.submit(embed_batch, batch) for batch in batches]
+            for future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f"Embedding batch failed: {e}")
+                    error = error or e
+    if store is not None:
+        prune_stored_embeddings(store)
+    if error is not None:
+        raise error
+    return embeddings
+
+
+def prune_stored_embeddings(store: LocalStore, max_items: Optional[int] = None) -> int:
+    """
+    Delete the least recently used stored embeddings beyond max_items.
+
+    Args:
+        store (LocalStore): The local store.
+        max_items (Optional[int]): Number of embeddings kept, EMBEDDING_STORE_LIMIT if None.
+
+    Returns:
+        int: The number of deleted embeddings.
+    """
+    pruned = store.prune(LOCAL_STORE_EMBEDDING_NAMESPACE, max_items or get_embedding_store_limit())
+    if pruned:
+        logger.info(f"Pruned {pruned} stored embeddings")
+    return pruned
+
+
+def embed_nodes(
+    nodes: Sequence[TextNode],
+    embed_model: BaseEmbedding,
+    store: Optional[LocalStore] = None,
+    **kwargs,
+) -> List[TextNode]:
+    """
+    Set the embedding of every node that has none, see embed_texts for the keyword arguments.
+
+    Nodes are embedded with their metadata, the same text a VectorStoreIndex embeds.
+
+    Returns:
+        List[TextNode]: The nodes.
+    """
+    pending = [node for node in nodes if node.embedding is None]
+    texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in pending]
+    for node, embedding in zip(pending, embed_texts(texts, embed_model, store=store, **kwargs)):
+        node.embedding = embedding
+    return list(nodes)
@@ -0,0 +1,123 @@
+"""
+Embedding models that run in process on the CPU, so retrieval needs no network round-trip.
+
+Two backends are supported, both optional dependencies:
+
+- fastembed (default): ONNX runtime with quantized weights, `poetry install --extras fastembed`
+- sentence_transformers: PyTorch, `poetry install --extras sentence-transformers`
+
+The model is downloaded on first use and cached by the backend.
+"""
+import os
+import threading
+from typing import Any, List
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+from loguru import logger
+
+from utils.metrics import EMBEDDING_INPUTS
+from utils.tracing import start_span
+
+# 384 dimensions, ~30MB quantized, good retrieval quality for its size
+DEFAULT_LOCAL_EMBEDDING_MODEL = "BAAI/bge-small-en-v1.5"
+LOCAL_EMBEDDING_BACKENDS = ("fastembed", "sentence_transformers")
+
+
+class LocalEmbedding(BaseEmbedding):
+    """
+    In-process CPU embedding model.
+
+    Args:
+        model_name (str): Name of the model on the Hugging Face hub.
+        backend (str): fastembed or sentence_transformers.
+        embed_batch_size (int): Texts encoded per batch.
+    """
+
+    backend: str = "fastembed"
+    _model: Any = PrivateAttr(default=None)
+    _lock: Any = PrivateAttr()
+
+    def __init__(
+        self,
+        model_name: str = DEFAULT_LOCAL_EMBEDDING_MODEL,
+        backend: str = "fastembed",
+        embed_batch_size: int = 64,
+        **kwargs: Any,
+    ):
+        if backend not in LOCAL_EMBEDDING_BACKENDS:
+            raise ValueError(f"Unknown local embedding backend {backend}, expected one of {LOCAL_EMBEDDING_BACKENDS}")
+        super().__init__(model_name=model_name, backend=backend, embed_batch_size=embed_batch_size, **kwargs)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "LocalEmbedding"
+
+    def _get_model(self) -> Any:
+        with self._lock:
+            if self._model is None:
+                logger.info(f"Loading local embedding model {self.model_name} with {self.backend}")
+                try:
+                    if self.backend == "fastembed":
+                        from fastembed import TextEmbedding
+
+                        self._model = TextEmbedding(model_name=self.model_name)
+                    else:
+                        from sentence_transformers import SentenceTransformer
+
+                        self._model = SentenceTransformer(self.model_name, device="cpu")
+                except ImportError as e:
+                    package = "fastembed" if self.backend == "fastembed" else "sentence-transformers"
+                    logger.error(f"The {self.backend} embedding backend needs {package}, poetry install --extras {package}")
+                    raise ImportError(
+                        f"poetry install --extras {package} to use the {self.backend} embedding backend"
+                    ) from e
+            return self._model
+
+    def encode(self, texts: List[str], is_query: bool = False) -> np.ndarray:
+        """
+        Embed texts in batches of embed_batch_size.
+
+        Args:
+            texts (List[str]): The texts.
+            is_query (bool): Whether the texts are search queries, some models embed queries with an instruction.
+
+        Returns:
+            np.ndarray: One unit length float32 embedding per row.
+        """
+        if len(texts) == 0:
+            return np.zeros((0, 0), dtype=np.float32)
+        model = self._get_model()
+        with start_span("embedding.local", texts=len(texts)):
+            if self.backend == "fastembed":
+                embed = model.query_embed if is_query else model.embed
+                embeddings = np.asarray(list(embed(texts, batch_size=self.embed_batch_size)), dtype=np.float32)
+            else:
+                embeddings = model.encode(
+                    texts, batch_size=self.embed_batch_size, normalize_embeddings=True, convert_to_numpy=True
+                ).astype(np.float32)
+        EMBEDDING_INPUTS.labels(model=self.model_name).inc(len(texts))
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return embeddings / norms
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        return self.encode([query], is_query=True)[0].tolist()
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self.encode([text])[0].tolist()
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return self.encode(texts).tolist()
+
+
+def get_local_embedding_model() -> LocalEmbedding:
+    return LocalEmbedding(
+        model_name=os.getenv("LOCAL_EMBEDDING_MODEL", DEFAULT_LOCAL_EMBEDDING_MODEL),
+        backend=os.getenv("LOCAL_EMBEDDING_BACKEND", "fastembed"),
+    )
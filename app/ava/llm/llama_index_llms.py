@@ -1,6 +1,22 @@
 import os
+import sys
+from typing import TYPE_CHECKING
+
 from llama_index.llms.azure_openai import AzureOpenAI
-from llama_index.llms.anthropic import Anthropic
+
+if TYPE_CHECKING:
+    from llama_index.llms.anthropic import Anthropic
+
+
+def __getattr__(name: str):
+    # the Anthropic SDK is only needed when a claude client is requested,
+    # so it is imported on first access instead of at startup.
+    if name == "Anthropic":
+        from llama_index.llms.anthropic import Anthropic
+
+        globals()["Anthropic"] = Anthropic
+        return Anthropic
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def get_azure_openai_client() -> AzureOpenAI:
     """
@@ -28,7 +44,7 @@ def get_azure_openai_client() -> AzureOpenAI:
     )
 
 
-def get_anthropic_client() -> Anthropic:
+def get_anthropic_client() -> "Anthropic":
     """
     Returns an instance of the Anthropic client.
 
@@ -43,7 +59,8 @@ def get_anthropic_client() -> Anthropic:
     if not api_key:
         raise TypeError("Missing ANTHROPIC_API_KEY environment variable")
 
-    return Anthropic(
+    anthropic_cls = getattr(sys.modules[__name__], "Anthropic")
+    return anthropic_cls(
         model="claude-3-5-sonnet-20240620",
         api_key=api_key,
     )
@@ -0,0 +1,261 @@
+"""
+Cache of objection check results, so most turns skip the objection LLM call.
+
+Lead messages are short and repetitive ("ok", "yes", "call me tomorrow", "stop"),
+so the objection check answers the same questions over and over. Results are
+looked up in two tiers before the LLM is asked:
+
+1. exact: the normalized text of the lead's message (case, punctuation and
+   whitespace folded).
+2. semantic: the nearest previously classified message by embedding cosine
+   similarity, used only when it is at least OBJECTION_CACHE_SIMILARITY_THRESHOLD.
+
+Every LLM answer is stored in both tiers and logged to the local store, so the
+cache survives restarts. The log keeps the OBJECTION_LABEL_STORE_LIMIT most
+recent labels.
+"""
+import os
+import threading
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from config import LOCAL_STORE_OBJECTION_LABEL_NAMESPACE
+from utils.cache import MISSING, TTLCache
+from utils.local_store import LocalStore, get_local_store
+from utils.text import normalize_text
+from utils.tracing import start_span
+
+DEFAULT_OBJECTION_CACHE_SIZE = 4096
+# ada-002 embeddings of unrelated sentences are ~0.7 similar, paraphrases are above ~0.95
+DEFAULT_SIMILARITY_THRESHOLD = 0.95
+# logged labels hold a full embedding each, the log is pruned to the most recent ones every few adds
+DEFAULT_LABEL_STORE_LIMIT = DEFAULT_OBJECTION_CACHE_SIZE
+PRUNE_LABELS_EVERY = 256
+# labels logged before the embedding model was recorded were all embedded by the Azure deployment
+LEGACY_LABEL_EMBEDDING_MODEL = "text-embedding-ada-002"
+
+
+def is_objection_cache_enabled() -> bool:
+    return os.getenv("OBJECTION_CACHE_ENABLED", "true").lower() in ["true", "1", "yes"]
+
+
+def get_label_embedding_model(value: dict) -> Optional[str]:
+    """Name of the model that embedded a logged label."""
+    return value.get("embedding_model", LEGACY_LABEL_EMBEDDING_MODEL)
+
+
+def get_similarity_threshold() -> float:
+    return float(os.getenv("OBJECTION_CACHE_SIMILARITY_THRESHOLD", DEFAULT_SIMILARITY_THRESHOLD))
+
+
+def get_label_store_limit() -> int:
+    return int(os.getenv("OBJECTION_LABEL_STORE_LIMIT", DEFAULT_LABEL_STORE_LIMIT))
+
+
+class ObjectionCache:
+    """
+    Two tier cache of objection check results, keyed by the lead's message.
+
+    Args:
+        embed_model (Optional[Any]): llama_index embedding model for the semantic tier, None disables it.
+        store (Optional[LocalStore]): Where LLM labels are logged, None keeps them in memory only.
+        similarity_threshold (float): Minimum cosine similarity for a semantic hit.
+        maxsize (int): Maximum number of messages kept per tier.
+        label_store_limit (int): Maximum number of labels kept in the local store.
+    """
+
+    def __init__(
+        self,
+        embed_model: Optional[Any] = None,
+        store: Optional[LocalStore] = None,
+        similarity_threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+        maxsize: int = DEFAULT_OBJECTION_CACHE_SIZE,
+        label_store_limit: int = DEFAULT_LABEL_STORE_LIMIT,
+    ):
+        self.embed_model = embed_model
+        model_name = getattr(embed_model, "model_name", None)
+        # embeddings of other models are not comparable, e.g. after switching the embedding provider
+        self.embedding_model_name = model_name if isinstance(model_name, str) else None
+        self.store = store
+        self.similarity_threshold = similarity_threshold
+        self.maxsize = maxsize
+        self.label_store_limit = label_store_limit
+        self.exact = TTLCache(maxsize=maxsize, name="objection_exact")
+        # embeddings of recent misses, so storing the LLM's answer does not embed the message again
+        self._pending = TTLCache(maxsize=64, ttl=300)
+        # ring buffer of unit length embeddings, allocated on the first insert once the dimension is known.
+        # rows are overwritten oldest first, _rows maps a normalized message to its row
+        self._embeddings: Optional[np.ndarray] = None
+        self._labels = np.zeros(maxsize, dtype=bool)
+        self._row_keys: List[Optional[str]] = [None] * maxsize
+        self._rows: Dict[str, int] = {}
+        self._next_row = 0
+        self._size = 0
+        self._adds_since_prune = 0
+        self._lock = threading.Lock()
+        if store is not None:
+            self._load(store)
+
+    def _load(self, store: LocalStore) -> None:
+        store.prune(LOCAL_STORE_OBJECTION_LABEL_NAMESPACE, self.label_store_limit)
+        # oldest first, so the most recent labels are the ones left in the ring buffer
+        for key, value in store.items(LOCAL_STORE_OBJECTION_LABEL_NAMESPACE):
+            self.exact.set(key, value["is_objection"])
+            if value.get("embedding") is not None and get_label_embedding_model(value) == self.embedding_model_name:
+                self._add_embedding(key, value["is_objection"], value["embedding"])
+        logger.debug(f"Loaded {self._size} objection labels with embeddings")
+
+    def _embed(self, text: str) -> Optional[np.ndarray]:
+        if self.embed_model is None:
+            return None
+        try:
+            with start_span("embedding.objection_cache"):
+                return np.asarray(self.embed_model.get_query_embedding(text), dtype=np.float32)
+        except Exception as e:
+            # the semantic tier is an optimization, the LLM still answers
+            logger.warning(f"Could not embed message for the objection cache: {e}")
+            return None
+
+    def get_embedding(self, text: str) -> Optional[np.ndarray]:
+        """
+        Embedding of a message, reusing the one computed by the last lookup of it.
+
+        Args:
+            text (str): The lead's message.
+
+        Returns:
+            Optional[np.ndarray]: The embedding, None if there is no embedding model or embedding failed.
+        """
+        embedding = self._pending.get(normalize_text(text), None)
+        if embedding is None:
+            embedding = self._embed(text)
+        return embedding
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _add_embedding(self, key: str, is_objection: bool, embedding: Any) -> None:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return
+        with self._lock:
+            if self._embeddings is None:
+                self._embeddings = np.zeros((self.maxsize, len(vector)), dtype=np.float32)
+            elif self._embeddings.shape[1] != len(vector):
+                logger.warning(f"Skipping objection cache embedding of dimension {len(vector)}")
+                return
+
+            row = self._rows.get(key)
+            if row is None:
+                row = self._next_row
+                evicted = self._row_keys[row]
+                if evicted is not None:
+                    del self._rows[evicted]
+                self._row_keys[row] = key
+                self._rows[key] = row
+                self._next_row = (row + 1) % self.maxsize
+                self._size = min(self._size + 1, self.maxsize)
+            self._embeddings[row] = vector / norm
+            self._labels[row] = is_objection
+
+    def _nearest(self, embedding: np.ndarray) -> Optional[Tuple[float, bool]]:
+        norm = np.linalg.norm(embedding)
+        with self._lock:
+            if self._size == 0 or norm == 0 or self._embeddings.shape[1] != len(embedding):
+                return None
+            similarities = self._embeddings[: self._size] @ (embedding / norm)
+            index = int(np.argmax(similarities))
+            return float(similarities[index]), bool(self._labels[index])
+
+    def lookup_with_source(
+        self, text: str, embedding: Optional[np.ndarray] = None
+    ) -> Tuple[Optional[bool], Optional[str]]:
+        """
+        Look up the objection check result of a message, and which tier answered it.
+
+        Args:
+            text (str): The lead's message.
+            embedding (Optional[np.ndarray]): Its embedding, computed with embed_model when not given.
+
+        Returns:
+            Tuple[Optional[bool], Optional[str]]: The cached result, None if neither tier is
+            confident, and the tier that answered, exact or semantic.
+        """
+        key = normalize_text(text)
+        is_objection = self.exact.get(key)
+        if is_objection is not MISSING:
+            return is_objection, "exact"
+
+        embedding = embedding if embedding is not None else self._embed(text)
+        if embedding is not None:
+            self._pending.set(key, embedding)
+            nearest = self._nearest(embedding)
+            if nearest is not None and nearest[0] >= self.similarity_threshold:
+                similarity, is_objection = nearest
+                logger.debug(f"Objection cache semantic hit, similarity {similarity:.3f}")
+                # the next identical message is answered by the exact tier
+                self.exact.set(key, is_objection)
+                return is_objection, "semantic"
+        return None, None
+
+    def lookup(self, text: str, embedding: Optional[np.ndarray] = None) -> Optional[bool]:
+        """
+        Look up the objection check result of a message.
+
+        Args:
+            text (str): The lead's message.
+            embedding (Optional[np.ndarray]): Its embedding, computed with embed_model when not given.
+
+        Returns:
+            Optional[bool]: The cached result, None if neither tier is confident.
+        """
+        return self.lookup_with_source(text, embedding)[0]
+
+    def add(self, text: str, is_objection: bool, embedding: Optional[np.ndarray] = None) -> None:
+        """
+        Store the result of an objection check, usually the LLM's answer.
+
+        Args:
+            text (str): The lead's message.
+            is_objection (bool): Whether it is an objection.
+            embedding (Optional[np.ndarray]): Its embedding, computed with embed_model when not given.
+        """
+        key = normalize_text(text)
+        self.exact.set(key, is_objection)
+        if embedding is None:
+            embedding = self.get_embedding(text)
+        if embedding is not None:
+            self._add_embedding(key, is_objection, embedding)
+        if self.store is not None:
+            self.store.set(
+                LOCAL_STORE_OBJECTION_LABEL_NAMESPACE,
+                key,
+                {
+                    "text": text,
+                    "is_objection": is_objection,
+                    "embedding": embedding.tolist() if embedding is not None else None,
+                    "embedding_model": self.embedding_model_name,
+                },
+            )
+            self._adds_since_prune += 1
+            if self._adds_since_prune >= PRUNE_LABELS_EVERY:
+                self._adds_since_prune = 0
+                self.store.prune(LOCAL_STORE_OBJECTION_LABEL_NAMESPACE, self.label_store_limit)
+
+
+@lru_cache()
+def get_objection_cache() -> Optional[ObjectionCache]:
+    if not is_objection_cache_enabled():
+        return None
+    from ava.embeddings.cached_embedding import get_cached_embedding_model, get_embedding_provider
+
+    return ObjectionCache(
+        embed_model=get_cached_embedding_model(get_embedding_provider("objection")),
+        store=get_local_store(),
+        similarity_threshold=get_similarity_threshold(),
+        label_store_limit=get_label_store_limit(),
+    )
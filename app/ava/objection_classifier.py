@@ -0,0 +1,292 @@
+"""
+Local objection classifier, an alternative to asking the LLM on every turn.
+
+A logistic regression over message embeddings, trained on the most recent
+labels the LLM gave earlier (logged by the objection cache). It answers when its
+probability is far enough from the decision boundary and leaves the rest to the
+LLM, whose answers become new training labels.
+
+Training runs in a background thread. Embeddings have far more dimensions than
+there are labels, so the fit is checked on held out labels and the classifier
+only answers if its confident predictions were accurate there.
+
+Enabled with OBJECTION_CLASSIFIER=local.
+"""
+import os
+import threading
+from collections import deque
+from functools import lru_cache
+from typing import Any, NamedTuple, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from ava.objection_cache import get_label_embedding_model, is_objection_cache_enabled
+from config import LOCAL_STORE_OBJECTION_LABEL_NAMESPACE
+from utils.local_store import LocalStore, get_local_store
+from utils.tracing import start_span
+
+# the classifier is only trained once it has seen enough labels of both classes
+MIN_TRAINING_LABELS = 100
+MIN_LABELS_PER_CLASS = 25
+RETRAIN_EVERY = 50
+# trained on a window of the most recent labels, so training time stays bounded
+MAX_TRAINING_LABELS = 2000
+DEFAULT_CONFIDENCE = 0.9
+# every HOLDOUT_EVERY-th label is held out, the classifier only answers if its confident
+# predictions on them were at least MIN_HOLDOUT_ACCURACY accurate
+HOLDOUT_EVERY = 5
+MIN_HOLDOUT_ACCURACY = 0.95
+
+
+def is_local_objection_classifier_enabled() -> bool:
+    return os.getenv("OBJECTION_CLASSIFIER", "llm").lower() == "local"
+
+
+def get_classifier_confidence() -> float:
+    return float(os.getenv("OBJECTION_CLASSIFIER_CONFIDENCE", DEFAULT_CONFIDENCE))
+
+
+def _sigmoid(x: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-np.clip(x, -30, 30)))
+
+
+class FittedModel(NamedTuple):
+    mean: np.ndarray
+    std: np.ndarray
+    weights: np.ndarray
+    bias: float
+    # accuracy of the confident predictions on the held out labels, None if none was confident
+    holdout_accuracy: Optional[float]
+
+
+class ObjectionClassifier:
+    """
+    Logistic regression objection classifier over message embeddings.
+
+    Args:
+        embed_model (Optional[Any]): Embeds messages when there is no objection cache to reuse embeddings from.
+        confidence (float): Minimum probability of the predicted class for the classifier to answer.
+        l2 (float): L2 regularization of the weights.
+        iterations (int): Gradient descent iterations per training.
+        max_labels (int): Number of most recent labels trained on.
+    """
+
+    def __init__(
+        self,
+        embed_model: Optional[Any] = None,
+        confidence: float = DEFAULT_CONFIDENCE,
+        l2: float = 1e-2,
+        iterations: int = 300,
+        max_labels: int = MAX_TRAINING_LABELS,
+    ):
+        self.embed_model = embed_model
+        self.confidence = confidence
+        self.l2 = l2
+        self.iterations = iterations
+        # replaced as a whole by training, readers take one reference so they never mix two fits
+        self.model: Optional[FittedModel] = None
+        self._embeddings: deque = deque(maxlen=max_labels)
+        self._labels: deque = deque(maxlen=max_labels)
+        self._new_labels = 0
+        self._lock = threading.Lock()
+        self._training_thread: Optional[threading.Thread] = None
+
+    @property
+    def is_trained(self) -> bool:
+        return self.model is not None
+
+    @property
+    def holdout_accuracy(self) -> Optional[float]:
+        model = self.model
+        return None if model is None else model.holdout_accuracy
+
+    @property
+    def is_trusted(self) -> bool:
+        return self._is_trusted(self.model)
+
+    @staticmethod
+    def _is_trusted(model: Optional[FittedModel]) -> bool:
+        if model is None or model.holdout_accuracy is None:
+            return False
+        return model.holdout_accuracy >= MIN_HOLDOUT_ACCURACY
+
+    def get_embedding(self, text: str) -> Optional[np.ndarray]:
+        """
+        Embedding of a message, for when there is no objection cache to take it from.
+
+        Args:
+            text (str): The lead's message.
+
+        Returns:
+            Optional[np.ndarray]: The embedding, None if there is no embedding model or embedding failed.
+        """
+        if self.embed_model is None:
+            return None
+        try:
+            with start_span("embedding.objection_classifier"):
+                return np.asarray(self.embed_model.get_query_embedding(text), dtype=np.float32)
+        except Exception as e:
+            # the LLM still answers
+            logger.warning(f"Could not embed message for the objection classifier: {e}")
+            return None
+
+    def add_label(self, embedding: Any, is_objection: bool) -> None:
+        """
+        Add a training label, retraining in the background once RETRAIN_EVERY new labels piled up.
+
+        Args:
+            embedding (Any): Embedding of the lead's message.
+            is_objection (bool): The label, usually the LLM's answer.
+        """
+        with self._lock:
+            self._embeddings.append(np.asarray(embedding, dtype=np.float32))
+            self._labels.append(bool(is_objection))
+            self._new_labels += 1
+            retrain = not self.is_trained or self._new_labels >= RETRAIN_EVERY
+        if retrain:
+            self.train_in_background()
+
+    def train_in_background(self) -> None:
+        """Start training in a background thread, unless a training is already running."""
+        with self._lock:
+            if self._training_thread is not None and self._training_thread.is_alive():
+                return
+            self._training_thread = threading.Thread(
+                target=self._train_logging_errors, name="objection-classifier-train", daemon=True
+            )
+            self._training_thread.start()
+
+    def _train_logging_errors(self) -> None:
+        try:
+            self.train()
+        except Exception as e:
+            logger.error(f"Error training the objection classifier: {e}")
+
+    def wait_for_training(self, timeout: Optional[float] = None) -> None:
+        """Wait for the background training, if one is running."""
+        thread = self._training_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def load(self, store: LocalStore, embedding_model: Optional[str] = None) -> None:
+        """
+        Load the labels logged to the local store and train on them in the background.
+
+        Args:
+            store (LocalStore): The local store.
+            embedding_model (Optional[str]): Only labels embedded with this model are used, all if None.
+        """
+        for _, value in store.items(LOCAL_STORE_OBJECTION_LABEL_NAMESPACE):
+            if value.get("embedding") is None:
+                continue
+            if embedding_model is None or get_label_embedding_model(value) == embedding_model:
+                self._embeddings.append(np.asarray(value["embedding"], dtype=np.float32))
+                self._labels.append(bool(value["is_objection"]))
+        self.train_in_background()
+
+    def _fit(self, x: np.ndarray, labels: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, float]:
+        # embedding dimensions are tiny and of different scales, standardize so one learning rate fits all
+        mean = x.mean(axis=0)
+        std = x.std(axis=0) + 1e-6
+        x = (x - mean) / std
+        weights = np.zeros(x.shape[1], dtype=np.float32)
+        bias = 0.0
+        learning_rate = 0.5
+        for _ in range(self.iterations):
+            error = _sigmoid(x @ weights + bias) - labels
+            weights -= learning_rate * (x.T @ error / len(labels) + self.l2 * weights)
+            bias -= learning_rate * float(error.mean())
+        return mean, std, weights, bias
+
+    def train(self) -> bool:
+        """
+        Fit the classifier on the most recent labels, and check it on the held out ones.
+
+        Returns:
+            bool: True if there were enough labels to train.
+        """
+        with self._lock:
+            labels = np.asarray(self._labels, dtype=np.float32)
+            positives = int(labels.sum())
+            if (
+                len(labels) < MIN_TRAINING_LABELS
+                or positives < MIN_LABELS_PER_CLASS
+                or len(labels) - positives < MIN_LABELS_PER_CLASS
+            ):
+                return False
+            x = np.vstack(self._embeddings)
+            self._new_labels = 0
+
+        holdout = np.arange(len(labels)) % HOLDOUT_EVERY == 0
+        with start_span("objection_classifier.train", labels=len(labels)):
+            mean, std, weights, bias = self._fit(x[~holdout], labels[~holdout])
+            probabilities = _sigmoid(((x[holdout] - mean) / std) @ weights + bias)
+
+        confident = np.maximum(probabilities, 1 - probabilities) >= self.confidence
+        holdout_accuracy = (
+            float(((probabilities[confident] >= 0.5) == labels[holdout][confident]).mean())
+            if confident.any()
+            else None
+        )
+        self.model = FittedModel(mean, std, weights, bias, holdout_accuracy)
+        logger.info(
+            f"Trained objection classifier on {len(labels)} labels, {positives} objections, "
+            f"held out accuracy {holdout_accuracy} on {int(confident.sum())}/{int(holdout.sum())} confident"
+        )
+        return True
+
+    def predict_proba(self, embedding: Any) -> float:
+        """
+        Probability that a message is an objection.
+
+        Args:
+            embedding (Any): Embedding of the lead's message.
+
+        Returns:
+            float: The probability, 0.5 if the classifier is not trained yet.
+        """
+        return self._predict_proba(self.model, embedding)
+
+    @staticmethod
+    def _predict_proba(model: Optional[FittedModel], embedding: Any) -> float:
+        if model is None:
+            return 0.5
+        x = (np.asarray(embedding, dtype=np.float32) - model.mean) / model.std
+        return float(_sigmoid(x @ model.weights + model.bias))
+
+    def classify(self, embedding: Any) -> Tuple[Optional[bool], float]:
+        """
+        Classify a message, abstaining near the decision boundary.
+
+        Args:
+            embedding (Any): Embedding of the lead's message.
+
+        Returns:
+            Tuple[Optional[bool], float]: Whether it is an objection, None when the classifier is
+            not confident enough or was not accurate on the held out labels, and the probability
+            of the predicted class.
+        """
+        model = self.model
+        probability = self._predict_proba(model, embedding)
+        confidence = max(probability, 1 - probability)
+        if not self._is_trusted(model) or confidence < self.confidence:
+            return None, confidence
+        return probability >= 0.5, confidence
+
+
+@lru_cache()
+def get_objection_classifier() -> Optional[ObjectionClassifier]:
+    if not is_local_objection_classifier_enabled():
+        return None
+    from ava.embeddings.cached_embedding import get_cached_embedding_model, get_embedding_provider
+
+    embed_model = get_cached_embedding_model(get_embedding_provider("objection"))
+    classifier = ObjectionClassifier(embed_model=embed_model, confidence=get_classifier_confidence())
+    classifier.load(get_local_store(), embedding_model=embed_model.model_name)
+    if not is_objection_cache_enabled():
+        logger.warning(
+            "OBJECTION_CACHE_ENABLED is false, the objection classifier trains on this process' LLM answers "
+            "only, labels are not logged across restarts"
+        )
+    return classifier
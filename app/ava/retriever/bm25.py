@@ -0,0 +1,88 @@
+import math
+from collections import Counter, defaultdict
+from typing import Dict, List, Tuple
+
+from utils.text import normalize_text
+
+# words too common to tell documents apart, dropped from documents and queries
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from have how i if in is it its me my not of on or so "
+    "that the their then there these this to was we what when where which who will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in normalize_text(text).split() if token not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    In-memory BM25 inverted index, documents can be added and removed one at a time.
+
+    Args:
+        k1 (float): Term frequency saturation.
+        b (float): Document length normalization.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        # term -> document id -> term frequency
+        self.postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self.doc_lengths: Dict[str, int] = {}
+        self._doc_terms: Dict[str, List[str]] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.doc_lengths
+
+    def add(self, doc_id: str, text: str) -> None:
+        if doc_id in self.doc_lengths:
+            self.remove(doc_id)
+        tokens = tokenize(text)
+        frequencies = Counter(tokens)
+        for term, frequency in frequencies.items():
+            self.postings[term][doc_id] = frequency
+        self._doc_terms[doc_id] = list(frequencies)
+        self.doc_lengths[doc_id] = len(tokens)
+        self._total_length += len(tokens)
+
+    def remove(self, doc_id: str) -> None:
+        length = self.doc_lengths.pop(doc_id, None)
+        if length is None:
+            return
+        self._total_length -= length
+        for term in self._doc_terms.pop(doc_id):
+            documents = self.postings[term]
+            documents.pop(doc_id, None)
+            if len(documents) == 0:
+                del self.postings[term]
+
+    def search(self, query: str, top_k: int) -> List[Tuple[str, float]]:
+        """
+        Score the documents sharing a term with the query.
+
+        Args:
+            query (str): The query.
+            top_k (int): Maximum number of documents returned.
+
+        Returns:
+            List[Tuple[str, float]]: Document ids and their BM25 scores, best first.
+        """
+        if len(self.doc_lengths) == 0:
+            return []
+        n = len(self.doc_lengths)
+        average_length = self._total_length / n or 1.0
+        scores: Dict[str, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            documents = self.postings.get(term)
+            if not documents:
+                continue
+            idf = math.log(1 + (n - len(documents) + 0.5) / (len(documents) + 0.5))
+            for doc_id, frequency in documents.items():
+                length_norm = 1 - self.b + self.b * self.doc_lengths[doc_id] / average_length
+                scores[doc_id] += idf * frequency * (self.k1 + 1) / (frequency + self.k1 * length_norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
@@ -0,0 +1,392 @@
+"""
+Retriever for domain knowledge (product details, FAQs), so factual questions are
+answered from retrieved context.
+
+Documents come from text/markdown files in KNOWLEDGE_BASE_DIR and from the
+question/answer rows of the Google Sheet KNOWLEDGE_BASE_SHEET_ID. They are split
+in chunks and searched two ways, with a BM25 inverted index for exact terms
+(product names, numbers) and by embedding similarity for paraphrases, and the
+two rankings are fused with reciprocal rank fusion (RRF).
+
+Chunks are persisted in the local store per document, with a hash of the
+document. Ingestion only re-chunks and re-embeds documents that changed, and
+embeddings are reused through the embedding ingestion cache. The sources are
+ingested again in a background thread, and each ingestion swaps in a new
+index, so retrieval never waits on an ingestion.
+
+A chunk only found by BM25 must score at least KNOWLEDGE_BASE_MIN_KEYWORD_SCORE,
+so a single common word shared with the lead's message does not pull it in.
+"""
+import hashlib
+import os
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.schema import MetadataMode, NodeWithScore, TextNode
+from loguru import logger
+from pydantic import BaseModel
+
+from ava.embeddings.cached_embedding import get_cached_embedding_model, get_embedding_provider
+from ava.embeddings.ingestion import decode_embedding, embed_nodes, get_embedding_key
+from ava.retriever.base_retriever import BaseRetriever
+from ava.retriever.bm25 import BM25Index
+from ava.retriever.numpy_retriever import normalize_rows
+from config import LOCAL_STORE_EMBEDDING_NAMESPACE, LOCAL_STORE_KNOWLEDGE_BASE_NAMESPACE
+from utils.local_store import LocalStore, get_local_store
+from utils.tokens import count_tokens
+from utils.tracing import start_span
+
+KNOWLEDGE_BASE_FILE_EXTENSIONS = (".md", ".txt")
+DEFAULT_CHUNK_TOKENS = 256
+# constant of reciprocal rank fusion, 60 is the value from the original paper
+RRF_K = 60
+DEFAULT_KNOWLEDGE_BASE_REFRESH_SECONDS = 300
+# BM25 scores are not normalized, a term in a few of hundreds of chunks scores ~4, one in most chunks below 1
+DEFAULT_MIN_KEYWORD_SCORE = 3.0
+
+
+class KnowledgeDocument(BaseModel):
+    id: str
+    text: str
+    metadata: dict = {}
+
+    @property
+    def hash(self) -> str:
+        return hashlib.sha256(f"{self.text}\n{sorted(self.metadata.items())}".encode("utf-8")).hexdigest()
+
+
+def chunk_text(text: str, max_tokens: int = DEFAULT_CHUNK_TOKENS) -> List[str]:
+    """
+    Split a text in chunks of whole paragraphs, each within max_tokens unless a single paragraph is longer.
+
+    Args:
+        text (str): The text.
+        max_tokens (int): Token budget of a chunk.
+
+    Returns:
+        List[str]: The chunks.
+    """
+    chunks, current, current_tokens = [], [], 0
+    for paragraph in (p.strip() for p in text.split("\n\n")):
+        if not paragraph:
+            continue
+        tokens = count_tokens(paragraph)
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append("\n\n".join(current))
+            current, current_tokens = [], 0
+        current.append(paragraph)
+        current_tokens += tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def get_documents_from_directory(path: str) -> List[KnowledgeDocument]:
+    documents = []
+    for root, _, files in os.walk(path):
+        for file in sorted(files):
+            if not file.endswith(KNOWLEDGE_BASE_FILE_EXTENSIONS):
+                continue
+            file_path = os.path.join(root, file)
+            with open(file_path, "r", encoding="utf-8") as f:
+                documents.append(
+                    KnowledgeDocument(
+                        id=f"file:{os.path.relpath(file_path, path)}",
+                        text=f.read(),
+                        metadata={"source": os.path.relpath(file_path, path)},
+                    )
+                )
+    return documents
+
+
+def get_documents_from_sheet(sheet_id: str, api_key: str) -> List[KnowledgeDocument]:
+    from ava.utils.google_drive_utils import get_google_sheets_values, iter_sheet_rows
+
+    documents = []
+    for sheet in get_google_sheets_values(sheet_id=sheet_id, api_key=api_key):
+        for i, (question, answer) in enumerate(iter_sheet_rows(sheet, width=2)):
+            if not question or not answer:
+                continue
+            documents.append(
+                KnowledgeDocument(
+                    id=f"sheet:{sheet.sheet_name}:{i}",
+                    text=f"Q: {question}\nA: {answer}",
+                    metadata={"source": sheet.sheet_name},
+                )
+            )
+    return documents
+
+
+class KnowledgeBaseIndex:
+    """
+    Searchable snapshot of the knowledge base chunks, built by an ingestion and never modified after.
+
+    Args:
+        nodes (Dict[str, TextNode]): The chunks by node id.
+    """
+
+    def __init__(self, nodes: Dict[str, TextNode]):
+        self.nodes = nodes
+        self.bm25 = BM25Index()
+        for node_id, node in nodes.items():
+            self.bm25.add(node_id, node.get_content())
+        self.node_ids = [node_id for node_id, node in nodes.items() if node.embedding is not None]
+        self.embeddings: Optional[np.ndarray] = None
+        if self.node_ids:
+            embeddings = np.asarray([nodes[node_id].embedding for node_id in self.node_ids], dtype=np.float32)
+            self.embeddings = np.ascontiguousarray(normalize_rows(embeddings))
+
+    def vector_ranking(self, query_embedding: np.ndarray, candidates: int, cutoff: float) -> List[Tuple[str, float]]:
+        if self.embeddings is None:
+            return []
+        scores = self.embeddings @ query_embedding
+        top = np.argsort(-scores)[:candidates]
+        return [(self.node_ids[i], float(scores[i])) for i in top if scores[i] >= cutoff]
+
+
+class KnowledgeBaseRetriever(BaseRetriever):
+    """
+    Hybrid BM25 and vector retriever over knowledge base chunks.
+
+    Args:
+        embed_model (BaseEmbedding): Embeds chunks and queries.
+        store (Optional[LocalStore]): Where chunks and embeddings are persisted, None keeps them in memory only.
+        collection_name (str): Name of the collection.
+        similarity_top_k (int): Number of chunks returned per query.
+        candidates (int): Number of chunks taken from each ranking before fusion.
+        similarity_cutoff (float): Minimum cosine similarity for a chunk to enter the vector ranking.
+        min_keyword_score (float): Minimum BM25 score for a chunk to enter the keyword ranking.
+        chunk_tokens (int): Token budget of a chunk.
+    """
+
+    def __init__(
+        self,
+        embed_model: BaseEmbedding,
+        store: Optional[LocalStore] = None,
+        collection_name: str = "knowledge_base",
+        similarity_top_k: int = 3,
+        candidates: int = 20,
+        similarity_cutoff: float = 0.75,
+        min_keyword_score: float = DEFAULT_MIN_KEYWORD_SCORE,
+        chunk_tokens: int = DEFAULT_CHUNK_TOKENS,
+    ):
+        self.embed_model = embed_model
+        self.store = store
+        self.collection_name = collection_name
+        self.similarity_top_k = similarity_top_k
+        self.candidates = candidates
+        self.similarity_cutoff = similarity_cutoff
+        self.min_keyword_score = min_keyword_score
+        self.chunk_tokens = chunk_tokens
+        self.refreshed_at: Optional[float] = None
+
+        # document id -> hash and ids of its chunks, only used by ingestions
+        self._documents: Dict[str, dict] = {}
+        self._nodes: Dict[str, TextNode] = {}
+        # replaced as a whole, retrievals use whichever index was current when they started
+        self._index = KnowledgeBaseIndex({})
+        self._ingest_lock = threading.Lock()
+
+        if store is not None:
+            self._load(store)
+
+    def get_collection_name(self) -> str:
+        return self.collection_name
+
+    def __len__(self) -> int:
+        return len(self._index.nodes)
+
+    def _load(self, store: LocalStore) -> None:
+        for doc_id, value in store.items(LOCAL_STORE_KNOWLEDGE_BASE_NAMESPACE):
+            nodes = [
+                TextNode(id_=chunk["id"], text=chunk["text"], metadata=chunk["metadata"])
+                for chunk in value["chunks"]
+            ]
+            self._add_nodes(doc_id, value["hash"], nodes)
+        if self._documents:
+            # embeddings missing from the cache are left to the first ingestion, loading makes no requests
+            reused = set()
+            for node in self._nodes.values():
+                key = get_embedding_key(self.embed_model.model_name, node.get_content(metadata_mode=MetadataMode.EMBED))
+                value = store.get(LOCAL_STORE_EMBEDDING_NAMESPACE, key)
+                if value is not None:
+                    node.embedding = decode_embedding(value)
+                    reused.add(key)
+            # in use, so pruning the stored embeddings keeps them
+            store.touch(LOCAL_STORE_EMBEDDING_NAMESPACE, reused)
+            self._index = KnowledgeBaseIndex(dict(self._nodes))
+            logger.info(f"Loaded {len(self._nodes)} chunks of {len(self._documents)} knowledge base documents")
+
+    def _add_nodes(self, doc_id: str, doc_hash: str, nodes: List[TextNode]) -> None:
+        self._documents[doc_id] = {"hash": doc_hash, "node_ids": [node.node_id for node in nodes]}
+        for node in nodes:
+            self._nodes[node.node_id] = node
+
+    def _remove_document(self, doc_id: str) -> None:
+        document = self._documents.pop(doc_id, None)
+        if document is None:
+            return
+        for node_id in document["node_ids"]:
+            self._nodes.pop(node_id, None)
+        if self.store is not None:
+            self.store.delete(LOCAL_STORE_KNOWLEDGE_BASE_NAMESPACE, doc_id)
+
+    def ingest(self, documents: List[KnowledgeDocument], remove_missing: bool = True) -> Tuple[int, int, int]:
+        """
+        Add new documents, update changed ones and, with remove_missing, remove the ones not in documents.
+
+        Retrieval keeps using the previous index until the new one is built.
+
+        Args:
+            documents (List[KnowledgeDocument]): The documents of the knowledge base.
+            remove_missing (bool): Whether documents not in documents are removed.
+
+        Returns:
+            Tuple[int, int, int]: Number of added, updated and removed documents.
+        """
+        with self._ingest_lock, start_span("knowledge_base.ingest", documents=len(documents)):
+            added = updated = removed = 0
+            for document in documents:
+                previous = self._documents.get(document.id)
+                if previous is not None and previous["hash"] == document.hash:
+                    continue
+                if previous is not None:
+                    self._remove_document(document.id)
+                    updated += 1
+                else:
+                    added += 1
+                nodes = [
+                    TextNode(id_=f"{document.id}#{i}", text=chunk, metadata=document.metadata)
+                    for i, chunk in enumerate(chunk_text(document.text, self.chunk_tokens))
+                ]
+                self._add_nodes(document.id, document.hash, nodes)
+                if self.store is not None:
+                    self.store.set(
+                        LOCAL_STORE_KNOWLEDGE_BASE_NAMESPACE,
+                        document.id,
+                        {
+                            "hash": document.hash,
+                            "chunks": [
+                                {"id": node.node_id, "text": node.get_content(), "metadata": node.metadata}
+                                for node in nodes
+                            ],
+                        },
+                    )
+
+            if remove_missing:
+                document_ids = {document.id for document in documents}
+                for doc_id in [doc_id for doc_id in self._documents if doc_id not in document_ids]:
+                    self._remove_document(doc_id)
+                    removed += 1
+
+            # new chunks and loaded chunks that were not in the embedding cache
+            pending = [node for node in self._nodes.values() if node.embedding is None]
+            if pending:
+                embed_nodes(pending, self.embed_model, store=self.store)
+            if pending or removed or updated:
+                self._index = KnowledgeBaseIndex(dict(self._nodes))
+            self.refreshed_at = time.monotonic()
+
+        logger.info(f"Knowledge base ingestion: {added} added, {updated} updated, {removed} removed")
+        return added, updated, removed
+
+    def retrieve(self, query: str) -> list[NodeWithScore]:
+        """
+        Retrieves the chunks most relevant to the query by either ranking.
+
+        Args:
+            query (str): The query string to search for.
+
+        Returns:
+            list[NodeWithScore]: The chunks, scored by their fused reciprocal rank.
+        """
+        if not isinstance(query, str):
+            logger.error("Invalid input. Expected a string")
+            raise TypeError("Invalid input. Expected a string")
+
+        index = self._index
+        vector_ranking = []
+        if index.embeddings is not None:
+            query_embedding = normalize_rows(np.asarray(self.embed_model.get_query_embedding(query), dtype=np.float32))
+            vector_ranking = index.vector_ranking(query_embedding, self.candidates, self.similarity_cutoff)
+        keyword_ranking = [
+            (node_id, score)
+            for node_id, score in index.bm25.search(query, self.candidates)
+            if score >= self.min_keyword_score
+        ]
+
+        scores: Dict[str, float] = {}
+        for ranking in (keyword_ranking, vector_ranking):
+            for rank, (node_id, _) in enumerate(ranking):
+                scores[node_id] = scores.get(node_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[: self.similarity_top_k]
+        return [NodeWithScore(node=index.nodes[node_id], score=score) for node_id, score in best]
+
+
+def is_knowledge_base_configured() -> bool:
+    return bool(os.getenv("KNOWLEDGE_BASE_DIR") or os.getenv("KNOWLEDGE_BASE_SHEET_ID"))
+
+
+def get_knowledge_base_refresh_seconds() -> float:
+    return float(os.getenv("KNOWLEDGE_BASE_REFRESH_SECONDS", DEFAULT_KNOWLEDGE_BASE_REFRESH_SECONDS))
+
+
+def get_knowledge_base_documents() -> List[KnowledgeDocument]:
+    """Documents of the configured knowledge base sources."""
+    directory = os.getenv("KNOWLEDGE_BASE_DIR")
+    sheet_id = os.getenv("KNOWLEDGE_BASE_SHEET_ID")
+    documents = []
+    if directory:
+        documents.extend(get_documents_from_directory(directory))
+    if sheet_id:
+        documents.extend(get_documents_from_sheet(sheet_id=sheet_id, api_key=os.getenv("GOOGLE_API_KEY")))
+    return documents
+
+
+def start_knowledge_base_refresh(
+    retriever: KnowledgeBaseRetriever, interval_seconds: float
+) -> threading.Thread:
+    """Start a daemon thread ingesting the knowledge base sources now and every interval_seconds."""
+    stop = threading.Event()
+
+    def refresh_loop():
+        while True:
+            try:
+                retriever.ingest(get_knowledge_base_documents())
+            except Exception as e:
+                # a failed refresh keeps serving the documents ingested before
+                logger.error(f"Knowledge base ingestion failed: {e}")
+            if stop.wait(interval_seconds):
+                return
+
+    thread = threading.Thread(target=refresh_loop, name="knowledge-base-refresh", daemon=True)
+    thread.stop = stop
+    thread.start()
+    return thread
+
+
+@lru_cache()
+def _get_knowledge_base_retriever() -> KnowledgeBaseRetriever:
+    retriever = KnowledgeBaseRetriever(
+        embed_model=get_cached_embedding_model(get_embedding_provider("knowledge_base")),
+        store=get_local_store(),
+        min_keyword_score=float(os.getenv("KNOWLEDGE_BASE_MIN_KEYWORD_SCORE", DEFAULT_MIN_KEYWORD_SCORE)),
+    )
+    start_knowledge_base_refresh(retriever, get_knowledge_base_refresh_seconds())
+    return retriever
+
+
+def get_knowledge_base_retriever() -> Optional[KnowledgeBaseRetriever]:
+    """
+    Returns the process wide knowledge base retriever, None if no knowledge base source is configured.
+
+    The sources are ingested in the background when the retriever is created and every
+    KNOWLEDGE_BASE_REFRESH_SECONDS after, only changed documents are re-embedded.
+    """
+    if not is_knowledge_base_configured():
+        return None
+    return _get_knowledge_base_retriever()
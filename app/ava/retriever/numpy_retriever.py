@@ -0,0 +1,127 @@
+from typing import Any, List, Optional, Sequence
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.schema import MetadataMode, NodeWithScore, TextNode
+from loguru import logger
+
+from ava.retriever.base_retriever import BaseRetriever
+from utils.tracing import start_span
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Scale every row to unit length, so dot products are cosine similarities."""
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class NumpyVectorRetriever(BaseRetriever):
+    """
+    Brute force cosine similarity retriever over an in-memory float32 matrix.
+
+    Meant for small collections (up to tens of thousands of nodes), where one
+    matrix-vector product is cheaper than going through a vector database.
+    Scores are cosine similarities, like the Qdrant backed retrievers.
+
+    Args:
+        nodes (Sequence[TextNode]): The nodes to search.
+        embed_model (BaseEmbedding): Embeds the queries, and the nodes when embeddings is not given.
+        collection_name (str): Name of the collection.
+        similarity_top_k (int): Number of nodes returned per query.
+        embeddings (Optional[Any]): Precomputed node embeddings, one row per node.
+    """
+
+    def __init__(
+        self,
+        nodes: Sequence[TextNode],
+        embed_model: BaseEmbedding,
+        collection_name: str,
+        similarity_top_k: int = 3,
+        embeddings: Optional[Any] = None,
+    ) -> None:
+        self.nodes = list(nodes)
+        self.embed_model = embed_model
+        self.collection_name = collection_name
+        self.similarity_top_k = similarity_top_k
+
+        if embeddings is None and len(self.nodes) > 0:
+            with start_span("retriever.embed_nodes", collection=collection_name, nodes=len(self.nodes)):
+                # same text as llama_index embeds for a VectorStoreIndex, so scores match the Qdrant backend
+                embeddings = embed_model.get_text_embedding_batch(
+                    [node.get_content(metadata_mode=MetadataMode.EMBED) for node in self.nodes]
+                )
+        elif embeddings is None:
+            embeddings = []
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if len(self.nodes) > 0 and embeddings.shape[0] != len(self.nodes):
+            logger.error(f"Got {embeddings.shape[0]} embeddings for {len(self.nodes)} nodes")
+            raise ValueError("embeddings must have one row per node")
+        self.embeddings = np.ascontiguousarray(normalize_rows(embeddings.reshape(len(self.nodes), -1)))
+
+    def get_collection_name(self) -> str:
+        return self.collection_name
+
+    def _top_k(self, scores: np.ndarray, top_k: int) -> List[NodeWithScore]:
+        if top_k < len(scores):
+            indices = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            indices = np.arange(len(scores))
+        indices = indices[np.argsort(-scores[indices], kind="stable")]
+        return [NodeWithScore(node=self.nodes[i], score=float(scores[i])) for i in indices]
+
+    def retrieve_by_embeddings(
+        self, query_embeddings: Any, similarity_top_k: Optional[int] = None
+    ) -> List[List[NodeWithScore]]:
+        """
+        Retrieve the most similar nodes for a batch of query embeddings.
+
+        Args:
+            query_embeddings (Any): One query embedding per row.
+            similarity_top_k (Optional[int]): Number of nodes per query, the retriever's default if None.
+
+        Returns:
+            List[List[NodeWithScore]]: The nodes of each query, most similar first.
+        """
+        top_k = similarity_top_k or self.similarity_top_k
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[np.newaxis, :]
+        if len(self.nodes) == 0:
+            return [[] for _ in range(len(queries))]
+        scores = normalize_rows(queries) @ self.embeddings.T
+        return [self._top_k(row, top_k) for row in scores]
+
+    def retrieve_batch(self, queries: List[str]) -> List[List[NodeWithScore]]:
+        """
+        Retrieve nodes for several queries, embedding them in one request.
+
+        Args:
+            queries (List[str]): The query strings.
+
+        Returns:
+            List[List[NodeWithScore]]: The nodes of each query, most similar first.
+        """
+        if not all(isinstance(query, str) for query in queries):
+            logger.error("Invalid input. Expected a list of strings")
+            raise TypeError("Invalid input. Expected a list of strings")
+        if len(queries) == 0:
+            return []
+        # llama_index has no batched query embedding, ada-002 embeds queries and texts the same way
+        query_embeddings = self.embed_model.get_text_embedding_batch(queries)
+        return self.retrieve_by_embeddings(query_embeddings)
+
+    def retrieve(self, query: str) -> list[NodeWithScore]:
+        """
+        Retrieves nodes based on the given query.
+
+        Args:
+            query (str): The query string to search for.
+
+        Returns:
+            list[NodeWithScore]: A list of nodes with their corresponding scores.
+        """
+        if not isinstance(query, str):
+            logger.error("Invalid input. Expected a string")
+            raise TypeError("Invalid input. Expected a string")
+        return self.retrieve_by_embeddings(self.embed_model.get_query_embedding(query))[0]
@@ -1,3 +1,4 @@
+import os
 from datetime import datetime
 from typing import Optional
 from llama_index.vector_stores.qdrant import QdrantVectorStore
@@ -10,8 +11,11 @@ import qdrant_client
 from loguru import logger
 
 from ava.retriever.base_retriever import BaseRetriever
-from ava.embeddings.aoai_ada_002 import get_embedding_model
+from ava.embeddings.cached_embedding import get_cached_embedding_model, get_embedding_provider
+from ava.embeddings.ingestion import embed_nodes
+from ava.retriever.numpy_retriever import NumpyVectorRetriever
 from ava.retriever.utils import get_nodes_from_objection_handelling_sheet
+from utils.local_store import get_local_store
 
 class ObjectionHandelingRetriever(BaseRetriever):
 
@@ -35,7 +39,9 @@ class ObjectionHandelingRetriever(BaseRetriever):
             client=vector_db_client, collection_name=collection_name
         )
 
-        Settings.embed_model = get_embedding_model()
+        Settings.embed_model = get_cached_embedding_model(get_embedding_provider("objection"))
+        # nodes with an embedding are not embedded again by the index
+        nodes = embed_nodes(nodes, Settings.embed_model, store=get_local_store())
         self.storage_context = StorageContext.from_defaults(
             vector_store=self.vector_store
         )
@@ -76,12 +82,48 @@ class ObjectionHandelingRetriever(BaseRetriever):
         return self.engine.retrieve(query)
 
 
+def get_objection_handelling_retriever(similarity_top_k: int = 3) -> BaseRetriever:
+    """
+    Returns the objection handelling retriever of the configured backend.
+
+    OBJECTION_RETRIEVER_BACKEND selects it: "numpy" (default) searches the few hundred
+    objections with a single matrix product, "qdrant" uses an in-memory Qdrant collection.
+
+    Args:
+        similarity_top_k (int): Number of objections returned per query.
+
+    Returns:
+        BaseRetriever: The retriever.
+    """
+    backend = os.getenv("OBJECTION_RETRIEVER_BACKEND", "numpy").lower()
+    if backend == "qdrant":
+        return ObjectionHandelingRetriever(similarity_top_k=similarity_top_k)
+    if backend != "numpy":
+        logger.error(f"Unknown objection retriever backend {backend}")
+        raise ValueError(f"Unknown objection retriever backend {backend}")
+
+    collection_name = "objection_handelling"
+    embed_model = get_cached_embedding_model(get_embedding_provider("objection"))
+    nodes = embed_nodes(
+        get_nodes_from_objection_handelling_sheet(collection_name=collection_name),
+        embed_model,
+        store=get_local_store(),
+    )
+    return NumpyVectorRetriever(
+        nodes=nodes,
+        embed_model=embed_model,
+        collection_name=collection_name,
+        similarity_top_k=similarity_top_k,
+        embeddings=[node.embedding for node in nodes],
+    )
+
+
 if __name__ == "__main__":
 
     from dotenv import load_dotenv
 
     load_dotenv()
-    retriever = ObjectionHandelingRetriever(similarity_top_k=5)
+    retriever = get_objection_handelling_retriever(similarity_top_k=5)
 
     while True:
         user_query = input("Enter a query: ")
@@ -0,0 +1,129 @@
+"""
+Post-processing of retrieved nodes before they are put in a prompt.
+
+Nodes below a similarity cutoff are dropped, the rest are reranked with maximal
+marginal relevance (MMR) so near duplicates do not crowd out other examples,
+and the result is capped by count and by a token budget.
+"""
+import os
+from typing import List, Optional
+
+import numpy as np
+from llama_index.core.schema import NodeWithScore
+from pydantic import BaseModel
+
+from utils.text import normalize_text
+from utils.tokens import count_tokens
+
+
+class PostprocessingConfig(BaseModel):
+    # candidates retrieved before post-processing
+    similarity_top_k: int = 4
+    similarity_cutoff: float = 0.5
+    # MMR trade-off, 1.0 ranks by similarity to the query only, lower values favor diverse nodes
+    mmr_lambda: float = 0.7
+    # nodes at least this similar to an already selected node are dropped as duplicates
+    duplicate_similarity: float = 0.95
+    max_nodes: int = 2
+    max_tokens: Optional[int] = 400
+
+
+def get_objection_postprocessing_config() -> PostprocessingConfig:
+    """Post-processing of objection handelling examples, configured with OBJECTION_EXAMPLES_* variables."""
+    return PostprocessingConfig(
+        similarity_top_k=int(os.getenv("OBJECTION_EXAMPLES_CANDIDATES", 4)),
+        similarity_cutoff=float(os.getenv("OBJECTION_EXAMPLES_SIMILARITY_CUTOFF", 0.5)),
+        mmr_lambda=float(os.getenv("OBJECTION_EXAMPLES_MMR_LAMBDA", 0.7)),
+        duplicate_similarity=float(os.getenv("OBJECTION_EXAMPLES_DUPLICATE_SIMILARITY", 0.95)),
+        max_nodes=int(os.getenv("OBJECTION_EXAMPLES_MAX", 2)),
+        max_tokens=int(os.getenv("OBJECTION_EXAMPLES_MAX_TOKENS", 400)),
+    )
+
+
+def _get_similarity_matrix(nodes: List[NodeWithScore]) -> Optional[np.ndarray]:
+    embeddings = [node.node.embedding for node in nodes]
+    if any(embedding is None for embedding in embeddings):
+        return None
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix = matrix / norms
+    return matrix @ matrix.T
+
+
+def select_diverse_nodes(nodes: List[NodeWithScore], config: PostprocessingConfig) -> List[NodeWithScore]:
+    """
+    Rerank nodes with maximal marginal relevance, dropping near duplicates.
+
+    Nodes without embeddings (e.g. returned by a vector database) are deduplicated by their normalized text only.
+
+    Args:
+        nodes (List[NodeWithScore]): Retrieved nodes, scored by similarity to the query.
+        config (PostprocessingConfig): The post-processing settings.
+
+    Returns:
+        List[NodeWithScore]: At most config.max_nodes nodes, in the order they were selected.
+    """
+    similarities = _get_similarity_matrix(nodes)
+    remaining = list(range(len(nodes)))
+    selected: List[int] = []
+    seen_texts = set()
+
+    while remaining and len(selected) < config.max_nodes:
+        best, best_score = None, None
+        for i in list(remaining):
+            redundancy = 0.0
+            if similarities is not None:
+                redundancy = max((float(similarities[i, j]) for j in selected), default=0.0)
+            text = normalize_text(nodes[i].node.get_content())
+            if redundancy >= config.duplicate_similarity or text in seen_texts:
+                remaining.remove(i)
+                continue
+            score = config.mmr_lambda * (nodes[i].score or 0.0) - (1 - config.mmr_lambda) * redundancy
+            if best_score is None or score > best_score:
+                best, best_score = i, score
+        if best is None:
+            break
+        selected.append(best)
+        remaining.remove(best)
+        seen_texts.add(normalize_text(nodes[best].node.get_content()))
+
+    return [nodes[i] for i in selected]
+
+
+def postprocess_nodes(nodes: List[NodeWithScore], config: PostprocessingConfig) -> List[NodeWithScore]:
+    """
+    Drop nodes below the similarity cutoff and select diverse nodes among the rest.
+
+    Args:
+        nodes (List[NodeWithScore]): Retrieved nodes, scored by similarity to the query.
+        config (PostprocessingConfig): The post-processing settings.
+
+    Returns:
+        List[NodeWithScore]: The nodes worth putting in the prompt, most relevant first.
+    """
+    nodes = [node for node in nodes if node.score is not None and node.score >= config.similarity_cutoff]
+    return select_diverse_nodes(nodes, config)
+
+
+def truncate_to_token_budget(entries: List[str], max_tokens: Optional[int]) -> List[str]:
+    """
+    Keep the leading entries that fit max_tokens together.
+
+    Args:
+        entries (List[str]): Formatted entries, most relevant first.
+        max_tokens (Optional[int]): The token budget, None keeps every entry.
+
+    Returns:
+        List[str]: The entries that fit.
+    """
+    if max_tokens is None:
+        return entries
+    kept, total = [], 0
+    for entry in entries:
+        tokens = count_tokens(entry)
+        if total + tokens > max_tokens:
+            break
+        kept.append(entry)
+        total += tokens
+    return kept
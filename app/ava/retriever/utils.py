@@ -1,29 +1,31 @@
-import pandas as pd
+from typing import Iterator
+
 from loguru import logger
 from llama_index.core.schema import TextNode
 
 from ava.utils.google_drive_utils import (
     get_objection_handelling_vars,
-    get_google_sheets_data,
+    get_google_sheets_values,
+    iter_sheet_rows,
 )
 
 
-def get_nodes_from_objection_handelling_sheet(collection_name) -> list[TextNode]:
-
+def iter_nodes_from_objection_handelling_sheet(collection_name) -> Iterator[TextNode]:
     api_key, sheet_id = get_objection_handelling_vars()
-    data = get_google_sheets_data(api_key=api_key, sheet_id=sheet_id)
-    df = data[0].data_frame
-    if not isinstance(df, pd.DataFrame):
-        logger.error("Invalid input. Expected a pandas DataFrame")
-        raise TypeError("Invalid input. Expected a pandas DataFrame")
+    sheets = get_google_sheets_values(api_key=api_key, sheet_id=sheet_id)
+    if len(sheets) == 0:
+        logger.error(f"Objection handelling sheet {sheet_id} has no tabs")
+        return
 
-    nodes: list[TextNode] = []
-    for row in df.values:
-        # Create a TextNode object
-        node = TextNode(
-            text=row[0],
-            metadata={"rebuttal": row[1], "collection_name": collection_name},
+    # first tab, objection in the first column and its rebuttal in the second, rows missing either are skipped
+    for objection, rebuttal in iter_sheet_rows(sheets[0], width=2):
+        if not objection or not rebuttal:
+            continue
+        yield TextNode(
+            text=objection,
+            metadata={"rebuttal": rebuttal, "collection_name": collection_name},
         )
-        # Add the node to the list
-        nodes.append(node)
-    return nodes
+
+
+def get_nodes_from_objection_handelling_sheet(collection_name) -> list[TextNode]:
+    return list(iter_nodes_from_objection_handelling_sheet(collection_name))
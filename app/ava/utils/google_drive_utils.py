@@ -1,15 +1,19 @@
 from datetime import datetime
+import json
 import os
-from typing import List
+import threading
+from typing import Any, Iterator, List, Optional, Tuple
 from loguru import logger
-import pandas as pd
 from pydantic import BaseModel
 import requests
 
+SHEETS_API_BASE_URL = os.getenv("GOOGLE_SHEETS_API_BASE_URL", "https://sheets.googleapis.com").rstrip("/")
+DRIVE_API_BASE_URL = os.getenv("GOOGLE_DRIVE_API_BASE_URL", "https://www.googleapis.com").rstrip("/")
+
 
 class GoogleSheetsData(BaseModel):
     sheet_name: str
-    data_frame: pd.DataFrame
+    data_frame: Any  # pandas.DataFrame, pandas is imported lazily to keep it off the startup path
 
     class Config:
         arbitrary_types_allowed = True
@@ -31,7 +35,7 @@ def get_objection_handelling_vars() -> tuple[str, str]:
 
 
 def get_google_file_modified_time(file_id: str, api_key: str) -> datetime:
-    url_modified_time = f"https://www.googleapis.com/drive/v3/files/{file_id}?fields=modifiedTime&key={api_key}"
+    url_modified_time = f"{DRIVE_API_BASE_URL}/drive/v3/files/{file_id}?fields=modifiedTime&key={api_key}"
     response_modified_time = requests.get(url_modified_time, timeout=10)
     modified_time = response_modified_time.json().get("modifiedTime", None)
     if not modified_time:
@@ -48,47 +52,152 @@ def get_google_file_modified_time(file_id: str, api_key: str) -> datetime:
         return modified_time
 
 
-def get_google_sheets_data(sheet_id: str, api_key: str) -> List[GoogleSheetsData]:
+class GoogleSheetsValues(BaseModel):
+    sheet_name: str
+    values: List[List[str]]  # rows as returned by the Sheets API, the header row first
 
-    # Construct the URL
-    url_metadata = (
-        f"https://sheets.googleapis.com/v4/spreadsheets/{sheet_id}?key={api_key}"
-    )
 
-    # Make the request
-    response_metadata = requests.get(url_metadata, timeout=10)
-
-    # Check the response
-    if response_metadata.status_code == 200:
-        metadata = response_metadata.json()
-        # logger.debug(f"metadata: {metadata}")
-        sheets = metadata.get("sheets", [])
-        logger.debug(f"sheets: {sheets}")
-
-        # Collect data from all sheets
-        all_data = []
-        for sheet in sheets:
-            sheet_title = sheet["properties"]["title"]
-            url_data = f"https://sheets.googleapis.com/v4/spreadsheets/{sheet_id}/values/{sheet_title}?key={api_key}"
-            response_data = requests.get(url_data, timeout=10)
-            if response_data.status_code == 200:
-                sheet_data = response_data.json()
-                values = sheet_data.get("values", [])
-                # Convert values to a DataFrame
-                df = pd.DataFrame(values)
-                # Set the first row as the header if desired
-                df.columns = df.iloc[0]
-                df = df[1:]
-                data = GoogleSheetsData(sheet_name=sheet_title, data_frame=df)
-                all_data.append(data)
-            else:
-                logger.error(
-                    f"Error fetching data for sheet {sheet_title}: {response_data.status_code}"
-                )
-        df = all_data[0].data_frame
-        logger.debug(f"\n{df.head()}")
-        # logger.debug(f"\n{type(all_data[0].data_frame)}")
-
-        return all_data
-    else:
+def get_google_sheets_cache_dir() -> str:
+    return os.getenv("GOOGLE_SHEETS_CACHE_DIR", ".cache/google_sheets")
+
+
+def _get_cache_file(sheet_id: str) -> str:
+    return os.path.join(get_google_sheets_cache_dir(), f"{sheet_id}.json")
+
+
+def _read_cached_values(sheet_id: str, modified_time: str) -> Optional[List[GoogleSheetsValues]]:
+    try:
+        with open(_get_cache_file(sheet_id), "r", encoding="utf-8") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cached.get("modifiedTime") != modified_time:
+        return None
+    return [GoogleSheetsValues(**sheet) for sheet in cached["sheets"]]
+
+
+def _write_cached_values(sheet_id: str, modified_time: str, sheets: List[GoogleSheetsValues]) -> None:
+    cache_file = _get_cache_file(sheet_id)
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        # write then rename, so concurrent readers never see a half written file
+        tmp_file = f"{cache_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump({"modifiedTime": modified_time, "sheets": [sheet.model_dump() for sheet in sheets]}, f)
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        logger.warning(f"Could not cache sheet {sheet_id}: {e}")
+
+
+def fetch_google_sheets_values(sheet_id: str, api_key: str) -> List[GoogleSheetsValues]:
+    """
+    Fetch the values of every tab of a spreadsheet, with one metadata and one values:batchGet request.
+
+    Args:
+        sheet_id (str): The spreadsheet id.
+        api_key (str): The Google API key.
+
+    Raises:
+        requests.exceptions.HTTPError: If either request fails.
+
+    Returns:
+        List[GoogleSheetsValues]: The values of each tab, in tab order.
+    """
+    response_metadata = requests.get(
+        f"{SHEETS_API_BASE_URL}/v4/spreadsheets/{sheet_id}",
+        params={"key": api_key, "fields": "sheets.properties.title"},
+        timeout=10,
+    )
+    if response_metadata.status_code != 200:
         logger.error(f"Error fetching metadata: {response_metadata.status_code}")
+        raise requests.exceptions.HTTPError(f"Error fetching metadata: {response_metadata.status_code}")
+    titles = [sheet["properties"]["title"] for sheet in response_metadata.json().get("sheets", [])]
+    if len(titles) == 0:
+        return []
+
+    response_data = requests.get(
+        f"{SHEETS_API_BASE_URL}/v4/spreadsheets/{sheet_id}/values:batchGet",
+        params={"key": api_key, "ranges": titles},
+        timeout=10,
+    )
+    if response_data.status_code != 200:
+        logger.error(f"Error fetching values: {response_data.status_code}")
+        raise requests.exceptions.HTTPError(f"Error fetching values: {response_data.status_code}")
+    value_ranges = response_data.json().get("valueRanges", [])
+    return [
+        GoogleSheetsValues(sheet_name=title, values=value_range.get("values", []))
+        for title, value_range in zip(titles, value_ranges)
+    ]
+
+
+def get_google_sheets_values(sheet_id: str, api_key: str) -> List[GoogleSheetsValues]:
+    """
+    Values of every tab of a spreadsheet, cached on disk until the spreadsheet is modified.
+
+    A warm load is a single Drive modifiedTime request, a cold load adds the metadata
+    and values:batchGet requests of fetch_google_sheets_values.
+
+    Args:
+        sheet_id (str): The spreadsheet id.
+        api_key (str): The Google API key.
+
+    Returns:
+        List[GoogleSheetsValues]: The values of each tab, in tab order.
+    """
+    try:
+        modified_time = get_google_file_modified_time(sheet_id, api_key).isoformat()
+    except Exception as e:
+        # without a modified time the cache cannot be validated, fetch the sheet as is
+        logger.warning(f"Could not get the modified time of sheet {sheet_id}, skipping the cache: {e}")
+        return fetch_google_sheets_values(sheet_id, api_key)
+
+    sheets = _read_cached_values(sheet_id, modified_time)
+    if sheets is not None:
+        logger.debug(f"Using cached values of sheet {sheet_id} modified at {modified_time}")
+        return sheets
+
+    sheets = fetch_google_sheets_values(sheet_id, api_key)
+    _write_cached_values(sheet_id, modified_time, sheets)
+    return sheets
+
+
+def iter_sheet_rows(sheet: GoogleSheetsValues, width: int) -> Iterator[Tuple[Optional[str], ...]]:
+    """
+    Stream the rows of a tab as fixed width tuples, skipping the header row.
+
+    The Sheets API drops trailing empty cells, short rows are padded with None.
+
+    Args:
+        sheet (GoogleSheetsValues): The tab.
+        width (int): Number of leading columns to yield.
+
+    Yields:
+        Tuple[Optional[str], ...]: The first width cells of each row.
+    """
+    for row in sheet.values[1:]:
+        if len(row) >= width:
+            yield tuple(row[:width])
+        else:
+            yield tuple(row) + (None,) * (width - len(row))
+
+
+def get_google_sheets_data(sheet_id: str, api_key: str) -> List[GoogleSheetsData]:
+    """
+    Every tab of a spreadsheet as a pandas DataFrame, for ad-hoc analysis.
+
+    pandas is an optional dependency, ingestion streams rows with iter_sheet_rows instead.
+    """
+    try:
+        import pandas as pd
+    except ImportError as e:
+        raise ImportError("poetry install -E pandas to load Google Sheets as DataFrames") from e
+
+    all_data = []
+    for sheet in get_google_sheets_values(sheet_id=sheet_id, api_key=api_key):
+        # Convert values to a DataFrame
+        df = pd.DataFrame(sheet.values)
+        # Set the first row as the header if desired
+        df.columns = df.iloc[0]
+        df = df[1:]
+        all_data.append(GoogleSheetsData(sheet_name=sheet.sheet_name, data_frame=df))
+    return all_data
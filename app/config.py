@@ -24,3 +24,10 @@ AGENT_ENGAGED_TAG = "Agent-Engaged"
 
 GHL_CUSTOM_FIELD_NUMBER_OF_INTERACTION_KEY = "contact.number_of_interactions"
 GHL_CUSTOM_FIELD_LEAD_STATE_KEY = "contact.lead_state"
+
+LOCAL_STORE_CONTACT_NAMESPACE = "contact"
+LOCAL_STORE_SUMMARY_NAMESPACE = "conversation_summary"
+LOCAL_STORE_OBJECTION_LABEL_NAMESPACE = "objection_label"
+LOCAL_STORE_QUERY_EMBEDDING_NAMESPACE = "query_embedding"
+LOCAL_STORE_EMBEDDING_NAMESPACE = "embedding"
+LOCAL_STORE_KNOWLEDGE_BASE_NAMESPACE = "knowledge_base"
@@ -19,4 +19,5 @@ if not CLIENT_ID or not CLIENT_SECRET or not REDIRECT_URI:
     raise ValueError("LEADCONNECTOR_CLIENT_ID, LEADCONNECTOR_CLIENT_SECRET, and LEADCONNECTOR_REDIRECT_URI must be set in the environment variables")
 
 AUTHORIZATION_URL = "https://marketplace.leadconnectorhq.com/oauth/chooselocation"
-TOKEN_URL = "https://services.leadconnectorhq.com/oauth/token"  # url to get the token using the code from the authorization url
+API_BASE_URL = os.getenv("LEADCONNECTOR_API_BASE_URL", "https://services.leadconnectorhq.com").rstrip("/")
+TOKEN_URL = f"{API_BASE_URL}/oauth/token"  # url to get the token using the code from the authorization url
@@ -1,17 +1,21 @@
 import json
 from datetime import datetime, timedelta
 from typing import List, Optional
+from urllib.parse import urlparse
 
 import httpx
 from loguru import logger
 
 from utils.env import load_env_vars
-from integrations.lead_connector.config import CLIENT_ID, CLIENT_SECRET, TOKEN_URL
+from utils.metrics import GHL_REQUESTS
+from utils.tracing import start_span
+from integrations.lead_connector.config import API_BASE_URL, CLIENT_ID, CLIENT_SECRET, TOKEN_URL
 from integrations.lead_connector.models import (
     LCCustomField,
     LCContactInfo,
     LCMessage,
     LCMessageType,
+    LeadConnectorConfig,
 )
 from integrations.lead_connector.utils import (
     get_leadconnector_config_file,
@@ -25,13 +29,50 @@ NOT_SUPPORTED_MESSAGE_TYPES = [LCMessageType.TYPE_CALL, LCMessageType.TYPE_EMAIL
 class NoConversationFoundError(Exception):
     pass
 
+
+_http_client: Optional[httpx.Client] = None
+
+
+def get_endpoint_name(url: str) -> str:
+    """
+    Path of a LeadConnector url with ids replaced, e.g. /contacts/:id, to label spans and metrics by endpoint.
+
+    Args:
+        url (str): The request url.
+
+    Returns:
+        str: The path template of the url.
+    """
+    segments = urlparse(url).path.strip("/").split("/")
+    # LeadConnector ids are 20+ character alphanumeric strings
+    segments = [
+        ":id" if len(segment) >= 16 and any(c.isdigit() for c in segment) else segment
+        for segment in segments
+        if segment
+    ]
+    return "/" + "/".join(segments)
+
+
+def get_http_client() -> httpx.Client:
+    # shared across LeadConnector instances so requests reuse pooled connections
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.Client()
+    return _http_client
+
+
 class LeadConnector:
 
     def __init__(
         self,
         location_id,
+        config: Optional[LeadConnectorConfig] = None,
+        client: Optional[httpx.Client] = None,
     ):
-        self.config = get_leadconnector_config_file()
+        # a config passed in is owned by the caller, refreshed tokens are not persisted for it
+        self.persist_config = config is None
+        self.config = config if config is not None else get_leadconnector_config_file()
+        self.client = client if client is not None else get_http_client()
         self.location_id = location_id
         # valide the location id
         if self.location_id is None:
@@ -48,7 +89,7 @@ class LeadConnector:
         if location_id is None:
             logger.error("Location id cannot be empty")
             raise ValueError("Location id cannot be empty")
-        url = f"https://services.leadconnectorhq.com/locations/{location_id}"
+        url = f"{API_BASE_URL}/locations/{location_id}"
         response = self.make_request("GET", url)
         self.subaccount = response.json().get("location")
         return self.subaccount
@@ -62,7 +103,8 @@ class LeadConnector:
             "client_secret": CLIENT_SECRET,
         }
 
-        response = httpx.post(url, data=payload)
+        with start_span("ghl.token_refresh"):
+            response = self.client.post(url, data=payload)
         response_data = response.json()
 
         self.config.access_token = response_data["access_token"]
@@ -72,38 +114,47 @@ class LeadConnector:
             seconds=int(response_data["expires_in"])
         )
 
-        save_leadconnector_config(self.config)
+        if self.persist_config:
+            save_leadconnector_config(self.config)
 
     def make_request(self, method, url, **kwargs):
-        # if datetime.now() >= self.config.token_expiry:
-        self._refresh_token()
+        endpoint = get_endpoint_name(url)
+        with start_span(f"ghl.{method} {endpoint}") as span:
+            # if datetime.now() >= self.config.token_expiry:
+            self._refresh_token()
 
-        headers = kwargs.pop("headers", {})
-        headers["Authorization"] = f"Bearer {self.config.access_token}"
-        headers["Version"] = "2021-04-15"
+            headers = kwargs.pop("headers", {})
+            headers["Authorization"] = f"Bearer {self.config.access_token}"
+            headers["Version"] = "2021-04-15"
 
-        logger.debug(f"Making request to {url}")
-        response = httpx.request(method, url, headers=headers, **kwargs)
+            logger.debug(f"Making request to {url}")
+            try:
+                response = self.client.request(method, url, headers=headers, **kwargs)
 
-        if response.status_code == 401:  # Token expired or unauthorized
-            logger.debug("access token expired or currupted, refreshing token")
-            self._refresh_token()
-            headers["Authorization"] = f"Bearer {self.config.access_token}"
-            response = httpx.request(method, url, headers=headers, **kwargs)
+                if response.status_code == 401:  # Token expired or unauthorized
+                    logger.debug("access token expired or currupted, refreshing token")
+                    self._refresh_token()
+                    headers["Authorization"] = f"Bearer {self.config.access_token}"
+                    response = self.client.request(method, url, headers=headers, **kwargs)
+            except httpx.HTTPError as e:
+                GHL_REQUESTS.labels(method=method, endpoint=endpoint, status=type(e).__name__).inc()
+                raise
 
-        response.raise_for_status()
+            GHL_REQUESTS.labels(method=method, endpoint=endpoint, status=response.status_code).inc()
+            span.set_attribute("status_code", response.status_code)
+            response.raise_for_status()
 
-        return response
+            return response
 
     def get_user_by_location(self):
         url = (
-            f"https://services.leadconnectorhq.com/users/?locationId={self.location_id}"
+            f"{API_BASE_URL}/users/?locationId={self.location_id}"
         )
         response = self.make_request("GET", url)
         return response.json().get("users")
 
     def get_contact_info(self, contact_id: str) -> Optional[LCContactInfo]:
-        url = f"https://services.leadconnectorhq.com/contacts/{contact_id}"
+        url = f"{API_BASE_URL}/contacts/{contact_id}"
         response = self.make_request("GET", url)
         logger.debug(f"Contact info response: {response.json()}")
 
@@ -115,7 +166,7 @@ class LeadConnector:
         return LCContactInfo(**contact_data)
 
     def get_contact_by_email(self, email: str) -> LCContactInfo:
-        url = f"https://services.leadconnectorhq.com/contacts/"
+        url = f"{API_BASE_URL}/contacts/"
         params = {
             "locationId": self.location_id,
             "query": email,
@@ -132,7 +183,7 @@ class LeadConnector:
             logger.error("Data cannot be empty")
             raise ValueError("Data cannot be empty")
 
-        url = f"https://services.leadconnectorhq.com/contacts/{contact_id}"
+        url = f"{API_BASE_URL}/contacts/{contact_id}"
         response = self.make_request("PUT", url, json=data)
         logger.debug(f"Update contact response: {response.json()}")
         return response.json().get("contact")
@@ -185,7 +236,7 @@ class LeadConnector:
         return self.update_contact_tags(contact_id=contact_id, tags=tags)
 
     def get_conversation(self, conversation_id):
-        url = f"https://services.leadconnectorhq.com/conversations/{conversation_id}"
+        url = f"{API_BASE_URL}/conversations/{conversation_id}"
         response = self.make_request("GET", url)
         return response.json()
 
@@ -194,7 +245,7 @@ class LeadConnector:
             logger.error("Contact id cannot be empty")
             raise ValueError("Contact id cannot be empty")
 
-        url = f"https://services.leadconnectorhq.com/conversations/search"
+        url = f"{API_BASE_URL}/conversations/search"
         params = {
             "locationId": self.location_id,
             "contactId": contact_id,
@@ -233,7 +284,7 @@ class LeadConnector:
         if isinstance(limit, int) is False:
             raise ValueError("Limit must be an integer")
 
-        url = f"https://services.leadconnectorhq.com/conversations/{conversation_id}/messages"
+        url = f"{API_BASE_URL}/conversations/{conversation_id}/messages"
 
         # add the limit to the query params
         url += f"?limit={limit}"
@@ -272,7 +323,7 @@ class LeadConnector:
             logger.error("Contact id cannot be empty")
             raise ValueError("Contact id cannot be empty, None")
 
-        url = "https://services.leadconnectorhq.com/conversations/messages"
+        url = f"{API_BASE_URL}/conversations/messages"
         body = {"type": message_channel, "contactId": contact_id, "message": message}
 
         response = self.make_request("POST", url, json=body)
@@ -290,7 +341,7 @@ class LeadConnector:
             logger.error("Conversation id cannot be empty")
             raise ValueError("Conversation id cannot be empty")
 
-        url = f"https://services.leadconnectorhq.com/conversations/{conversation_id}"
+        url = f"{API_BASE_URL}/conversations/{conversation_id}"
         response = self.make_request("DELETE", url)
         if int(response.status_code) not in [200, 201]:
             logger.error(
@@ -309,7 +360,7 @@ class LeadConnector:
             raise ValueError("Contact id cannot be empty")
 
         # by default ghl doesnt create a conversation, if the conversation is not created, the messages will not be sent
-        url = "https://services.leadconnectorhq.com/conversations/"
+        url = f"{API_BASE_URL}/conversations/"
 
         body = {
             "locationId": self.location_id, 
@@ -321,7 +372,7 @@ class LeadConnector:
 
     def get_custom_fields(self) -> List[LCCustomField]:
 
-        url = f"https://services.leadconnectorhq.com/locations/{self.location_id}/customFields"
+        url = f"{API_BASE_URL}/locations/{self.location_id}/customFields"
         response = self.make_request("GET", url)
         data = response.json().get("customFields")
 
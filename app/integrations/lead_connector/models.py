@@ -110,6 +110,8 @@ class LeadConnectorConfig(BaseModel):
     location_id: str
     user_id: str
     token_expiry: datetime = None  # To track token expiry time
+    # ETag of the blob version the config was read from, so saving it never overwrites a newer version
+    blob_etag: Optional[str] = Field(default=None, exclude=True)
 
 
 class DNDSettings(BaseModel):
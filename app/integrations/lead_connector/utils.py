@@ -1,11 +1,17 @@
 from datetime import datetime, timedelta
 import json
 import os
+import threading
 from typing import List, Optional
 from httpx import AsyncClient
 import httpx
 from loguru import logger
-from utils.azure import get_default_azure_connection_string, get_default_azure_container_name, get_json_from_blob, upload_json_to_blob
+from utils.azure import (
+    get_default_azure_connection_string,
+    get_default_azure_container_name,
+    get_json_from_blob_with_etag,
+    upload_json_to_blob_if_match,
+)
 from utils.env import is_dev_env
 from integrations.lead_connector.config import (
     AUTHORIZATION_URL,
@@ -252,8 +258,11 @@ def save_leadconnector_config(
         full_file_path = os.path.join(file_path, file_name)
 
         try:
-            with open(full_file_path, "w", encoding="utf-8") as file:
+            # write then rename, so concurrent readers never see a half written file
+            tmp_file_path = f"{full_file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_file_path, "w", encoding="utf-8") as file:
                 json.dump(json_data, file, indent=4)
+            os.replace(tmp_file_path, full_file_path)
         except Exception as e:
             raise Exception(f"Error saving config to {full_file_path}: {str(e)}") from e
 
@@ -262,12 +271,15 @@ def save_leadconnector_config(
         default_container_name = get_default_azure_container_name()
         blob_name = file_name
 
-        upload_json_to_blob(
+        uploaded, etag = upload_json_to_blob_if_match(
                 connection_string=connection_string,
                 container_name=default_container_name,
                 blob_name=blob_name,
-                json_data=json_data
+                json_data=json_data,
+                etag=config.blob_etag,
             )
+        if uploaded:
+            config.blob_etag = etag
 
 
 # get the configurations from the config file
@@ -282,10 +294,11 @@ def get_leadconnector_config_file() -> LeadConnectorConfig:
         connection_string = get_default_azure_connection_string()
         default_container_name = get_default_azure_container_name()
         file_name = CONFIG_FILE_NAME
-        data = get_json_from_blob(
+        data, etag = get_json_from_blob_with_etag(
             connection_string=connection_string, 
             container_name=default_container_name, 
             blob_name=file_name)
+        data["blob_etag"] = etag
 
     # Calculate and set the token expiry time
     data["token_expiry"] = datetime.now() + timedelta(
@@ -343,7 +356,7 @@ def convert_lcmessage_to_chatmessage(messages: List[LCMessage]) -> List[ChatMess
         chat_message = ChatMessage(
             role=role,
             content=msg.body,
-            additional_kwargs={"dateAdded": str(msg.dateAdded)},
+            additional_kwargs={"id": msg.id, "dateAdded": str(msg.dateAdded)},
         )
         chat_messages.append(chat_message)
 
@@ -1,18 +1,28 @@
 import os
-from fastapi import Depends, FastAPI
+from fastapi import Depends, FastAPI, Response
 from fastapi.openapi.utils import get_openapi
 from loguru import logger
 
+from utils.startup_profile import startup_timer
+
 ## import to load environment variables first before importing our modules 
-from utils.env import load_env_vars
-load_env_vars()
+from utils.env import load_env_vars, start_env_refresh
+
+with startup_timer.phase("load_env_vars"):
+    load_env_vars()
+
+# optionally pick up changes to the remote env blob without restarting the process
+if os.getenv("ENV_REFRESH_INTERVAL_SECONDS"):
+    start_env_refresh(float(os.getenv("ENV_REFRESH_INTERVAL_SECONDS")))
 
-from api import ava
-from api import oauth
-from api import webhook
-from api import lead_connector
+with startup_timer.phase("import api routers"):
+    from api import ava
+    from api import oauth
+    from api import webhook
+    from api import lead_connector
 
-from security import get_api_key
+    from security import get_api_key, get_metrics_access
+    from utils.metrics import render_metrics
 
 
 app = FastAPI()
@@ -32,6 +42,15 @@ app.include_router(
 async def health():
     return {"status": "ok"}
 
+# prometheus scrape endpoint
+@app.get("/metrics", dependencies=[Depends(get_metrics_access)])
+def metrics():
+    rendered = render_metrics()
+    if rendered is None:
+        return Response("prometheus_client is not installed", status_code=503, media_type="text/plain")
+    payload, content_type = rendered
+    return Response(payload, media_type=content_type)
+
 def custom_openapi():
     if app.openapi_schema:
         return app.openapi_schema
@@ -52,6 +71,8 @@ def custom_openapi():
 
 app.openapi = custom_openapi
 
+startup_timer.log_report()
+
 if __name__ == "__main__":
     # run the following uvicorn main:app --host 0.0.0.0 --port 8080
     os.system("uvicorn main:app --host 0.0.0.0 --port 8080 --reload")
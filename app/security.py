@@ -2,6 +2,7 @@ from fastapi import HTTPException, Security
 from fastapi.security.api_key import APIKeyHeader
 from starlette.status import HTTP_403_FORBIDDEN
 import os
+from typing import Optional
 from utils.env import load_env_vars
 
 
@@ -39,3 +40,21 @@ def get_api_key(
         raise HTTPException(
             status_code=HTTP_403_FORBIDDEN, detail="Could not validate API key"
         )
+
+
+def get_metrics_access(
+    authorization: Optional[str] = Security(APIKeyHeader(name="Authorization", auto_error=False)),
+    api_key_header: Optional[str] = Security(APIKeyHeader(name=API_KEY_NAME, auto_error=False)),
+):
+    """
+    Guards /metrics, accepting METRICS_TOKEN as a bearer token so Prometheus can
+    scrape with its authorization config, or one of the API keys.
+    """
+    metrics_token = os.getenv("METRICS_TOKEN")
+    if metrics_token and authorization == f"Bearer {metrics_token}":
+        return
+    if api_key_header in (API_KEY1, API_KEY2):
+        return
+    raise HTTPException(
+        status_code=HTTP_403_FORBIDDEN, detail="Could not validate metrics token"
+    )
@@ -1,6 +1,10 @@
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
+import hashlib
 import json
 import os
+import time
 from typing import List, Optional, Tuple, Union
 import sys
 
@@ -13,35 +17,29 @@ path = sys.path[0].split("app")[0]
 sys.path.append(path)
 
 from services.azure_openai_service import get_azureopenai_service, LeadState
-from services.weather_service import WeatherService
+from services.conversation_summary_service import ConversationSummaryService, is_conversation_summary_enabled
+from services.geocoding_service import geocode_city, get_timezone_by_coordinates
+from services.weather_service import AsyncWeatherService, format_weather_info
 from ava.ava import Ava
-from datamodel import ChatMessage, ChatResponse
+from config import LOCAL_STORE_CONTACT_NAMESPACE
+from datamodel import ChatMessage, ChatResponse, MessageRole
+from utils.local_store import get_local_store
+from utils.tokens import TokenUsage, TurnTokenBudget, start_turn_budget, trim_messages_to_budget
+from utils.tracing import start_span
 
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut, GeocoderUnavailable
-
-from timezonefinder import TimezoneFinder
-import pytz
 
 def get_timezone_by_city(city: str) -> Optional[str]:
-    geolocator = Nominatim(user_agent="my_app")
-    tf = TimezoneFinder()
-    try:
-        location = geolocator.geocode(city)
-        if location:
-            # Find the timezone for the coordinates
-            timezone_str = tf.timezone_at(lat=location.latitude, lng=location.longitude)
-            if timezone_str:
-                # Return the full timezone name
-                return timezone_str
-            else:
-                logger.debug(f"Could not determine timezone for {city}")
-                return None
-        else:
-            logger.debug(f"Could not find location for {city}")
-            return None
-    except (GeocoderTimedOut, GeocoderUnavailable):
-        print("Error: The geocoding service is unavailable. Please try again later.")
+    coordinates = geocode_city(city)
+    if coordinates is None:
+        return None
+
+    # Find the timezone for the coordinates
+    timezone_str = get_timezone_by_coordinates(*coordinates)
+    if timezone_str:
+        # Return the full timezone name
+        return timezone_str
+    else:
+        logger.debug(f"Could not determine timezone for {city}")
         return None
 
 
@@ -79,21 +77,92 @@ def get_local_time(timezone: str) -> Optional[datetime]:
         return None
 
 
+def is_weather_context_enabled() -> bool:
+    return os.getenv("WEATHER_CONTEXT_ENABLED", "false").lower() in ["true", "1", "yes"]
+
+
+@lru_cache()
+def get_weather_service(api_key: Optional[str]) -> AsyncWeatherService:
+    # one service per process, so its HTTP client and connections are reused across turns
+    return AsyncWeatherService(api_key)
+
+
 def get_weather(city: str):
-    weather_service = WeatherService(os.getenv("OPENWEATHER_API_KEY"))
+    weather_service = get_weather_service(os.getenv("OPENWEATHER_API_KEY"))
     try:
-        return weather_service.get_weather_by_city(city)
+        # respond runs in a worker thread, the lookup runs on the weather loop within the latency budget
+        return weather_service.get_weather_by_city_sync(city)
     except Exception as e:
         logger.error(f"Error fetching weather data: {e}")
         return None
 
-    # usage example
-    # weather = None if city is None else get_weather(city)
-    # weather_info = (
-    #     f"Weather: {weather['description']}, Temperature: {weather['temperature']}°F"
-    #     if weather
-    #     else "information unavailable"
-    # )
+
+def get_weather_info(city: Optional[str]) -> str:
+    weather = None if city is None else get_weather(city)
+    return format_weather_info(weather)
+
+
+def _get_int_env(name: str) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value else None
+
+
+def get_turn_token_budget() -> Optional[int]:
+    """Token budget for all completions of a turn, TURN_TOKEN_BUDGET, unlimited if unset."""
+    return _get_int_env("TURN_TOKEN_BUDGET")
+
+
+def get_history_token_budget(turn_token_budget: Optional[int]) -> Optional[int]:
+    """Token budget for the conversation history, HISTORY_TOKEN_BUDGET, half the turn budget if unset."""
+    history_token_budget = _get_int_env("HISTORY_TOKEN_BUDGET")
+    if history_token_budget is None and turn_token_budget is not None:
+        history_token_budget = turn_token_budget // 2
+    return history_token_budget
+
+
+def get_contact_token_budget() -> Optional[int]:
+    """Lifetime token budget per contact, CONTACT_TOKEN_BUDGET, unlimited if unset."""
+    return _get_int_env("CONTACT_TOKEN_BUDGET")
+
+
+def get_contact_token_usage(contact_id: str) -> dict:
+    contact = get_local_store().get(LOCAL_STORE_CONTACT_NAMESPACE, contact_id) or {}
+    return contact.get("token_usage") or {
+        "turns": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+    }
+
+
+def save_contact_token_usage(contact_id: str, turn_usage: TokenUsage, count_turn: bool = True) -> dict:
+    """
+    Add the usage of a turn to the contact's lifetime token usage in the local store.
+
+    Args:
+        contact_id (str): The contact the turn was for.
+        turn_usage (TokenUsage): The token usage of the turn.
+        count_turn (bool): Whether the usage is a turn, False for work done after the reply, e.g. summaries.
+
+    Returns:
+        dict: The contact's updated token usage.
+    """
+    usage = get_contact_token_usage(contact_id)
+    usage["prompt_tokens"] += turn_usage.prompt_tokens
+    usage["completion_tokens"] += turn_usage.completion_tokens
+    if count_turn:
+        usage["turns"] += 1
+        usage["last_turn"] = turn_usage.model_dump()
+    get_local_store().update(LOCAL_STORE_CONTACT_NAMESPACE, contact_id, token_usage=usage)
+    return usage
+
+
+# conversation summaries are updated after the reply was sent, off the request thread
+summary_update_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="summary-update")
+
+
+def get_conversation_key(contact_id: str, channel: Optional[str] = None) -> str:
+    # the history is filtered by channel, so each channel of a contact has its own summary
+    return contact_id if channel is None else f"{contact_id}:{channel}"
 
 
 def load_prompt_template(file_path: str) -> str:
@@ -142,6 +211,64 @@ class ContactInfo(BaseModel):
     pre_qualification_qa: Optional[dict] = {}
 
 
+# lead states are reused while the lead has not said anything new, for at most a day
+DEFAULT_LEAD_STATE_TTL_SECONDS = 24 * 60 * 60
+
+
+def get_lead_state_fingerprint(messages: List[ChatMessage]) -> str:
+    """Hash of the lead's own messages, it changes exactly when the lead says something new."""
+    digest = hashlib.sha256()
+    for message in messages:
+        if message.role == MessageRole.USER:
+            digest.update((message.content or "").encode("utf-8"))
+            digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def get_memoized_lead_state(contact_info: ContactInfo, fingerprint: str) -> Optional[LeadState]:
+    """
+    Returns the lead state determined in an earlier turn, if the lead has not said anything new since.
+
+    Args:
+        contact_info (ContactInfo): The contact, its lead_state is the value stored in GHL.
+        fingerprint (str): The fingerprint of the lead's messages in this turn.
+
+    Returns:
+        Optional[LeadState]: The memoized lead state, None if it has to be determined again.
+    """
+    cached_contact = get_local_store().get(LOCAL_STORE_CONTACT_NAMESPACE, contact_info.id) or {}
+    if cached_contact.get("lead_state_fingerprint") != fingerprint:
+        return None
+
+    ttl = float(os.getenv("LEAD_STATE_TTL_SECONDS", DEFAULT_LEAD_STATE_TTL_SECONDS))
+    if time.time() - cached_contact.get("lead_state_at", 0) > ttl:
+        return None
+
+    lead_state = cached_contact.get("lead_state") or contact_info.lead_state
+    try:
+        return LeadState(lead_state)
+    except ValueError:
+        return None
+
+
+def get_fallback_lead_state(contact_info: ContactInfo) -> LeadState:
+    # the lead state stored in GHL, cold for contacts that have none
+    try:
+        return LeadState(contact_info.lead_state)
+    except ValueError:
+        return LeadState.COLD
+
+
+def memoize_lead_state(contact_id: str, fingerprint: str, lead_state: LeadState) -> None:
+    get_local_store().update(
+        LOCAL_STORE_CONTACT_NAMESPACE,
+        contact_id,
+        lead_state=lead_state.value,
+        lead_state_fingerprint=fingerprint,
+        lead_state_at=time.time(),
+    )
+
+
 def format_pre_qualification_qa(pre_qualification_qa: Optional[dict]) -> str:
     if pre_qualification_qa is None or len(pre_qualification_qa) == 0:
         return "No pre-qualification information available."
@@ -166,7 +293,12 @@ def get_lead_state_description(join_string: str = "\n    "):
         [f"{key}: {value}" for key, value in lead_state_descriptions.items()]
     )
 
-def get_context(contact_info: ContactInfo, local_time: Optional[datetime], lead_state: str):
+def get_context(
+    contact_info: ContactInfo,
+    local_time: Optional[datetime],
+    lead_state: str,
+    weather_info: Optional[str] = None,
+):
     context = f"""
 About the lead:
 - First_Name: {contact_info.first_name if contact_info.first_name is not None else "Not provided"}
@@ -186,6 +318,8 @@ Pre-qualification Information:
 Spatial Information:
 - Local_Time: {format_local_time(local_time) if local_time is not None else "Information unavailable"}
         """
+    if weather_info is not None:
+        context = context.rstrip() + f"\n- Weather: {weather_info}\n"
 
     logger.debug(f"Context message: {context}")
     return context
@@ -218,16 +352,20 @@ class AVAServiceRespondResponse(BaseModel):
     content: str
     is_generated: bool
     lead_state: LeadState
+    timezone: Optional[str] = None  # timezone resolved for the contact during this turn
+    token_usage: Optional[TokenUsage] = None
 
 class AvaService:
     def __init__(self):
         self.ava = Ava()
         self.openai_service = get_azureopenai_service()
+        self.summary_service = ConversationSummaryService(self.openai_service)
 
     def respond(
         self,
         contact_info: ContactInfo,
         conversation_messages: List[ChatMessage] = list(),
+        channel: Optional[str] = None,
     ) -> AVAServiceRespondResponse:
         """
         Generates a message for a lead based on their contact information, chat history, and current state.
@@ -236,6 +374,7 @@ class AvaService:
             contact_info (dict): A dictionary containing the contact information of the lead.
             chat_history (List[ChatMessage]): A list of previous chat messages with the lead.
             user_message (Optional[ChatMessage], optional): The user's message to the lead. Defaults to None.
+            channel (Optional[str], optional): The channel the conversation is on, e.g. TYPE_SMS. Defaults to None.
 
         Returns:
             Tuple[bool, str]: A tuple containing a boolean indicating the success of message generation and the generated message.
@@ -248,22 +387,156 @@ class AvaService:
         if not isinstance(contact_info, ContactInfo):
             logger.error("contact_info must be of type ContactInfo")
 
+        turn_token_budget = get_turn_token_budget()
+        summary_enabled = is_conversation_summary_enabled()
+        with start_turn_budget(turn_token_budget) as budget:
+            # messages covered by the conversation summary are replaced by it
+            summary, recent_messages = (
+                self.summary_service.get_context(
+                    get_conversation_key(contact_info.id, channel), conversation_messages
+                )
+                if summary_enabled
+                else (None, conversation_messages)
+            )
+            # long conversations only send their most recent messages
+            recent_messages = trim_messages_to_budget(
+                recent_messages, get_history_token_budget(turn_token_budget)
+            )
+            response = self._respond(
+                contact_info,
+                recent_messages,
+                budget,
+                summary,
+                lead_state_fingerprint=get_lead_state_fingerprint(conversation_messages),
+            )
+
+        response.token_usage = budget.usage
+        contact_usage = save_contact_token_usage(contact_info.id, budget.usage)
+        logger.info(
+            f"Turn used {budget.usage.total_tokens} tokens {budget.usage.by_purpose}, "
+            f"contact total {contact_usage['prompt_tokens'] + contact_usage['completion_tokens']}"
+        )
+        return response
+
+    def schedule_summary_update(
+        self,
+        contact_id: str,
+        conversation_messages: List[ChatMessage],
+        channel: Optional[str] = None,
+    ) -> Optional[Future]:
+        """
+        Update the conversation summary in the background, to be called once the reply was sent.
+
+        Args:
+            contact_id (str): The contact the conversation is with.
+            conversation_messages (List[ChatMessage]): The full conversation, oldest first.
+            channel (Optional[str]): The channel the conversation is on, e.g. TYPE_SMS.
+
+        Returns:
+            Optional[Future]: The scheduled update, None if conversation summaries are disabled.
+        """
+        if not is_conversation_summary_enabled():
+            return None
+        return summary_update_executor.submit(
+            self._update_summary, contact_id, list(conversation_messages), channel
+        )
+
+    def _update_summary(
+        self, contact_id: str, conversation_messages: List[ChatMessage], channel: Optional[str]
+    ) -> None:
+        try:
+            # not part of any turn, the tokens still count towards the contact's lifetime usage
+            with start_turn_budget() as budget:
+                self.summary_service.update(get_conversation_key(contact_id, channel), conversation_messages)
+            if budget.usage.total_tokens > 0:
+                save_contact_token_usage(contact_id, budget.usage, count_turn=False)
+        except Exception as e:
+            logger.error(f"Error updating the conversation summary of {contact_id}: {e}")
+
+    def get_analysis_model(self, contact_id: str) -> Optional[str]:
+        # contacts over their lifetime budget get the cheaper analysis model, if one is configured
+        contact_token_budget = get_contact_token_budget()
+        fallback_model = os.getenv("AZURE_OPENAI_FALLBACK_ANALYSIS_MODEL")
+        if contact_token_budget is None or fallback_model is None:
+            return None
+
+        usage = get_contact_token_usage(contact_id)
+        if usage["prompt_tokens"] + usage["completion_tokens"] < contact_token_budget:
+            return None
+        logger.info(f"Contact {contact_id} is over its token budget, using {fallback_model} for analysis")
+        return fallback_model
+
+    def determine_lead_state(
+        self,
+        contact_info: ContactInfo,
+        conversation_messages: List[ChatMessage],
+        summary: Optional[str] = None,
+        lead_state_fingerprint: Optional[str] = None,
+    ) -> LeadState:
+        """
+        Understand the sales state of the lead, unless the lead has not said anything new since it was last determined.
+
+        Only successful classifications are memoized. If the classification fails, the
+        lead state stored in GHL is used for this turn and classified again next turn.
+
+        Args:
+            contact_info (ContactInfo): The contact.
+            conversation_messages (List[ChatMessage]): The conversation sent to the classifier.
+            summary (Optional[str]): Summary of the messages before conversation_messages.
+            lead_state_fingerprint (Optional[str]): Fingerprint of the lead's messages, None to not memoize.
+
+        Returns:
+            LeadState: The lead state.
+        """
+        lead_state = (
+            get_memoized_lead_state(contact_info, lead_state_fingerprint)
+            if lead_state_fingerprint is not None
+            else None
+        )
+        if lead_state is not None:
+            logger.info(f"Reusing lead state {lead_state.value}, no new messages from the lead")
+            return lead_state
+
+        lead_state = self.openai_service.determine_lead_state(
+            conversation_history=[message.dict() for message in conversation_messages],
+            model=self.get_analysis_model(contact_info.id),
+            summary=summary,
+        )
+        if lead_state is None:
+            lead_state = get_fallback_lead_state(contact_info)
+            logger.warning(f"Could not determine the lead state, using {lead_state.value} for this turn")
+        elif lead_state_fingerprint is not None:
+            memoize_lead_state(contact_info.id, lead_state_fingerprint, lead_state)
+        return lead_state
+
+    def _respond(
+        self,
+        contact_info: ContactInfo,
+        conversation_messages: List[ChatMessage],
+        budget: TurnTokenBudget,
+        summary: Optional[str] = None,
+        lead_state_fingerprint: Optional[str] = None,
+    ) -> AVAServiceRespondResponse:
         # collecting metadata for the lead
         time_zone = contact_info.timezone
         contact_city = contact_info.city
 
-        time_zone = get_timezone(time_zone, contact_city)
+        with start_span("timezone"):
+            time_zone = get_timezone(time_zone, contact_city)
         local_time = get_local_time(time_zone) if time_zone is not None else None
 
-        # understand the sales state of the lead
-        lead_state = self.openai_service.determine_lead_state(
-            conversation_history=[message.dict() for message in conversation_messages]
+        lead_state = self.determine_lead_state(
+            contact_info, conversation_messages, summary, lead_state_fingerprint
         )
 
         # Creating the context message
         prompt_template = load_prompt_template("prompt/lead_engage_sms.txt")
 
-        context_message = get_context(contact_info, local_time, lead_state)
+        weather_info = None
+        if is_weather_context_enabled():
+            with start_span("weather"):
+                weather_info = get_weather_info(contact_city)
+        context_message = get_context(contact_info, local_time, lead_state, weather_info)
 
         if lead_state != LeadState.READY_FOR_APPOINTMENT:
             try:
@@ -277,10 +550,12 @@ class AvaService:
                 rep = self.ava.respond(
                     conversation_messages=conversation_messages,
                     system_message=system_message,
+                    summary=summary,
                 )
                 return AVAServiceRespondResponse(content=rep.message.content,
                                                  is_generated=True,
-                                                 lead_state=lead_state)
+                                                 lead_state=lead_state,
+                                                 timezone=time_zone)
 
             except Exception as e:
                 logger.error(f"Error generating message: {e}")
@@ -288,12 +563,14 @@ class AvaService:
                     content=f"An error occurred while generating the message for contact {contact_info.id}: {contact_info.full_name}.",
                     is_generated=False,
                     lead_state=lead_state,
+                    timezone=time_zone,
                 )
         else:
             return AVAServiceRespondResponse(
                     content=create_message_to_notify_user(contact_info),
                     is_generated=False,
-                    lead_state=lead_state
+                    lead_state=lead_state,
+                    timezone=time_zone,
                 )
 
 
@@ -1,11 +1,15 @@
 from enum import Enum
 import json
 import os
-from typing import Dict, List, Protocol
+from typing import Dict, List, Optional, Protocol
 from dotenv import load_dotenv
 from loguru import logger
 from openai import AzureOpenAI
 
+from utils.history import format_history
+from utils.metrics import record_openai_usage
+from utils.tracing import start_span
+
 
 class LeadState(str, Enum):
     COLD = "cold"
@@ -15,11 +19,24 @@ class LeadState(str, Enum):
     NOT_INTERESTED = "not_interested"
 
 
+# the lead state depends on the recent conversation, older messages only grow the prompt
+DEFAULT_LEAD_STATE_HISTORY_TOKENS = 1500
+# caps the new messages folded into a conversation summary in one call
+SUMMARY_INPUT_TOKENS = 3000
+
+
+def get_lead_state_history_tokens() -> int:
+    return int(os.getenv("LEAD_STATE_HISTORY_TOKENS", DEFAULT_LEAD_STATE_HISTORY_TOKENS))
+
+
 class OpenAIServiceInterface(Protocol):
     def generate_response(self, context: str, user_message: str) -> str: ...
     def determine_lead_state(
-        self, conversation_history: List[Dict[str, str]]
-    ) -> LeadState: ...
+        self,
+        conversation_history: List[Dict[str, str]],
+        model: Optional[str] = None,
+        summary: Optional[str] = None,
+    ) -> Optional[LeadState]: ...
 
 
 class AzureOpenAIService:
@@ -54,19 +71,39 @@ class AzureOpenAIService:
             raise ValueError(f"Error in health check: {e}") from e
 
     def generate_response(self, context: str, user_message: str) -> str:
-        response = self.client.chat.completions.create(
-            temperature=0.5,
-            model=self.chat_model,
-            messages=[
-                {"role": "system", "content": context},
-                {"role": "user", "content": user_message},
-            ],
-        )
+        with start_span("llm.generate_response", model=self.chat_model):
+            response = self.client.chat.completions.create(
+                temperature=0.5,
+                model=self.chat_model,
+                messages=[
+                    {"role": "system", "content": context},
+                    {"role": "user", "content": user_message},
+                ],
+            )
+        record_openai_usage("generate_response", self.chat_model, response.usage)
         return response.choices[0].message.content
 
     def determine_lead_state(
-        self, conversation_history: List[Dict[str, str]]
-    ) -> LeadState:
+        self,
+        conversation_history: List[Dict[str, str]],
+        model: Optional[str] = None,
+        summary: Optional[str] = None,
+    ) -> Optional[LeadState]:
+        """
+        Classify the lead's state from the conversation.
+
+        Args:
+            conversation_history (List[Dict[str, str]]): The conversation, oldest first.
+            model (Optional[str]): The model to use, the analysis model if None.
+            summary (Optional[str]): Summary of the messages before conversation_history.
+
+        Returns:
+            Optional[LeadState]: The lead state, None if the completion could not be parsed.
+        """
+        model = model or self.analysis_model
+        history = format_history(
+            conversation_history, max_tokens=get_lead_state_history_tokens(), summary=summary
+        )
         prompt = f"""
             Analyze the following conversation history and determine the lead's current state.
             The possible states are:
@@ -77,7 +114,7 @@ class AzureOpenAIService:
             - NOT_INTERESTED: The lead has explicitly expressed lack of interest.
 
             Conversation history:
-            {conversation_history}
+            {history}
 
             Based on this conversation, what is the current state of the lead? 
             Respond with a JSON object in the following format:
@@ -86,13 +123,15 @@ class AzureOpenAIService:
             """
 
         try:
-            response = self.client.chat.completions.create(
-                model=self.analysis_model,
-                messages=[{"role": "user", "content": prompt}],
-                response_format={"type": "json_object"},
-                max_tokens=50,
-                temperature=0
-            )
+            with start_span("llm.lead_state", model=model):
+                response = self.client.chat.completions.create(
+                    model=model,
+                    messages=[{"role": "user", "content": prompt}],
+                    response_format={"type": "json_object"},
+                    max_tokens=50,
+                    temperature=0
+                )
+            record_openai_usage("lead_state", model, response.usage)
 
             result = json.loads(response.choices[0].message.content)
             state_str = result.get("lead_state", "").upper()
@@ -103,13 +142,48 @@ class AzureOpenAIService:
                 raise ValueError(f"Invalid lead state returned: {state_str}")
 
         except (json.JSONDecodeError, KeyError, ValueError) as e:
-            print(f"Error in determining lead state: {e}")
-            # Default to COLD if there's any error in parsing or invalid state
-            return LeadState.COLD
+            # no state rather than a default one, so callers can fall back to the last known state
+            logger.error(f"Error in determining lead state: {e}")
+            return None
+
+    def summarize_conversation(
+        self, new_messages: List[Dict[str, str]], summary: Optional[str] = None
+    ) -> str:
+        """
+        Fold new messages into the running summary of a conversation.
+
+        Args:
+            new_messages (List[Dict[str, str]]): The messages since the last summary, oldest first.
+            summary (Optional[str]): The current summary, None for the first one.
+
+        Returns:
+            str: The updated summary.
+        """
+        prompt = f"""
+            You keep a running summary of an SMS conversation between AVA, a solar sales assistant, and a lead.
+            Update the summary with the new messages. Keep what the lead shared about their home,
+            electric bill, roof and availability, their questions and objections, and anything promised to them.
+            Use at most 120 words and respond with the summary only.
+
+            Current summary:
+            {summary or "None yet"}
+
+            New messages:
+            {format_history(new_messages, max_tokens=SUMMARY_INPUT_TOKENS)}
+            """
+
+        with start_span("llm.summary", model=self.analysis_model):
+            response = self.client.chat.completions.create(
+                model=self.analysis_model,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=250,
+                temperature=0,
+            )
+        record_openai_usage("summary", self.analysis_model, response.usage)
+        return response.choices[0].message.content.strip()
 
 
 def get_azureopenai_service():
-    load_dotenv()
     azure_endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
     azure_api_key = os.getenv("AZURE_OPENAI_API_KEY")
     deployment_name = os.environ.get("AZURE_OPENAI_DEPLOYMENT_NAME")
@@ -146,6 +220,8 @@ if __name__ == "__main__":
     from pydantic import BaseModel
     from openai import OpenAI
 
+    load_dotenv()
+
     client = get_azureopenai_service().client
 
     class Step(BaseModel):
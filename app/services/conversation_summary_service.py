@@ -0,0 +1,135 @@
+import os
+from typing import List, Optional, Tuple
+
+from loguru import logger
+from pydantic import BaseModel
+
+from config import LOCAL_STORE_SUMMARY_NAMESPACE
+from datamodel import ChatMessage
+from services.azure_openai_service import AzureOpenAIService
+from utils.local_store import LocalStore, get_local_store
+from utils.tracing import start_span
+
+# messages always sent verbatim, older messages are replaced by the summary
+DEFAULT_RECENT_MESSAGES = 6
+# the summary is only updated once this many messages fell out of the recent window, so it costs
+# one call every few turns instead of every turn
+SUMMARY_UPDATE_BATCH = 4
+
+
+def is_conversation_summary_enabled() -> bool:
+    return os.getenv("CONVERSATION_SUMMARY_ENABLED", "false").lower() in ["true", "1", "yes"]
+
+
+def get_message_id(message: ChatMessage) -> Optional[str]:
+    return message.additional_kwargs.get("id")
+
+
+class ConversationSummary(BaseModel):
+    summary: str
+    last_message_id: str  # id of the last message folded into the summary
+    summarized_messages: int
+
+
+class ConversationSummaryService:
+    """
+    Keeps a rolling summary per conversation in the local store.
+
+    The summary covers every message up to last_message_id, so a turn can send
+    the summary plus the messages after it instead of the whole transcript. It is
+    only used when every message has an id, i.e. for messages coming from LeadConnector.
+
+    Args:
+        openai_service (AzureOpenAIService): Used to fold new messages into the summary.
+        store (Optional[LocalStore]): Where summaries are kept, the process wide store by default.
+        recent_messages (int): Number of latest messages always sent verbatim.
+    """
+
+    def __init__(
+        self,
+        openai_service: AzureOpenAIService,
+        store: Optional[LocalStore] = None,
+        recent_messages: int = DEFAULT_RECENT_MESSAGES,
+    ):
+        self.openai_service = openai_service
+        self.store = store if store is not None else get_local_store()
+        self.recent_messages = recent_messages
+
+    def get_summary(self, conversation_key: str) -> Optional[ConversationSummary]:
+        value = self.store.get(LOCAL_STORE_SUMMARY_NAMESPACE, conversation_key)
+        return ConversationSummary(**value) if value is not None else None
+
+    def _get_summarized_count(
+        self, summary: Optional[ConversationSummary], message_ids: List[Optional[str]]
+    ) -> int:
+        # a summary whose last message is not in the conversation (deleted, other channel) is ignored
+        if summary is None or summary.last_message_id not in message_ids:
+            return 0
+        return message_ids.index(summary.last_message_id) + 1
+
+    def get_context(
+        self, conversation_key: str, messages: List[ChatMessage]
+    ) -> Tuple[Optional[str], List[ChatMessage]]:
+        """
+        Split a conversation into its stored summary and the messages after it.
+
+        Args:
+            conversation_key (str): Identifies the conversation, e.g. the contact id.
+            messages (List[ChatMessage]): The full conversation, oldest first.
+
+        Returns:
+            Tuple[Optional[str], List[ChatMessage]]: The summary, None if there is none usable,
+            and the messages it does not cover.
+        """
+        message_ids = [get_message_id(message) for message in messages]
+        if len(messages) <= self.recent_messages or None in message_ids:
+            return None, messages
+
+        summary = self.get_summary(conversation_key)
+        summarized_count = self._get_summarized_count(summary, message_ids)
+        if summarized_count == 0:
+            return None, messages
+
+        logger.debug(f"Using summary of {summarized_count} messages for {conversation_key}")
+        return summary.summary, messages[summarized_count:]
+
+    def update(
+        self, conversation_key: str, messages: List[ChatMessage]
+    ) -> Optional[ConversationSummary]:
+        """
+        Fold the messages that fell out of the recent window into the summary, once enough of them piled up.
+
+        Args:
+            conversation_key (str): Identifies the conversation, e.g. the contact id.
+            messages (List[ChatMessage]): The full conversation, oldest first.
+
+        Returns:
+            Optional[ConversationSummary]: The current summary, None if the conversation has none.
+        """
+        message_ids = [get_message_id(message) for message in messages]
+        if None in message_ids:
+            return None
+
+        summary = self.get_summary(conversation_key)
+        summarized_count = self._get_summarized_count(summary, message_ids)
+        if summarized_count == 0:
+            summary = None
+
+        older_messages = messages[: max(0, len(messages) - self.recent_messages)]
+        new_messages = older_messages[summarized_count:]
+        if len(new_messages) == 0 or (summary is not None and len(new_messages) < SUMMARY_UPDATE_BATCH):
+            return summary
+
+        with start_span("summary.update", messages=len(new_messages)):
+            summary_text = self.openai_service.summarize_conversation(
+                new_messages=[message.dict() for message in new_messages],
+                summary=summary.summary if summary is not None else None,
+            )
+        summary = ConversationSummary(
+            summary=summary_text,
+            last_message_id=message_ids[len(older_messages) - 1],
+            summarized_messages=len(older_messages),
+        )
+        self.store.set(LOCAL_STORE_SUMMARY_NAMESPACE, conversation_key, summary.model_dump())
+        logger.info(f"Updated summary of {conversation_key} to cover {len(older_messages)} messages")
+        return summary
@@ -0,0 +1,78 @@
+from typing import Optional, Tuple
+
+from geopy.exc import GeocoderTimedOut, GeocoderUnavailable
+from geopy.geocoders import Nominatim
+from loguru import logger
+
+from utils.cache import MISSING, TTLCache
+
+GEOCODE_TIMEOUT_SECONDS = 5
+GEOCODE_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60  # cities dont move, a week is plenty
+# the leads are in the US, every caller geocodes within it so they share cache entries
+DEFAULT_COUNTRY_CODE = "US"
+
+# shared by the timezone resolver and the weather service, so a city is geocoded once per process
+geocode_cache = TTLCache(maxsize=4096, ttl=GEOCODE_CACHE_TTL_SECONDS, name="geocode")
+
+_geolocator: Optional[Nominatim] = None
+_timezone_finder = None
+
+
+def get_geolocator() -> Nominatim:
+    global _geolocator
+    if _geolocator is None:
+        _geolocator = Nominatim(user_agent="my_app", timeout=GEOCODE_TIMEOUT_SECONDS)
+    return _geolocator
+
+
+def get_timezone_finder():
+    # TimezoneFinder loads its polygon data on creation, so it is created once and only when needed
+    global _timezone_finder
+    if _timezone_finder is None:
+        from timezonefinder import TimezoneFinder
+
+        _timezone_finder = TimezoneFinder()
+    return _timezone_finder
+
+
+def geocode_city(
+    city: str, country_code: Optional[str] = DEFAULT_COUNTRY_CODE, timeout: Optional[float] = None
+) -> Optional[Tuple[float, float]]:
+    """
+    Returns the (latitude, longitude) of a city, using the shared geocode cache.
+
+    Cities that could not be found are cached as well, so they are not looked up on every turn.
+    Geocoder outages are not cached.
+
+    Args:
+        city (str): The city name.
+        country_code (Optional[str]): Restrict the search to a country, None searches worldwide.
+        timeout (Optional[float]): Geocoder request timeout in seconds, GEOCODE_TIMEOUT_SECONDS if None.
+
+    Returns:
+        Optional[Tuple[float, float]]: The coordinates, or None if the city could not be geocoded.
+    """
+    key = (city.strip().lower(), country_code)
+    coordinates = geocode_cache.get(key)
+    if coordinates is not MISSING:
+        return coordinates
+
+    kwargs = {} if timeout is None else {"timeout": timeout}
+    try:
+        if country_code is None:
+            location = get_geolocator().geocode(city, **kwargs)
+        else:
+            location = get_geolocator().geocode(city, country_codes=country_code, **kwargs)
+    except (GeocoderTimedOut, GeocoderUnavailable):
+        logger.error("The geocoding service is unavailable. Please try again later.")
+        return None
+
+    coordinates = None if location is None else (location.latitude, location.longitude)
+    if coordinates is None:
+        logger.debug(f"Could not find location for {city}")
+    geocode_cache.set(key, coordinates)
+    return coordinates
+
+
+def get_timezone_by_coordinates(lat: float, lon: float) -> Optional[str]:
+    return get_timezone_finder().timezone_at(lat=lat, lng=lon)
@@ -16,12 +16,15 @@ from integrations.lead_connector.utils import (
 )
 from services.ava_service import AvaService, ContactInfo
 from services.base_message_service import MessagingService
+from utils.local_store import get_local_store
+from utils.tracing import start_span, traced
 
 from config import (
     AGENT_ENGAGED_TAG,
     AVA_INTERACTED_TAG,
     GHL_CUSTOM_FIELD_LEAD_STATE_KEY,
     GHL_CUSTOM_FIELD_NUMBER_OF_INTERACTION_KEY,
+    LOCAL_STORE_CONTACT_NAMESPACE,
     MAX_CONVERSATION_COUNT,
     AVA_MAX_SMS_CONVO_REACHED,
     PERMISSION_TAG,
@@ -120,9 +123,20 @@ class LeadConnectorMessageingService(MessagingService):
     def get_custom_field_id(self, field_key: str) -> str:
         return self.custom_fields_map.get(field_key)
 
+    def get_cached_timezone(self, contact_id: str) -> Optional[str]:
+        cached_contact = get_local_store().get(LOCAL_STORE_CONTACT_NAMESPACE, contact_id)
+        if cached_contact is None:
+            return None
+        return cached_contact.get("timezone")
+
     def convert_lc_contact_info_to_contact_info(
         self, contact_info: LCContactInfo
     ) -> ContactInfo:
+        # timezone resolved in a previous turn, so we dont have to geocode the city again
+        timezone = contact_info.timezone
+        if timezone is None:
+            timezone = self.get_cached_timezone(contact_info.id)
+
         return ContactInfo(
             id=contact_info.id,
             full_name=f"{contact_info.firstName} {contact_info.lastName}",
@@ -131,7 +145,7 @@ class LeadConnectorMessageingService(MessagingService):
             address=contact_info.address1,
             city=contact_info.city,
             state=contact_info.state,
-            timezone=contact_info.timezone,
+            timezone=timezone,
             lead_state=self.get_custom_field_value(contact_info, "contact.lead_state"),
             pre_qualification_qa={
                 "roof_age": self.get_custom_field_value(
@@ -188,7 +202,8 @@ class LeadConnectorMessageingService(MessagingService):
         if conversation_id is None:
             conversation_id = self.get_conversation_id(contact_id)
 
-        lc_contact_info = self.lc.get_contact_info(contact_id)
+        with start_span("fetch_contact"):
+            lc_contact_info = self.lc.get_contact_info(contact_id)
         logger.debug(
             json.dumps(lc_contact_info.model_dump(exclude_none=True), indent=4)
         )
@@ -222,9 +237,11 @@ class LeadConnectorMessageingService(MessagingService):
         # Ava is allowed to engage with the contact, lets engage with the contact ----------------
 
         # step 1: lets get all the messages from the conversation
-        lc_messages = self.get_all_messages_from_conversation(
-            conversation_id=conversation_id
-        )
+        with start_span("fetch_conversation") as span:
+            lc_messages = self.get_all_messages_from_conversation(
+                conversation_id=conversation_id
+            )
+            span.set_attribute("messages", len(lc_messages))
         message_type = self.get_latest_message_type(lc_messages)
         logger.debug(f"Message type: {message_type}")
         if message_type is None:
@@ -241,6 +258,7 @@ class LeadConnectorMessageingService(MessagingService):
             message_type=message_type,
         )
 
+    @traced("engage_ava")
     def engage_ava(
         self,
         contact_id: str,
@@ -269,11 +287,13 @@ class LeadConnectorMessageingService(MessagingService):
         )
 
         # lets send the message to ava to generate a response
-        ava_service = AvaService()
+        with start_span("ava_init"):
+            ava_service = AvaService()
 
         resp = ava_service.respond(
             conversation_messages=chat_messages,
             contact_info=self.convert_lc_contact_info_to_contact_info(lc_contact_info),
+            channel=message_type.value,
         )
         generation_state = resp.is_generated
         message = resp.content
@@ -283,31 +303,31 @@ class LeadConnectorMessageingService(MessagingService):
 
             # dividing messages by new line se we send them as seperate messages
             message_split = message.split("\n\n")
-            for message in message_split:
-                self.lc.send_message(
-                    contact_id=contact_id,
-                    message=message,
-                    message_channel=get_message_channel(message_type),
-                )
-
-            # adding ava_interacted tag to the contact
-            self.add_ava_interacted_tag(lc_contact_info)
-
-            # increment the message count for the conact
-            self.increment_message_counter(lc_contact_info)
-
-            # update the lead state
-            if lead_state is not None:
-                self.lc.updated_contact_custom_field_value(
-                    contact_id=lc_contact_info.id,
-                    custom_field_id=self.get_custom_field_id(
-                        GHL_CUSTOM_FIELD_LEAD_STATE_KEY
-                    ),
-                    value=lead_state,
+            with start_span("send_messages", messages=len(message_split)):
+                for message in message_split:
+                    self.lc.send_message(
+                        contact_id=contact_id,
+                        message=message,
+                        message_channel=get_message_channel(message_type),
+                    )
+
+            # the summary is only needed by the next turn, so it is updated once the reply is out
+            ava_service.schedule_summary_update(contact_id, chat_messages, channel=message_type.value)
+
+            with start_span("update_contact"):
+                # adding ava_interacted tag to the contact
+                self.add_ava_interacted_tag(lc_contact_info)
+
+                # increment the message count, update the lead state and persist the resolved timezone
+                self.update_contact_after_turn(
+                    lc_contact_info, lead_state=lead_state, timezone=resp.timezone
                 )
 
         else:  # notify the contact owner and add a task to the contact_id
             self.notify_users(message)
+            # the contact is not updated on this path, but the next turn should not geocode again
+            if resp.timezone is not None:
+                self.cache_contact_timezone(contact_id, resp.timezone)
 
     def get_number_of_interactions(self, contact_info: LCContactInfo):
         custom_field_id = self.get_custom_field_id(
@@ -333,48 +353,69 @@ class LeadConnectorMessageingService(MessagingService):
 
         raise ValueError("Custom field 'contact.number_of_interactions' not found")
 
-    def increment_message_counter(self, contact_info: LCContactInfo):
+    def cache_contact_timezone(self, contact_id: str, timezone: str) -> None:
+        """Store a contact's resolved timezone in the local contact cache, so later turns skip geocoding."""
+        get_local_store().update(LOCAL_STORE_CONTACT_NAMESPACE, contact_id, timezone=timezone)
+
+    def update_contact_after_turn(
+        self,
+        contact_info: LCContactInfo,
+        lead_state: Optional[str] = None,
+        timezone: Optional[str] = None,
+    ) -> Optional[LCContactInfo]:
         """
-        Increments the message counter for a given contact.
+        Writes the post-turn updates for a contact back to GHL in a single request.
 
-        this helps us keep track of the number of interactions ava had with the contact
+        The update batches the incremented interaction counter, the lead state and
+        the timezone resolved during the turn. The timezone is also stored in the
+        local contact cache, so later turns skip geocoding the contact's city.
 
         Args:
-            contact_info (LCContactInfo): The contact information.
+            contact_info (LCContactInfo): The contact information fetched at the start of the turn.
+            lead_state (Optional[str]): The lead state determined during the turn.
+            timezone (Optional[str]): The timezone resolved during the turn.
+
         Returns:
-            LCContactInfo: The updated contact information with the incremented message counter.
+            Optional[LCContactInfo]: The updated contact information, None if there was nothing to update.
         """
-        custom_field_id = self.get_custom_field_id(
+        custom_fields = []
+
+        counter_field_id = self.get_custom_field_id(
             GHL_CUSTOM_FIELD_NUMBER_OF_INTERACTION_KEY
         )
-        if custom_field_id is not None:
-            # get the current value of the custom field
+        if counter_field_id is not None:
             current_value = self.get_custom_field_value(
                 contact_info, GHL_CUSTOM_FIELD_NUMBER_OF_INTERACTION_KEY
             )
-
             try:
                 current_value = int(current_value)
-            except ValueError:
-                current_value = 0
-            except TypeError:
+            except (TypeError, ValueError):
                 current_value = 0
 
-            current_value += 1
+            logger.info(f"incrementing custom field value: {current_value + 1}")
+            custom_fields.append({"id": counter_field_id, "value": str(current_value + 1)})
 
-            logger.info(f"incrementing custom field value: {current_value}")
+        lead_state_field_id = self.get_custom_field_id(GHL_CUSTOM_FIELD_LEAD_STATE_KEY)
+        if lead_state is not None and lead_state_field_id is not None:
+            custom_fields.append({"id": lead_state_field_id, "value": lead_state})
 
-            # update the custom field
-            resp = self.lc.updated_contact_custom_field_value(
-                contact_id=contact_info.id,
-                custom_field_id=custom_field_id,
-                value=str(current_value),
-            )
-            updated_lc_contact_info = LCContactInfo(**resp)
-            logger.debug(
-                f"incremented custom field value: {updated_lc_contact_info.customFields}"
-            )
-            return updated_lc_contact_info
+        update_data = {}
+        if len(custom_fields) > 0:
+            update_data["customFields"] = custom_fields
+
+        if timezone is not None:
+            self.cache_contact_timezone(contact_info.id, timezone)
+            if contact_info.timezone != timezone:
+                logger.info(f"Writing timezone {timezone} back to contact {contact_info.id}")
+                update_data["timezone"] = timezone
+
+        if len(update_data) == 0:
+            logger.debug(f"No post-turn updates for contact {contact_info.id}")
+            return None
+
+        logger.info(f"Updating contact data:{json.dumps(update_data, indent=4)} ")
+        resp = self.lc.update_contact(contact_id=contact_info.id, data=update_data)
+        return LCContactInfo(**resp)
 
     def add_ava_interacted_tag(self, contact_info: LCContactInfo):
         """Function to add the tag ava_interacted to the contact.
@@ -447,10 +488,8 @@ if __name__ == "__main__":
 
     # messaging_service.process_to_inbound_message("26cs4MUPgfX8x6NcVZ61")
 
-    # testing the increment message counter
     contact_id = "mmprUyomgvUt0m3R5PLu"
     lc_contact_info = messaging_service.lc.get_contact_info(contact_id)
-    # messaging_service.increment_message_counter(lc_contact_info)
 
     # testing get number of interactions
     # print(messaging_service.get_number_of_interactions(lc_contact_info))
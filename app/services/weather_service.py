@@ -1,53 +1,208 @@
-from typing import Any, Dict, Optional
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut, GeocoderUnavailable
+import asyncio
+import concurrent.futures
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+from loguru import logger
 import requests
 
-def get_city_coordinates(city_name, country_code="US"):
-    # Initialize the geocoder
-    geolocator = Nominatim(user_agent="my_app")
+from services.geocoding_service import DEFAULT_COUNTRY_CODE, geocode_city
+from utils.cache import MISSING, TTLCache
 
-    try:
-        # Attempt to geocode the city
-        location = geolocator.geocode(f"{city_name}", country_codes=country_code)
+WEATHER_API_URL = "https://api.openweathermap.org/data/3.0/onecall"
+WEATHER_REQUEST_TIMEOUT_SECONDS = 5
+WEATHER_LATENCY_BUDGET_SECONDS = 1.5
+WEATHER_LOOP_MARGIN_SECONDS = 0.1
+WEATHER_CACHE_TTL_SECONDS = 15 * 60
+WEATHER_GRID_CELL_DEGREES = 0.1  # ~11km, observations inside a cell are shared
+
+WEATHER_INFO_UNAVAILABLE = "information unavailable"
+
+# current observations keyed by coordinate grid cell
+weather_cache = TTLCache(maxsize=2048, ttl=WEATHER_CACHE_TTL_SECONDS, name="weather")
+
+
+def get_city_coordinates(city_name, country_code=DEFAULT_COUNTRY_CODE):
+    return geocode_city(city_name, country_code=country_code)
 
-        if location:
-            return (location.latitude, location.longitude)
-        else:
-            return None
-    except (GeocoderTimedOut, GeocoderUnavailable):
-        print("Error: The geocoding service is unavailable. Please try again later.")
-        return None
+
+def get_grid_cell(lat: float, lon: float) -> Tuple[float, float]:
+    return (
+        round(round(lat / WEATHER_GRID_CELL_DEGREES) * WEATHER_GRID_CELL_DEGREES, 4),
+        round(round(lon / WEATHER_GRID_CELL_DEGREES) * WEATHER_GRID_CELL_DEGREES, 4),
+    )
+
+
+def parse_weather_response(data: dict) -> Dict[str, Any]:
+    return {
+        "description": data["current"]["weather"][0]["description"],
+        "temperature": data["current"]["temp"],
+    }
+
+
+def format_weather_info(weather: Optional[Dict[str, Any]]) -> str:
+    if weather is None:
+        return WEATHER_INFO_UNAVAILABLE
+    return f"{weather['description']}, Temperature: {weather['temperature']}°F"
 
 
 class WeatherService:
     def __init__(self, api_key: str):
         self.api_key = api_key
-        self.base_url = "https://api.openweathermap.org/data/3.0/onecall"
+        self.base_url = WEATHER_API_URL
 
-    def get_weather(self, lat: float, lon: float) -> Optional[Dict[str, Any]]:
-        params = {
+    def _get_params(self, lat: float, lon: float) -> dict:
+        return {
             "lat": lat,
             "lon": lon,
             "exclude": "minutely,hourly,daily,alerts",  # We only need current weather
             "appid": self.api_key,
             "units": "imperial",
         }
+
+    def get_weather(self, lat: float, lon: float) -> Optional[Dict[str, Any]]:
+        cell = get_grid_cell(lat, lon)
+        weather = weather_cache.get(cell)
+        if weather is not MISSING:
+            return weather
+
         try:
-            response = requests.get(self.base_url, params=params)
+            response = requests.get(
+                self.base_url,
+                params=self._get_params(*cell),
+                timeout=WEATHER_REQUEST_TIMEOUT_SECONDS,
+            )
             response.raise_for_status()
-            data = response.json()
-            return {
-                "description": data["current"]["weather"][0]["description"],
-                "temperature": data["current"]["temp"],
-            }
+            weather = parse_weather_response(response.json())
         except requests.RequestException as e:
-            print(f"Error fetching weather data: {e}")
+            logger.error(f"Error fetching weather data: {e}")
             return None
 
+        weather_cache.set(cell, weather)
+        return weather
+
     def get_weather_by_city(self, city: str) -> Optional[Dict[str, Any]]:
         coordinates = get_city_coordinates(city)
         if coordinates is None:
             return None
         lat, lon = coordinates
         return self.get_weather(lat, lon)
+
+
+_weather_loop: Optional[asyncio.AbstractEventLoop] = None
+_weather_loop_lock = threading.Lock()
+
+
+def get_weather_loop() -> asyncio.AbstractEventLoop:
+    """
+    Event loop running in a daemon thread, shared by all weather lookups of the process.
+
+    Unlike asyncio.run, nothing joins the loop's executor when a lookup returns, so a
+    geocode that outlives the latency budget finishes in the background instead of
+    holding up the turn.
+    """
+    global _weather_loop
+    with _weather_loop_lock:
+        if _weather_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="weather-loop", daemon=True).start()
+            _weather_loop = loop
+    return _weather_loop
+
+
+def get_city_coordinates_within(city: str, timeout: float) -> Optional[Tuple[float, float]]:
+    return geocode_city(city, timeout=timeout)
+
+
+class AsyncWeatherService:
+    """
+    Async weather provider with a strict latency budget.
+
+    Shares the geocode cache with the timezone resolver and the per grid cell
+    observation cache with WeatherService. If the lookup does not finish within
+    the latency budget, None is returned instead of holding up generation.
+
+    Args:
+        api_key (str): The OpenWeather API key.
+        latency_budget (float): Seconds a lookup may take, geocode included.
+        client (Optional[httpx.AsyncClient]): Client for the weather API, one is created on first use if None.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        latency_budget: float = WEATHER_LATENCY_BUDGET_SECONDS,
+        client: Optional[httpx.AsyncClient] = None,
+    ):
+        self.weather_service = WeatherService(api_key)
+        self.latency_budget = latency_budget
+        self.client = client
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # created lazily so it binds to the loop the lookups run on, and reused across lookups
+        if self.client is None:
+            self.client = httpx.AsyncClient(timeout=WEATHER_REQUEST_TIMEOUT_SECONDS)
+        return self.client
+
+    async def get_weather(self, lat: float, lon: float) -> Optional[Dict[str, Any]]:
+        cell = get_grid_cell(lat, lon)
+        weather = weather_cache.get(cell)
+        if weather is not MISSING:
+            return weather
+
+        try:
+            response = await self._get_client().get(
+                self.weather_service.base_url, params=self.weather_service._get_params(*cell)
+            )
+            response.raise_for_status()
+            weather = parse_weather_response(response.json())
+        except (httpx.HTTPError, KeyError, ValueError) as e:
+            logger.error(f"Error fetching weather data: {e}")
+            return None
+
+        weather_cache.set(cell, weather)
+        return weather
+
+    async def _get_weather_by_city(self, city: str) -> Optional[Dict[str, Any]]:
+        # the geocoder gets the budget as its own timeout, so the worker thread does not outlive it by much
+        coordinates = await asyncio.get_running_loop().run_in_executor(
+            None, get_city_coordinates_within, city, self.latency_budget
+        )
+        if coordinates is None:
+            return None
+        lat, lon = coordinates
+        return await self.get_weather(lat, lon)
+
+    async def get_weather_by_city(self, city: str) -> Optional[Dict[str, Any]]:
+        try:
+            return await asyncio.wait_for(
+                self._get_weather_by_city(city), timeout=self.latency_budget
+            )
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"Weather lookup for {city} exceeded the {self.latency_budget}s latency budget"
+            )
+            return None
+
+    def get_weather_by_city_sync(self, city: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up the weather of a city from synchronous code, within the latency budget.
+
+        The lookup runs on the shared weather loop, so the caller never waits on a
+        geocode or request that is still running once the budget is spent.
+
+        Args:
+            city (str): The city name.
+
+        Returns:
+            Optional[Dict[str, Any]]: The current weather, or None if unavailable within the budget.
+        """
+        future = asyncio.run_coroutine_threadsafe(self.get_weather_by_city(city), get_weather_loop())
+        try:
+            # wait_for already enforces the budget, the margin only covers scheduling
+            return future.result(timeout=self.latency_budget + WEATHER_LOOP_MARGIN_SECONDS)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            logger.warning(f"Weather lookup for {city} exceeded the {self.latency_budget}s latency budget")
+            return None
@@ -1,9 +1,89 @@
+import hashlib
 import json
 import os
+import threading
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
 from loguru import logger
-from azure.storage.blob import BlobServiceClient
-from azure.core.exceptions import ResourceNotFoundError
-from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError
+from azure.core import MatchConditions
+from azure.core.exceptions import (
+    ResourceExistsError,
+    ResourceModifiedError,
+    ResourceNotFoundError,
+    ResourceNotModifiedError,
+)
+
+# containers already known to exist, so uploads only try to create a container once per process
+_ensured_containers = set()
+_ensured_containers_lock = threading.Lock()
+
+# (content md5, etag) of the blobs last uploaded or downloaded by this process, to skip unchanged uploads
+_known_blob_versions: Dict[Tuple[str, str, str], Tuple[str, Optional[str]]] = {}
+_known_blob_versions_lock = threading.Lock()
+
+
+@lru_cache(maxsize=8)
+def get_blob_service_client(connection_string):
+    """
+    Return a BlobServiceClient for the connection string, shared across calls.
+
+    The client keeps its connection pool, so helpers reuse connections instead of
+    opening a new session on every call.
+    """
+    # azure.storage.blob is slow to import and only needed once a blob is touched
+    from azure.storage.blob import BlobServiceClient
+
+    return BlobServiceClient.from_connection_string(connection_string)
+
+
+def _get_content_md5(content: bytes) -> str:
+    return hashlib.md5(content).hexdigest()
+
+
+def _is_blob_unchanged(
+    connection_string, container_name, blob_name, content: bytes, etag: Optional[str] = None
+) -> bool:
+    with _known_blob_versions_lock:
+        known_version = _known_blob_versions.get((connection_string, container_name, blob_name))
+    if known_version is None or known_version[0] != _get_content_md5(content):
+        return False
+    # a conditional upload is only skipped if the caller read the version this process knows
+    return etag is None or etag == known_version[1]
+
+
+def _remember_blob_version(
+    connection_string, container_name, blob_name, content: bytes, etag: Optional[str]
+) -> None:
+    with _known_blob_versions_lock:
+        _known_blob_versions[(connection_string, container_name, blob_name)] = (
+            _get_content_md5(content),
+            etag,
+        )
+
+
+def _forget_blob_version(connection_string, container_name, blob_name) -> None:
+    with _known_blob_versions_lock:
+        _known_blob_versions.pop((connection_string, container_name, blob_name), None)
+
+
+def ensure_container(connection_string, container_name) -> None:
+    """Create the container if it doesn't exist, checked once per process."""
+    key = (connection_string, container_name)
+    if key in _ensured_containers:
+        return
+
+    with _ensured_containers_lock:
+        if key in _ensured_containers:
+            return
+        container_client = get_blob_service_client(
+            connection_string
+        ).get_container_client(container_name)
+        try:
+            container_client.create_container()
+            logger.info(f"Container '{container_name}' created.")
+        except ResourceExistsError:
+            logger.info(f"Container '{container_name}' already exists.")
+        _ensured_containers.add(key)
 
 
 def upload_file_to_blob(connection_string, container_name, blob_name, file_path):
@@ -17,23 +97,13 @@ def upload_file_to_blob(connection_string, container_name, blob_name, file_path)
     :return: True if upload was successful, False otherwise
     """
     try:
-        # Create the BlobServiceClient object
-        blob_service_client = BlobServiceClient.from_connection_string(
-            connection_string
-        )
-
-        # Get the container client
-        container_client = blob_service_client.get_container_client(container_name)
-
         # Create the container if it doesn't exist
-        try:
-            container_client.create_container()
-            logger.info(f"Container '{container_name}' created.")
-        except ResourceExistsError:
-            logger.info(f"Container '{container_name}' already exists.")
+        ensure_container(connection_string, container_name)
 
         # Get the blob client
-        blob_client = container_client.get_blob_client(blob_name)
+        blob_client = get_blob_service_client(connection_string).get_blob_client(
+            container=container_name, blob=blob_name
+        )
 
         # Upload the file
         with open(file_path, "rb") as data:
@@ -56,16 +126,17 @@ def get_blob_content(connection_string, container_name, blob_name):
     """
     try:
         logger.info("Using connection string to access Azure Blob Storage")
-        blob_service_client = BlobServiceClient.from_connection_string(
-            connection_string
-        )
-        blob_client = blob_service_client.get_blob_client(
+        blob_client = get_blob_service_client(connection_string).get_blob_client(
             container=container_name, blob=blob_name
         )
 
         logger.info(f"Downloading blob content from {container_name}/{blob_name}")
         download_stream = blob_client.download_blob()
-        return download_stream.readall()
+        content = download_stream.readall()
+        _remember_blob_version(
+            connection_string, container_name, blob_name, content, download_stream.properties.etag
+        )
+        return content
     except ResourceNotFoundError:
         logger.error(
             f"The blob {blob_name} in container {container_name} was not found"
@@ -78,6 +149,40 @@ def get_blob_content(connection_string, container_name, blob_name):
         return None
 
 
+def get_blob_content_if_modified(
+    connection_string, container_name, blob_name, etag: Optional[str] = None
+) -> Tuple[Optional[bytes], Optional[str]]:
+    """
+    Retrieve the content of a blob only if it changed since the given ETag.
+
+    :param connection_string: Azure Storage account connection string
+    :param container_name: Name of the container
+    :param blob_name: Name of the blob to retrieve
+    :param etag: ETag of the version already held by the caller, None to always download
+    :return: (content, etag) of the blob, content is None if the blob is unchanged
+    :raises ResourceNotFoundError: If the blob does not exist
+    """
+    blob_client = get_blob_service_client(connection_string).get_blob_client(
+        container=container_name, blob=blob_name
+    )
+
+    try:
+        if etag is None:
+            download_stream = blob_client.download_blob()
+        else:
+            download_stream = blob_client.download_blob(
+                etag=etag, match_condition=MatchConditions.IfModified
+            )
+    except ResourceNotModifiedError:
+        logger.debug(f"Blob {container_name}/{blob_name} not modified since {etag}")
+        return None, etag
+
+    content = download_stream.readall()
+    new_etag = download_stream.properties.etag
+    _remember_blob_version(connection_string, container_name, blob_name, content, new_etag)
+    return content, new_etag
+
+
 def get_default_azure_connection_string():
     """
     Retrieve the Azure Storage account connection string from environment variables.
@@ -102,7 +207,7 @@ def get_default_azure_container_name():
     return container_name
 
 def upload_json_to_blob(
-    connection_string, container_name, blob_name, json_data
+    connection_string, container_name, blob_name, json_data, etag: Optional[str] = None
 ) -> bool:
     """
     Upload a JSON object to Azure Blob Storage.
@@ -111,44 +216,72 @@ def upload_json_to_blob(
     :param container_name: Name of the container to upload to
     :param blob_name: Name to give the blob in storage
     :param json_data: Python dictionary to be uploaded as JSON
-    :return: True if upload was successful, False otherwise
+    :param etag: ETag of the version json_data was read from, see upload_json_to_blob_if_match
+    :return: True if upload was successful or the blob is already up to date, False otherwise
+    """
+    return upload_json_to_blob_if_match(
+        connection_string, container_name, blob_name, json_data, etag=etag
+    )[0]
+
+
+def upload_json_to_blob_if_match(
+    connection_string, container_name, blob_name, json_data, etag: Optional[str] = None
+) -> Tuple[bool, Optional[str]]:
+    """
+    Upload a JSON object to Azure Blob Storage, only over the version it was read from.
+
+    With an ETag the write is conditional on the blob still being at that version, so an
+    upload based on a stale read fails instead of overwriting a concurrent writer.
+    Without one the blob is overwritten.
+
+    :param connection_string: Azure Storage account connection string
+    :param container_name: Name of the container to upload to
+    :param blob_name: Name to give the blob in storage
+    :param json_data: Python dictionary to be uploaded as JSON
+    :param etag: ETag returned by get_json_from_blob_with_etag for the read json_data is based on
+    :return: (success, etag of the blob after the upload), the ETag is None if the upload failed
     """
     try:
-        # Create the BlobServiceClient object
-        blob_service_client = BlobServiceClient.from_connection_string(
-            connection_string
-        )
+        # Convert the dictionary to a JSON string
+        json_bytes = json.dumps(json_data, indent=2).encode("utf-8")
 
-        # Get the container client
-        container_client = blob_service_client.get_container_client(container_name)
+        # Skip the upload if the blob already holds this exact content
+        if _is_blob_unchanged(connection_string, container_name, blob_name, json_bytes, etag):
+            logger.debug(f"Blob '{blob_name}' is unchanged, skipping upload")
+            return True, etag
 
         # Create the container if it doesn't exist
-        try:
-            container_client.create_container()
-            logger.info(f"Container '{container_name}' created.")
-        except ResourceExistsError:
-            logger.info(f"Container '{container_name}' already exists.")
+        ensure_container(connection_string, container_name)
 
         # Get the blob client
-        blob_client = container_client.get_blob_client(blob_name)
-
-        # Convert the dictionary to a JSON string
-        json_string = json.dumps(json_data, indent=2)
+        blob_client = get_blob_service_client(connection_string).get_blob_client(
+            container=container_name, blob=blob_name
+        )
 
-        # Upload the JSON string
-        blob_client.upload_blob(
-            json_string, overwrite=True, content_type="application/json"
+        # Upload the JSON string, only over the version the caller read
+        conditions = {} if etag is None else {"etag": etag, "match_condition": MatchConditions.IfNotModified}
+        resp = blob_client.upload_blob(
+            json_bytes, overwrite=True, content_type="application/json", **conditions
         )
+        new_etag = resp.get("etag")
+        _remember_blob_version(connection_string, container_name, blob_name, json_bytes, new_etag)
 
         logger.info(
             f"JSON data uploaded to blob '{blob_name}' in container '{container_name}' successfully."
         )
-        return True
+        return True, new_etag
 
+    except ResourceModifiedError:
+        # another writer got there first, the caller has to read their version again
+        _forget_blob_version(connection_string, container_name, blob_name)
+        logger.warning(
+            f"Blob '{blob_name}' in container '{container_name}' was modified by another writer, upload skipped"
+        )
+        return False, None
     except Exception as e:
         logger.error(f"An error occurred while uploading JSON to blob: {str(e)}")
         logger.exception(e)
-        return False
+        return False, None
 
 
 def get_json_from_blob(connection_string, container_name, blob_name) -> dict:
@@ -160,33 +293,49 @@ def get_json_from_blob(connection_string, container_name, blob_name) -> dict:
     :param blob_name: Name of the blob to retrieve
     :return: Parsed JSON data as a Python dictionary, or None if retrieval fails
     """
+    return get_json_from_blob_with_etag(connection_string, container_name, blob_name)[0]
+
+
+def get_json_from_blob_with_etag(
+    connection_string, container_name, blob_name
+) -> Tuple[Optional[dict], Optional[str]]:
+    """
+    Retrieve and parse a JSON object from Azure Blob Storage, with the ETag of the version read.
+
+    Pass the ETag to upload_json_to_blob when writing back data based on this read.
+
+    :param connection_string: Azure Storage account connection string
+    :param container_name: Name of the container
+    :param blob_name: Name of the blob to retrieve
+    :return: (parsed JSON data, etag), (None, None) if retrieval fails
+    """
     try:
-        blob_service_client = BlobServiceClient.from_connection_string(
-            connection_string
-        )
-        blob_client = blob_service_client.get_blob_client(
+        blob_client = get_blob_service_client(connection_string).get_blob_client(
             container=container_name, blob=blob_name
         )
 
         logger.info(f"Downloading JSON blob content from {container_name}/{blob_name}")
         download_stream = blob_client.download_blob()
-        json_string = download_stream.readall().decode("utf-8")
+        content = download_stream.readall()
+        etag = download_stream.properties.etag
+        _remember_blob_version(connection_string, container_name, blob_name, content, etag)
+        json_string = content.decode("utf-8")
 
         # Parse the JSON string
         json_data = json.loads(json_string)
 
         logger.info(f"JSON data retrieved and parsed successfully from {blob_name}")
-        return json_data
+        return json_data, etag
 
     except ResourceNotFoundError:
         logger.error(
             f"The blob {blob_name} in container {container_name} was not found"
         )
-        return None
+        return None, None
     except json.JSONDecodeError:
         logger.error(f"Failed to parse JSON content from blob {blob_name}")
-        return None
+        return None, None
     except Exception as e:
         logger.error(f"An error occurred while getting JSON from blob: {str(e)}")
         logger.exception(e)
-        return None
+        return None, None
@@ -0,0 +1,78 @@
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Hashable, List, Optional
+
+# sentinel returned by TTLCache.get on a miss, so cached None values can be told apart from misses
+MISSING = object()
+
+# named caches, reported on the /metrics endpoint
+_named_caches: "weakref.WeakSet[TTLCache]" = weakref.WeakSet()
+
+
+class TTLCache:
+    """
+    Thread safe in-memory LRU cache with an optional time to live per entry.
+
+    Args:
+        maxsize (int): Maximum number of entries, the least recently used entry is evicted first.
+        ttl (Optional[float]): Time to live in seconds, None means entries never expire.
+        name (Optional[str]): Name of the cache, used for logging and metrics.
+    """
+
+    def __init__(
+        self, maxsize: int = 1024, ttl: Optional[float] = None, name: Optional[str] = None
+    ):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be greater than 0")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        if name is not None:
+            _named_caches.add(self)
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any) -> None:
+        expires_at = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+
+def get_named_caches() -> List[TTLCache]:
+    return sorted(_named_caches, key=lambda cache: cache.name)
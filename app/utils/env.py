@@ -1,8 +1,14 @@
+import io
 import os
-from dotenv import load_dotenv
+import threading
+from typing import Dict, Optional, Set
+from dotenv import dotenv_values, load_dotenv
 from loguru import logger
-from utils.utility import store_content_temporarily
-from .azure import get_default_azure_connection_string, get_blob_content, get_default_azure_container_name
+from .azure import (
+    get_blob_content_if_modified,
+    get_default_azure_connection_string,
+    get_default_azure_container_name,
+)
 
 
 def get_environment() -> str:
@@ -21,14 +27,117 @@ def is_prod_env() -> bool:
     """Check if the current environment is production."""
     return get_environment() == "prod"
 
-def load_env_vars():
+_env_loaded = False
+
+# the variables parsed from the env blob and the ETag of the blob version they came from
+_remote_env_values: Dict[str, str] = {}
+_remote_env_etag: Optional[str] = None
+# the variables set by the env blob, as opposed to the ones the platform set before startup
+_remote_env_keys: Set[str] = set()
+_remote_env_lock = threading.Lock()
+
+
+def parse_env_content(content: bytes) -> Dict[str, str]:
+    """Parse dotenv formatted bytes in memory, variables without a value are dropped."""
+    values = dotenv_values(stream=io.StringIO(content.decode("utf-8")))
+    return {key: value for key, value in values.items() if value is not None}
+
+
+def apply_env_values(values: Dict[str, str], owned_keys: Set[str] = frozenset()) -> Set[str]:
+    """
+    Apply env blob values to the environment, keeping the variables set by the platform.
+
+    A variable is only written if it is not set yet or was set by an earlier load
+    (owned_keys). Owned variables the blob no longer has are unset.
+
+    Args:
+        values (Dict[str, str]): The parsed env blob.
+        owned_keys (Set[str]): The variables set by the previous load.
+
+    Returns:
+        Set[str]: The variables now set by the env blob.
+    """
+    owned = set()
+    for key, value in values.items():
+        if key in owned_keys or key not in os.environ:
+            os.environ[key] = value
+            owned.add(key)
+    for key in owned_keys - owned:
+        os.environ.pop(key, None)
+    return owned
+
+
+def get_remote_env_blob_location() -> tuple[str, str, str]:
+    connection_string = get_default_azure_connection_string()
+    container_name = get_default_azure_container_name()
+    blob_name = os.getenv("BLOB_NAME")
+
+    if not all([connection_string, container_name, blob_name]):
+        logger.error("Required Azure Blob Storage environment variables are not set")
+        raise ValueError(
+            "Required Azure Blob Storage environment variables are not set"
+        )
+    return connection_string, container_name, blob_name
+
+
+def load_remote_env_vars() -> bool:
+    """
+    Load the environment variables from the env blob in Azure Blob Storage.
+
+    The blob is parsed in memory and the parsed mapping is cached with the blob
+    ETag. When the ETag is known the blob is only downloaded if it changed.
+    Variables set before startup always take precedence over the blob.
+
+    Returns:
+        bool: True if new variables were loaded, False if the blob is unchanged.
+    """
+    global _remote_env_values, _remote_env_etag, _remote_env_keys
+
+    connection_string, container_name, blob_name = get_remote_env_blob_location()
+
+    with _remote_env_lock:
+        try:
+            blob_content, etag = get_blob_content_if_modified(
+                connection_string, container_name, blob_name, etag=_remote_env_etag
+            )
+        except Exception as e:
+            logger.error(f"Failed to get blob content from Azure: {str(e)}")
+            raise RuntimeError("Failed to load environment variables") from e
+
+        if blob_content is None:
+            logger.debug("Environment blob unchanged, keeping the loaded variables")
+            return False
+
+        values = parse_env_content(blob_content)
+        _remote_env_keys = apply_env_values(values, owned_keys=_remote_env_keys)
+        _remote_env_values = values
+        _remote_env_etag = etag
+
+    logger.info(
+        f"Loaded {len(values)} environment variables from Azure Blob storage (etag: {etag})"
+    )
+    return True
+
+
+def load_env_vars(force: bool = False):
+    """
+    Loads the environment variables from the dev .env file or from Azure Blob Storage.
+
+    The variables are loaded once per process, later calls are no-ops unless force is True.
+    """
+    global _env_loaded
+    if _env_loaded and not force:
+        logger.debug("Environment variables already loaded, skipping")
+        return
+
     env = get_environment()
     logger.debug(f"Current environment: {env}")
 
     if is_dev_env():
-        env_file = "../.env"
+        env_file = os.getenv("ENV_FILE", "../.env")
         if os.path.exists(env_file):
             load_dotenv(env_file)
+            _env_loaded = True
             logger.info(f"Environment variables loaded successfully from {env_file}")
             return
         else:
@@ -38,31 +147,43 @@ def load_env_vars():
 
     # For non-dev environments or if dev .env file is not found
     logger.info("Attempting to load environment variables from Azure Blob Storage")
-    connection_string = get_default_azure_connection_string()
-    container_name = get_default_azure_container_name()
-    blob_name = os.getenv("BLOB_NAME")
+    load_remote_env_vars()
+    _env_loaded = True
 
-    if not all([connection_string, container_name, blob_name]):
-        logger.error("Required Azure Blob Storage environment variables are not set")
-        raise ValueError(
-            "Required Azure Blob Storage environment variables are not set"
-        )
 
-    blob_content = get_blob_content(connection_string, container_name, blob_name)
-
-    if blob_content:
-        with store_content_temporarily(blob_content) as temp_file_name:
-            if temp_file_name:
-                logger.info(f"Loading environment variables from {temp_file_name}")
-                load_dotenv(temp_file_name)
-                logger.info(
-                    "Environment variables loaded successfully from Azure Blob storage"
-                )
-            else:
-                logger.error("Failed to store blob content temporarily")
-    else:
-        logger.error("Failed to get blob content from Azure")
-        raise RuntimeError("Failed to load environment variables")
+def refresh_env_vars() -> bool:
+    """
+    Re-fetch the env blob if it changed and apply the new values to the environment.
+
+    Values read into module level constants at import time keep their old value
+    until the process restarts, everything reading os.environ picks up the change.
+    Variables set by the platform are left alone, variables dropped from the blob are unset.
+
+    Returns:
+        bool: True if the environment was updated, False if the blob is unchanged.
+    """
+    if _remote_env_etag is None:
+        logger.debug("Environment was not loaded from Azure Blob Storage, nothing to refresh")
+        return False
+    return load_remote_env_vars()
+
+
+def start_env_refresh(interval_seconds: float) -> threading.Thread:
+    """Start a daemon thread refreshing the environment every interval_seconds."""
+    stop = threading.Event()
+
+    def refresh_loop():
+        while not stop.wait(interval_seconds):
+            try:
+                if refresh_env_vars():
+                    logger.info("Environment variables refreshed from Azure Blob storage")
+            except Exception as e:
+                logger.error(f"Error refreshing environment variables: {e}")
+
+    thread = threading.Thread(target=refresh_loop, name="env-refresh", daemon=True)
+    thread.stop = stop
+    thread.start()
+    return thread
 
 
 if __name__ == "__main__":
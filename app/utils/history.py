@@ -0,0 +1,73 @@
+"""
+Compact conversation history for LLM prompts.
+
+Prompts get the history as `role: content` lines only, windowed to the most
+recent messages that fit a token budget, after an optional summary of the
+conversation before them.
+"""
+from typing import Any, List, Optional
+
+from utils.tokens import count_tokens
+
+
+def _get_field(message: Any, field: str) -> Any:
+    if isinstance(message, dict):
+        return message.get(field)
+    return getattr(message, field, None)
+
+
+def format_message(message: Any) -> str:
+    """
+    Format a message as a single `role: content` line.
+
+    Args:
+        message (Any): A ChatMessage or a {"role", "content"} dict.
+
+    Returns:
+        str: The formatted line, newlines in the content are collapsed.
+    """
+    role = _get_field(message, "role")
+    role = getattr(role, "value", role)
+    content = " ".join(str(_get_field(message, "content") or "").split())
+    return f"{role}: {content}"
+
+
+def format_history(
+    messages: List[Any],
+    max_tokens: Optional[int] = None,
+    summary: Optional[str] = None,
+) -> str:
+    """
+    Format a conversation as `role: content` lines, keeping the most recent messages that fit max_tokens.
+
+    Args:
+        messages (List[Any]): ChatMessages or {"role", "content"} dicts, oldest first.
+        max_tokens (Optional[int]): Token budget for the formatted history, None keeps every message.
+        summary (Optional[str]): Summary of the conversation before messages, put first when given.
+
+    Returns:
+        str: The formatted history, the latest message is always included.
+    """
+    lines = [format_message(message) for message in messages]
+
+    if max_tokens is not None:
+        kept = []
+        total = count_tokens(summary) if summary else 0
+        for line in reversed(lines):
+            tokens = count_tokens(line) + 1
+            if kept and total + tokens > max_tokens:
+                break
+            kept.append(line)
+            total += tokens
+        kept.reverse()
+    else:
+        kept = lines
+
+    header = []
+    if summary:
+        header.append(f"Summary of the earlier conversation: {summary}")
+    dropped = len(lines) - len(kept)
+    if dropped > 0:
+        header.append(f"[{dropped} earlier messages omitted]")
+
+    return "\n".join(header + kept)
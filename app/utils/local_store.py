@@ -0,0 +1,149 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+from loguru import logger
+
+DEFAULT_LOCAL_STORE_PATH = ".config/ava_local_store.db"
+
+
+class LocalStore:
+    """
+    Small SQLite backed key/value store for per-contact and per-conversation state.
+
+    Values are stored as JSON and grouped by namespace (e.g. "contact"), so
+    different components can keep their state side by side without clashing.
+    """
+
+    def __init__(self, path: str = DEFAULT_LOCAL_STORE_PATH):
+        self.path = path
+        if path != ":memory:":
+            directory = os.path.dirname(path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory, exist_ok=True)
+                logger.info(f"Directory created: {directory}")
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS kv (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )
+                """
+            )
+
+    def get(
+        self, namespace: str, key: str, max_age: Optional[float] = None
+    ) -> Optional[Any]:
+        """
+        Returns the value stored under namespace/key.
+
+        Args:
+            namespace (str): The namespace of the value.
+            key (str): The key of the value.
+            max_age (Optional[float]): Maximum age in seconds, older values are treated as missing.
+
+        Returns:
+            Optional[Any]: The stored value, or None if it is missing or expired.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, updated_at FROM kv WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            ).fetchone()
+        if row is None:
+            return None
+
+        value, updated_at = row
+        if max_age is not None and time.time() - updated_at > max_age:
+            return None
+        return json.loads(value)
+
+    def set(self, namespace: str, key: str, value: Any) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO kv (namespace, key, value, updated_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), time.time()),
+            )
+
+    def update(self, namespace: str, key: str, **fields) -> Dict[str, Any]:
+        """
+        Merges the given fields into the dictionary stored under namespace/key.
+
+        Returns:
+            Dict[str, Any]: The merged value.
+        """
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT value FROM kv WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            ).fetchone()
+            value = json.loads(row[0]) if row is not None else {}
+            value.update(fields)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO kv (namespace, key, value, updated_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), time.time()),
+            )
+        return value
+
+    def delete(self, namespace: str, key: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key)
+            )
+
+    def touch(self, namespace: str, keys: Iterable[str]) -> None:
+        """Marks values as just written without changing them, so prune keeps values still in use."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE kv SET updated_at = ? WHERE namespace = ? AND key = ?",
+                [(now, namespace, key) for key in keys],
+            )
+
+    def items(self, namespace: str) -> Iterator[Tuple[str, Any]]:
+        """Yields the (key, value) pairs of a namespace, least recently written first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, value FROM kv WHERE namespace = ? ORDER BY updated_at, rowid", (namespace,)
+            ).fetchall()
+        for key, value in rows:
+            yield key, json.loads(value)
+
+    def prune(self, namespace: str, max_items: int) -> int:
+        """
+        Deletes the least recently written values of a namespace beyond max_items.
+
+        Args:
+            namespace (str): The namespace to prune.
+            max_items (int): Number of most recently written values to keep.
+
+        Returns:
+            int: The number of deleted values.
+        """
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                """
+                DELETE FROM kv WHERE namespace = ? AND key NOT IN (
+                    SELECT key FROM kv WHERE namespace = ? ORDER BY updated_at DESC, rowid DESC LIMIT ?
+                )
+                """,
+                (namespace, namespace, max_items),
+            )
+        return cursor.rowcount
+
+
+@lru_cache(maxsize=1)
+def get_local_store() -> LocalStore:
+    """Returns the process wide LocalStore, located at LOCAL_STORE_PATH if set."""
+    return LocalStore(os.getenv("LOCAL_STORE_PATH", DEFAULT_LOCAL_STORE_PATH))
@@ -0,0 +1,202 @@
+"""
+Prometheus metrics for AVA, served on /metrics.
+
+prometheus_client is optional, without it every metric is a no-op so
+instrumented code never has to check whether metrics are enabled.
+
+With several server worker processes, set PROMETHEUS_MULTIPROC_DIR to an empty
+directory before the workers start, so /metrics aggregates the metrics of all of them.
+"""
+import os
+from contextlib import nullcontext
+from typing import Any, Optional, Sequence, Tuple
+
+from utils.cache import get_named_caches
+from utils.tokens import record_turn_usage
+
+try:
+    from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+    from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+except ImportError:  # pragma: no cover - depends on the environment
+    Counter = Gauge = Histogram = None
+
+# turn stages range from a few ms (cache hits) to tens of seconds (slow completions)
+STAGE_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class NoopMetric:
+    """Stands in for a prometheus metric when prometheus_client is not installed."""
+
+    def labels(self, *args, **kwargs) -> "NoopMetric":
+        return self
+
+    def observe(self, amount: float) -> None:
+        pass
+
+    def inc(self, amount: float = 1) -> None:
+        pass
+
+    def dec(self, amount: float = 1) -> None:
+        pass
+
+    def set(self, value: float) -> None:
+        pass
+
+    def track_inprogress(self):
+        return nullcontext()
+
+
+def is_metrics_enabled() -> bool:
+    return Histogram is not None
+
+
+def is_multiprocess_mode() -> bool:
+    return bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+
+def create_histogram(name: str, documentation: str, labelnames: Sequence[str] = (), buckets=STAGE_LATENCY_BUCKETS):
+    if Histogram is None:
+        return NoopMetric()
+    return Histogram(name, documentation, labelnames, buckets=buckets)
+
+
+def create_counter(name: str, documentation: str, labelnames: Sequence[str] = ()):
+    if Counter is None:
+        return NoopMetric()
+    return Counter(name, documentation, labelnames)
+
+
+def create_gauge(name: str, documentation: str, labelnames: Sequence[str] = (), multiprocess_mode: str = "livesum"):
+    # multiprocess_mode is how the values of the worker processes are combined, see prometheus_client
+    if Gauge is None:
+        return NoopMetric()
+    return Gauge(name, documentation, labelnames, multiprocess_mode=multiprocess_mode)
+
+
+STAGE_LATENCY = create_histogram(
+    "ava_stage_latency_seconds",
+    "Latency of each traced stage of a turn",
+    ["stage"],
+)
+WEBHOOK_EVENTS = create_counter(
+    "ava_webhook_events_total",
+    "LeadConnector webhook events received, by event type",
+    ["type"],
+)
+# webhook events are handled synchronously in the server threadpool, events in progress is the queue depth
+WEBHOOK_EVENTS_IN_PROGRESS = create_gauge(
+    "ava_webhook_events_in_progress",
+    "LeadConnector webhook events being processed, by event type",
+    ["type"],
+)
+GHL_REQUESTS = create_counter(
+    "ava_ghl_requests_total",
+    "LeadConnector API requests, by endpoint and response status",
+    ["method", "endpoint", "status"],
+)
+OPENAI_REQUESTS = create_counter(
+    "ava_openai_requests_total",
+    "Azure OpenAI requests, by purpose (lead_state, objection, chat, embedding, ...) and model",
+    ["purpose", "model"],
+)
+OPENAI_TOKENS = create_counter(
+    "ava_openai_tokens_total",
+    "Azure OpenAI token usage, by purpose, model and kind (prompt or completion)",
+    ["purpose", "model", "kind"],
+)
+EMBEDDING_INPUTS = create_counter(
+    "ava_embedding_inputs_total",
+    "Texts sent to the embedding model",
+    ["model"],
+)
+RETRIEVER_QUERIES = create_counter(
+    "ava_retriever_queries_total",
+    "Retriever queries, by retriever",
+    ["retriever"],
+)
+RETRIEVER_NODES = create_counter(
+    "ava_retriever_nodes_total",
+    "Nodes returned by a retriever (retrieved) and left after postprocessing (kept)",
+    ["retriever", "stage"],
+)
+OBJECTION_CHECKS = create_counter(
+    "ava_objection_checks_total",
+    "Objection checks, by what answered them (exact, semantic, classifier or llm)",
+    ["source"],
+)
+
+
+def observe_stage_latency(stage: str, seconds: float) -> None:
+    STAGE_LATENCY.labels(stage=stage).observe(seconds)
+
+
+def _get_usage_field(usage: Any, field: str) -> int:
+    if isinstance(usage, dict):
+        return usage.get(field) or 0
+    return getattr(usage, field, None) or 0
+
+
+def record_openai_usage(purpose: str, model: Optional[str], usage: Any = None) -> None:
+    """
+    Count an Azure OpenAI request and its token usage.
+
+    Args:
+        purpose (str): What the request was for, e.g. lead_state, objection or chat.
+        model (Optional[str]): The model or deployment name.
+        usage (Any): The usage of the response, an openai CompletionUsage or a dict, None if unknown.
+    """
+    model = model or "unknown"
+    OPENAI_REQUESTS.labels(purpose=purpose, model=model).inc()
+    if usage is None:
+        return
+    prompt_tokens = _get_usage_field(usage, "prompt_tokens")
+    completion_tokens = _get_usage_field(usage, "completion_tokens")
+    OPENAI_TOKENS.labels(purpose=purpose, model=model, kind="prompt").inc(prompt_tokens)
+    OPENAI_TOKENS.labels(purpose=purpose, model=model, kind="completion").inc(completion_tokens)
+    # also count against the budget of the current turn, if there is one
+    record_turn_usage(purpose, prompt_tokens, completion_tokens)
+
+
+class CacheCollector:
+    """
+    Reports hits, misses and size of the named in-memory caches at scrape time.
+
+    The caches live in each worker process, in multiprocess mode only those of the
+    worker answering the scrape are reported.
+    """
+
+    def collect(self):
+        hits = CounterMetricFamily("ava_cache_hits", "Cache hits, by cache", labels=["cache"])
+        misses = CounterMetricFamily("ava_cache_misses", "Cache misses, by cache", labels=["cache"])
+        size = GaugeMetricFamily("ava_cache_entries", "Entries in the cache, by cache", labels=["cache"])
+        for cache in get_named_caches():
+            hits.add_metric([cache.name], cache.hits)
+            misses.add_metric([cache.name], cache.misses)
+            size.add_metric([cache.name], len(cache))
+        yield hits
+        yield misses
+        yield size
+
+
+if is_metrics_enabled():
+    REGISTRY.register(CacheCollector())
+
+
+def render_metrics() -> Optional[Tuple[bytes, str]]:
+    """
+    Render all metrics in the prometheus text format.
+
+    Returns:
+        Optional[Tuple[bytes, str]]: The payload and its content type, None if prometheus_client is not installed.
+    """
+    if not is_metrics_enabled():
+        return None
+    if is_multiprocess_mode():
+        from prometheus_client import CollectorRegistry, multiprocess
+
+        # the metrics of all workers are read from PROMETHEUS_MULTIPROC_DIR
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(CacheCollector())
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
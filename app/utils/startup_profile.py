@@ -0,0 +1,111 @@
+"""
+Startup profiling helpers.
+
+`startup_timer` records how long each phase of the app startup takes and logs a
+timed report once the app is ready. Running this module prints a
+`python -X importtime` summary of the slowest imports for the app, followed by
+the timed startup report:
+
+    python -m utils.startup_profile --module main --top 25
+"""
+import argparse
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from typing import List, NamedTuple
+
+from loguru import logger
+
+
+class ImportTiming(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+
+
+class StartupTimer:
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.phases: List[tuple[str, float]] = []
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    def report(self) -> str:
+        lines = [f"Startup finished in {self.elapsed() * 1000:.0f} ms"]
+        for name, duration in self.phases:
+            lines.append(f"  {name:<30} {duration * 1000:>8.0f} ms")
+        return "\n".join(lines)
+
+    def log_report(self) -> None:
+        logger.info(self.report())
+
+
+startup_timer = StartupTimer()
+
+
+def summarize_importtime(output: str, top_n: int = 20) -> List[ImportTiming]:
+    """
+    Parses the stderr output of `python -X importtime` and returns the slowest imports.
+
+    Args:
+        output (str): The stderr output of the interpreter.
+        top_n (int): Number of imports to return, sorted by cumulative time.
+
+    Returns:
+        List[ImportTiming]: The slowest imports.
+    """
+    timings = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, module = line[len("import time:"):].split("|")
+            timings.append(
+                ImportTiming(module.strip(), int(self_us), int(cumulative_us))
+            )
+        except ValueError:
+            continue
+    timings.sort(key=lambda timing: timing.cumulative_us, reverse=True)
+    return timings[:top_n]
+
+
+def profile_imports(module: str = "main", top_n: int = 20) -> str:
+    """Imports the module in a fresh interpreter with -X importtime and formats the summary."""
+    code = (
+        "from utils.startup_profile import startup_timer\n"
+        f"import {module}\n"
+        "print(startup_timer.report())"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    lines = [f"{'cumulative [ms]':>16} {'self [ms]':>10}  module"]
+    for timing in summarize_importtime(result.stderr, top_n=top_n):
+        lines.append(
+            f"{timing.cumulative_us / 1000:>16.1f} {timing.self_us / 1000:>10.1f}  {timing.module}"
+        )
+    return "\n".join(lines) + "\n\n" + result.stdout.strip()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile the app startup")
+    parser.add_argument("--module", default="main", help="module to import")
+    parser.add_argument("--top", type=int, default=20, help="number of imports to show")
+    args = parser.parse_args()
+    print(profile_imports(args.module, args.top))
@@ -0,0 +1,15 @@
+import re
+
+
+def normalize_text(text: str) -> str:
+    """
+    Fold a message to the form used as cache key, so trivially different messages share an entry.
+
+    Args:
+        text (str): The message.
+
+    Returns:
+        str: The message lower cased, without punctuation and with single spaces.
+    """
+    text = re.sub(r"[^\w\s']", " ", text.lower()).replace("'", "")
+    return " ".join(text.split())
@@ -0,0 +1,159 @@
+"""
+Token counting and per-turn token budgets.
+
+Every completion made during a turn reports its usage to the turn's
+TurnTokenBudget (see record_turn_usage), so the turn can decide to trim the
+history, skip optional calls or use a cheaper model once it gets expensive.
+"""
+import math
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional
+
+from loguru import logger
+from pydantic import BaseModel, Field
+
+DEFAULT_TOKENIZER_MODEL = "gpt-4o"
+# chat formatting overhead per message and for priming the reply, as documented by OpenAI
+TOKENS_PER_MESSAGE = 4
+TOKENS_PER_REPLY = 3
+
+
+@lru_cache(maxsize=8)
+def get_encoding(model: str = DEFAULT_TOKENIZER_MODEL):
+    try:
+        import tiktoken
+
+        return tiktoken.encoding_for_model(model)
+    except Exception as e:
+        # tiktoken missing, unknown model, or the encoding files cannot be downloaded
+        logger.warning(f"No tokenizer for {model}, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(text: Optional[str], model: str = DEFAULT_TOKENIZER_MODEL) -> int:
+    if not text:
+        return 0
+    encoding = get_encoding(model)
+    if encoding is None:
+        return math.ceil(len(text) / 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _get_content(message: Any) -> Optional[str]:
+    if isinstance(message, dict):
+        return message.get("content")
+    return getattr(message, "content", None)
+
+
+def count_messages_tokens(messages: List[Any], model: str = DEFAULT_TOKENIZER_MODEL) -> int:
+    """
+    Estimate the prompt tokens of a list of chat messages.
+
+    Args:
+        messages (List[Any]): ChatMessages or {"role", "content"} dicts.
+        model (str): The model whose tokenizer is used.
+
+    Returns:
+        int: The estimated prompt tokens, including the chat formatting overhead.
+    """
+    return (
+        sum(count_tokens(_get_content(message), model) + TOKENS_PER_MESSAGE for message in messages)
+        + TOKENS_PER_REPLY
+    )
+
+
+def trim_messages_to_budget(messages: List[Any], max_tokens: Optional[int], model: str = DEFAULT_TOKENIZER_MODEL) -> List[Any]:
+    """
+    Keep the most recent messages that fit in max_tokens, the last message is always kept.
+
+    Args:
+        messages (List[Any]): ChatMessages or {"role", "content"} dicts, oldest first.
+        max_tokens (Optional[int]): The token budget for the messages, None keeps everything.
+        model (str): The model whose tokenizer is used.
+
+    Returns:
+        List[Any]: The trimmed messages, oldest first.
+    """
+    if max_tokens is None or len(messages) == 0:
+        return messages
+
+    kept = []
+    total = TOKENS_PER_REPLY
+    for message in reversed(messages):
+        tokens = count_tokens(_get_content(message), model) + TOKENS_PER_MESSAGE
+        if kept and total + tokens > max_tokens:
+            break
+        kept.append(message)
+        total += tokens
+
+    if len(kept) < len(messages):
+        logger.info(f"Trimmed history from {len(messages)} to {len(kept)} messages to fit {max_tokens} tokens")
+    return list(reversed(kept))
+
+
+class TokenUsage(BaseModel):
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    # prompt + completion tokens per purpose, e.g. lead_state, objection, chat
+    by_purpose: Dict[str, int] = Field(default_factory=dict)
+    skipped: List[str] = Field(default_factory=list)
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def add(self, purpose: str, prompt_tokens: int, completion_tokens: int) -> None:
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.by_purpose[purpose] = self.by_purpose.get(purpose, 0) + prompt_tokens + completion_tokens
+
+
+class TurnTokenBudget:
+    """
+    Tracks the tokens used by one turn against an optional limit.
+
+    Args:
+        limit (Optional[int]): Maximum prompt + completion tokens for the turn, None means unlimited.
+    """
+
+    def __init__(self, limit: Optional[int] = None):
+        self.limit = limit
+        self.usage = TokenUsage()
+
+    @property
+    def remaining(self) -> Optional[int]:
+        if self.limit is None:
+            return None
+        return self.limit - self.usage.total_tokens
+
+    def can_afford(self, tokens: int) -> bool:
+        return self.limit is None or tokens <= self.remaining
+
+    def skip(self, purpose: str) -> None:
+        logger.info(f"Skipping {purpose}, turn token budget exceeded ({self.usage.total_tokens}/{self.limit} used)")
+        self.usage.skipped.append(purpose)
+
+
+_turn_budget: ContextVar[Optional[TurnTokenBudget]] = ContextVar("turn_token_budget", default=None)
+
+
+@contextmanager
+def start_turn_budget(limit: Optional[int] = None) -> Iterator[TurnTokenBudget]:
+    budget = TurnTokenBudget(limit)
+    token = _turn_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _turn_budget.reset(token)
+
+
+def get_turn_budget() -> Optional[TurnTokenBudget]:
+    return _turn_budget.get()
+
+
+def record_turn_usage(purpose: str, prompt_tokens: int, completion_tokens: int) -> None:
+    budget = _turn_budget.get()
+    if budget is not None:
+        budget.usage.add(purpose, prompt_tokens, completion_tokens)
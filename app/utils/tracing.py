@@ -0,0 +1,199 @@
+"""
+Lightweight spans for timing the stages of a turn.
+
+    with start_span("fetch_contact", contact_id=contact_id):
+        contact = lc.get_contact_info(contact_id)
+
+Spans nest through a context variable, so spans opened further down the call
+stack (GHL requests, LLM calls, retrieval) become children of the stage they
+run in. Every finished span is recorded in the stage latency histogram. When
+the outermost span ends, its waterfall is logged and the span tree is handed
+to the exporter: a no-op by default, OpenTelemetry with TRACING_EXPORTER=otel.
+"""
+import functools
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from loguru import logger
+
+from utils.metrics import observe_stage_latency
+
+
+class Span:
+    def __init__(self, name: str, attributes: Dict[str, Any], parent: Optional["Span"] = None):
+        self.name = name
+        self.attributes = dict(attributes)
+        self.parent = parent
+        self.children: List["Span"] = []
+        self.error: Optional[str] = None
+        self.start_time_ns = time.time_ns()
+        self._start = time.perf_counter()
+        self._end: Optional[float] = None
+
+    @property
+    def duration_ms(self) -> float:
+        end = self._end if self._end is not None else time.perf_counter()
+        return (end - self._start) * 1000
+
+    def offset_ms(self, root: "Span") -> float:
+        return (self._start - root._start) * 1000
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def end(self) -> None:
+        self._end = time.perf_counter()
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "duration_ms": round(self.duration_ms, 2),
+            "attributes": self.attributes,
+            "error": self.error,
+            "children": [child.to_dict() for child in self.children],
+        }
+
+
+class SpanExporter:
+    """Receives the span tree of every finished turn, the default exporter drops it."""
+
+    def export(self, span: Span) -> None:
+        pass
+
+
+class OpenTelemetryExporter(SpanExporter):
+    """Replays finished span trees into the globally configured OpenTelemetry tracer provider."""
+
+    def __init__(self, tracer_name: str = "ava"):
+        from opentelemetry import trace
+
+        self._trace = trace
+        self.tracer = trace.get_tracer(tracer_name)
+
+    def export(self, span: Span) -> None:
+        self._export(span, context=None)
+
+    def _export(self, span: Span, context) -> None:
+        attributes = {
+            key: value if isinstance(value, (str, bool, int, float)) else str(value)
+            for key, value in span.attributes.items()
+            if value is not None
+        }
+        otel_span = self.tracer.start_span(
+            span.name, context=context, attributes=attributes, start_time=span.start_time_ns
+        )
+        if span.error is not None:
+            otel_span.set_status(self._trace.Status(self._trace.StatusCode.ERROR, span.error))
+        child_context = self._trace.set_span_in_context(otel_span)
+        for child in span.children:
+            self._export(child, child_context)
+        otel_span.end(end_time=span.start_time_ns + int(span.duration_ms * 1_000_000))
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+_exporter: Optional[SpanExporter] = None
+
+
+def get_exporter() -> SpanExporter:
+    global _exporter
+    if _exporter is None:
+        _exporter = SpanExporter()
+        if os.getenv("TRACING_EXPORTER", "").lower() == "otel":
+            try:
+                _exporter = OpenTelemetryExporter()
+            except ImportError:
+                logger.warning("TRACING_EXPORTER=otel but opentelemetry is not installed, spans are not exported")
+    return _exporter
+
+
+def set_exporter(exporter: Optional[SpanExporter]) -> None:
+    """Replace the exporter, None goes back to the one configured by TRACING_EXPORTER."""
+    global _exporter
+    _exporter = exporter
+
+
+def get_current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def format_waterfall(root: Span) -> str:
+    """
+    Render a span tree as an indented waterfall, one line per span with its start offset and duration.
+
+    Args:
+        root (Span): The outermost span of the turn.
+
+    Returns:
+        str: The waterfall, one line per span.
+    """
+    lines = []
+
+    def add(span: Span, depth: int):
+        label = "  " * depth + span.name
+        line = f"{label:<48} +{span.offset_ms(root):>9.1f}ms {span.duration_ms:>9.1f}ms"
+        if span.error is not None:
+            line += f"  !{span.error}"
+        lines.append(line)
+        for child in span.children:
+            add(child, depth + 1)
+
+    add(root, 0)
+    return "\n".join(lines)
+
+
+def _finish_root(span: Span) -> None:
+    if span.children:
+        logger.info(f"Waterfall for {span.name}:\n{format_waterfall(span)}")
+    try:
+        get_exporter().export(span)
+    except Exception as e:
+        logger.error(f"Error exporting span {span.name}: {e}")
+
+
+@contextmanager
+def start_span(name: str, **attributes) -> Iterator[Span]:
+    """
+    Time a stage of a turn as a child of the current span.
+
+    Args:
+        name (str): The stage name, also the label of the stage latency histogram.
+        **attributes: Extra attributes attached to the span.
+
+    Yields:
+        Span: The span, attributes can be added while it is open.
+    """
+    parent = _current_span.get()
+    span = Span(name, attributes, parent)
+    if parent is not None:
+        parent.children.append(span)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.error = type(e).__name__
+        raise
+    finally:
+        span.end()
+        _current_span.reset(token)
+        observe_stage_latency(name, span.duration_ms / 1000)
+        if parent is None:
+            _finish_root(span)
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """Decorator running the function inside a span, named after the function by default."""
+
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with start_span(span_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
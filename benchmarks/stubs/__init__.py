@@ -0,0 +1,58 @@
+"""
+Local stand-ins for the upstream services AVA talks to, used by the benchmarks.
+
+Each stand-in is a FastAPI app. It can be used in-process by handing a
+`starlette.testclient.TestClient` (an `httpx.Client`) to the code under test, or
+served on a local port with `run_in_thread` so the real app can be pointed at it.
+"""
+import os
+import socket
+import sys
+import threading
+import time
+
+import uvicorn
+
+# the app modules import each other relative to app/, the same way they do in the container
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "app")
+if APP_DIR not in sys.path:
+    sys.path.append(APP_DIR)
+
+
+def get_free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class ServerThread:
+    """Runs an ASGI app with uvicorn in a daemon thread."""
+
+    def __init__(self, app, port: int = 0, host: str = "127.0.0.1"):
+        self.host = host
+        self.port = port or get_free_port()
+        self.server = uvicorn.Server(
+            uvicorn.Config(app, host=self.host, port=self.port, log_level="warning")
+        )
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self, timeout: float = 10.0) -> "ServerThread":
+        self.thread.start()
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Server on {self.url} did not start in {timeout}s")
+            time.sleep(0.01)
+        return self
+
+    def stop(self) -> None:
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+
+def run_in_thread(app, port: int = 0) -> ServerThread:
+    return ServerThread(app, port=port).start()
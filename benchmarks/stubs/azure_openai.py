@@ -0,0 +1,310 @@
+"""
+Deterministic fake Azure OpenAI backend for throughput benchmarks.
+
+Speaks the Azure chat-completions and embeddings wire format
+(`/openai/deployments/{deployment}/chat/completions` and `/embeddings`).
+Replies are rule based, so the JSON contracts AVA relies on are honoured:
+
+- prompts asking for `lead_state` get `{"lead_state": ...}` picked from keywords in the conversation
+- prompts asking for `is_objection` get `{"is_objection": ...}`
+- prompts asking for `response` get `{"response": ...}` with a canned SMS reply
+
+Latency, token streaming, 429s and timeouts can be emulated.
+
+In-process:
+
+    fake = FakeAzureOpenAI(latency=0.2)
+    client = fake.client()  # openai.AzureOpenAI talking to the fake through a TestClient
+
+As a server:
+
+    python -m benchmarks.stubs.azure_openai --port 9002 --latency 0.3
+    AZURE_OPENAI_ENDPOINT=http://127.0.0.1:9002 uvicorn main:app
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import List, Optional
+
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+EMBEDDING_DIMENSIONS = 1536
+
+OBJECTION_KEYWORDS = [
+    "expensive", "cost", "afford", "not interested", "not sure", "already have",
+    "too much", "scam", "no thanks", "stop", "busy", "don't need", "renting",
+]
+READY_KEYWORDS = ["appointment", "schedule", "call me", "book", "come by", "meet"]
+INTERESTED_KEYWORDS = ["how much", "savings", "tell me more", "interested", "quote", "price"]
+NOT_INTERESTED_KEYWORDS = ["not interested", "stop", "unsubscribe", "leave me alone", "no thanks"]
+
+CANNED_RESPONSES = [
+    "Totally understand! Most homeowners in your area are saving 20-30% on their electric bill. Want me to run the numbers for your home?",
+    "Great question! It really depends on your roof and usage. What's your average monthly electric bill?",
+    "No pressure at all. Would a quick 10 minute call this week work to see if it even makes sense for you?",
+]
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+
+def count_tokens(text: str) -> int:
+    # roughly 4 tokens per 3 words, deterministic and close enough for cost/latency emulation
+    return math.ceil(len(text.split()) * 4 / 3)
+
+
+def fake_embedding(text: str, dimensions: int = EMBEDDING_DIMENSIONS) -> List[float]:
+    """Deterministic bag-of-words embedding, texts sharing words get similar vectors."""
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for word in _WORD_RE.findall(text.lower()):
+        digest = hashlib.md5(word.encode("utf-8")).digest()
+        for i in range(0, 8, 2):
+            index = int.from_bytes(digest[i:i + 2], "little") % dimensions
+            vector[index] += 1.0 if digest[i + 8] % 2 == 0 else -1.0
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        vector[0] = 1.0
+        norm = 1.0
+    return (vector / norm).tolist()
+
+
+def _contains_any(text: str, keywords: List[str]) -> bool:
+    return any(keyword in text for keyword in keywords)
+
+
+def _get_user_text(messages: List[dict], last_n: Optional[int] = None) -> str:
+    user_messages = [m.get("content") or "" for m in messages if m.get("role") == "user"]
+    if last_n is not None:
+        user_messages = user_messages[-last_n:]
+    return "\n".join(user_messages).lower()
+
+
+def classify_lead_state(conversation: str) -> str:
+    conversation = conversation.lower()
+    if _contains_any(conversation, NOT_INTERESTED_KEYWORDS):
+        return "NOT_INTERESTED"
+    if _contains_any(conversation, READY_KEYWORDS):
+        return "READY_FOR_APPOINTMENT"
+    if _contains_any(conversation, INTERESTED_KEYWORDS):
+        return "INTERESTED"
+    if conversation.strip():
+        return "WARMING_UP"
+    return "COLD"
+
+
+def generate_reply(messages: List[dict]) -> str:
+    """Rule based reply to a chat-completions request."""
+    prompt = "\n".join(m.get("content") or "" for m in messages)
+
+    if "lead_state" in prompt:
+        # determine_lead_state sends the whole conversation in a single user prompt
+        return json.dumps({"lead_state": classify_lead_state(prompt.split("Conversation history:")[-1])})
+
+    if "is_objection" in prompt:
+        last_user_text = _get_user_text(messages, last_n=1)
+        return json.dumps({"is_objection": _contains_any(last_user_text, OBJECTION_KEYWORDS)})
+
+    if "response" in prompt:
+        digest = hashlib.md5(prompt.encode("utf-8")).digest()
+        return json.dumps({"response": CANNED_RESPONSES[digest[0] % len(CANNED_RESPONSES)]})
+
+    return "The lead asked about solar savings and pricing and has not booked an appointment yet."
+
+
+class FakeAzureOpenAI:
+    """
+    In-process fake of the Azure OpenAI chat-completions and embeddings APIs.
+
+    Args:
+        latency (float): Seconds before the first token of a response.
+        per_token_latency (float): Extra seconds per completion token, also used between streamed chunks.
+        latency_jitter (float): Random extra latency, uniformly distributed in [0, latency_jitter].
+        rate_limit_rate (float): Fraction of requests answered with a 429.
+        timeout_rate (float): Fraction of requests that hang for timeout_seconds before answering.
+        timeout_seconds (float): How long a timed out request hangs.
+        seed (Optional[int]): Seed for the latency/error random generator.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        per_token_latency: float = 0.0,
+        latency_jitter: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        timeout_rate: float = 0.0,
+        timeout_seconds: float = 60.0,
+        seed: Optional[int] = None,
+    ):
+        self.latency = latency
+        self.per_token_latency = per_token_latency
+        self.latency_jitter = latency_jitter
+        self.rate_limit_rate = rate_limit_rate
+        self.timeout_rate = timeout_rate
+        self.timeout_seconds = timeout_seconds
+        self.random = random.Random(seed)
+        self.calls: Counter = Counter()
+        self.usage: Counter = Counter()
+        self._lock = threading.Lock()
+        self.app = self._create_app()
+
+    def client(self, api_version: str = "2024-02-01"):
+        """Return an openai.AzureOpenAI client talking to this fake through an in-process TestClient."""
+        from openai import AzureOpenAI
+        from starlette.testclient import TestClient
+
+        return AzureOpenAI(
+            azure_endpoint="http://testserver",
+            api_key="fake-api-key",
+            api_version=api_version,
+            http_client=TestClient(self.app),
+            max_retries=0,
+        )
+
+    def _draw(self) -> tuple[float, bool, bool]:
+        with self._lock:
+            jitter = self.random.uniform(0, self.latency_jitter)
+            rate_limited = self.rate_limit_rate > 0 and self.random.random() < self.rate_limit_rate
+            timed_out = self.timeout_rate > 0 and self.random.random() < self.timeout_rate
+        return jitter, rate_limited, timed_out
+
+    async def _simulate_errors(self, endpoint: str) -> Optional[JSONResponse]:
+        with self._lock:
+            self.calls[endpoint] += 1
+        jitter, rate_limited, timed_out = self._draw()
+        if rate_limited:
+            return JSONResponse(
+                status_code=429,
+                headers={"retry-after": "1"},
+                content={"error": {"code": "429", "message": "Requests to the deployment have exceeded the rate limit."}},
+            )
+        if timed_out:
+            await asyncio.sleep(self.timeout_seconds)
+        await asyncio.sleep(self.latency + jitter)
+        return None
+
+    def _record_usage(self, endpoint: str, prompt_tokens: int, completion_tokens: int) -> dict:
+        with self._lock:
+            self.usage[f"{endpoint}.prompt_tokens"] += prompt_tokens
+            self.usage[f"{endpoint}.completion_tokens"] += completion_tokens
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+    def _create_app(self) -> FastAPI:
+        app = FastAPI(title="Fake Azure OpenAI")
+        fake = self
+
+        @app.post("/openai/deployments/{deployment}/chat/completions")
+        async def chat_completions(deployment: str, request: Request):
+            error_response = await fake._simulate_errors("chat.completions")
+            if error_response is not None:
+                return error_response
+
+            body = await request.json()
+            messages = body.get("messages", [])
+            content = generate_reply(messages)
+            prompt_tokens = sum(count_tokens(m.get("content") or "") for m in messages)
+            completion_tokens = count_tokens(content)
+            usage = fake._record_usage("chat.completions", prompt_tokens, completion_tokens)
+            completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+            created = int(time.time())
+            model = body.get("model") or deployment
+
+            if body.get("stream"):
+                return StreamingResponse(
+                    fake._stream(completion_id, created, model, content),
+                    media_type="text/event-stream",
+                )
+
+            await asyncio.sleep(fake.per_token_latency * completion_tokens)
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": content},
+                    }
+                ],
+                "usage": usage,
+            }
+
+        @app.post("/openai/deployments/{deployment}/embeddings")
+        async def embeddings(deployment: str, request: Request):
+            error_response = await fake._simulate_errors("embeddings")
+            if error_response is not None:
+                return error_response
+
+            body = await request.json()
+            inputs = body.get("input", [])
+            if isinstance(inputs, str):
+                inputs = [inputs]
+            prompt_tokens = sum(count_tokens(text) for text in inputs)
+            usage = fake._record_usage("embeddings", prompt_tokens, 0)
+            return {
+                "object": "list",
+                "model": body.get("model") or deployment,
+                "data": [
+                    {"object": "embedding", "index": i, "embedding": fake_embedding(text)}
+                    for i, text in enumerate(inputs)
+                ],
+                "usage": {"prompt_tokens": usage["prompt_tokens"], "total_tokens": usage["total_tokens"]},
+            }
+
+        return app
+
+    async def _stream(self, completion_id: str, created: int, model: str, content: str):
+        def chunk(delta: dict, finish_reason: Optional[str] = None) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            return f"data: {json.dumps(payload)}\n\n"
+
+        yield chunk({"role": "assistant", "content": ""})
+        for token in re.findall(r"\S+\s*", content):
+            await asyncio.sleep(self.per_token_latency)
+            yield chunk({"content": token})
+        yield chunk({}, finish_reason="stop")
+        yield "data: [DONE]\n\n"
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run the fake Azure OpenAI backend")
+    parser.add_argument("--port", type=int, default=9002)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--per-token-latency", type=float, default=0.0)
+    parser.add_argument("--latency-jitter", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    fake = FakeAzureOpenAI(
+        latency=args.latency,
+        per_token_latency=args.per_token_latency,
+        latency_jitter=args.latency_jitter,
+        rate_limit_rate=args.rate_limit_rate,
+        timeout_rate=args.timeout_rate,
+        seed=args.seed,
+    )
+    uvicorn.run(fake.app, host="127.0.0.1", port=args.port)
@@ -0,0 +1,41 @@
+"""
+Deterministic in-process embedding model, so retrieval can be benchmarked without Azure.
+"""
+import hashlib
+from functools import lru_cache
+from typing import List
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+
+# same dimension as text-embedding-ada-002
+EMBEDDING_DIM = 1536
+
+
+@lru_cache(maxsize=65536)
+def hash_embedding(text: str, dim: int = EMBEDDING_DIM) -> List[float]:
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).normal(size=dim).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class HashEmbedding(BaseEmbedding):
+    """
+    Embeds a text as a random unit vector seeded by its hash, equal texts get equal vectors.
+
+    Vectors are memoized, so benchmarks measure the code around the embedding model, not the model.
+    """
+
+    dim: int = EMBEDDING_DIM
+
+    def _embed(self, text: str) -> List[float]:
+        return hash_embedding(text, self.dim)
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embed(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._embed(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._embed(text)
@@ -0,0 +1,107 @@
+"""
+Fake Google Sheets / Drive API serving the objection handling sheet.
+
+    python -m benchmarks.stubs.google_sheets --port 9003
+    GOOGLE_SHEETS_API_BASE_URL=http://127.0.0.1:9003 GOOGLE_DRIVE_API_BASE_URL=http://127.0.0.1:9003 uvicorn main:app
+"""
+import argparse
+import asyncio
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from fastapi import FastAPI, HTTPException, Query
+
+DEFAULT_SHEET_ID = "fake-objection-sheet"
+
+OBJECTION_ROWS = [
+    ["It's too expensive", "I hear you. Most homeowners go solar with $0 down and pay less per month than their current electric bill."],
+    ["I'm not interested", "Totally fair. Out of curiosity, is it the timing or solar in general that doesn't feel right?"],
+    ["I need to talk to my spouse", "Of course! Would it help if we set up a quick call when you're both available?"],
+    ["I already have a quote", "That's great, you're ahead of most people. Want a second opinion to make sure you're getting the best rate?"],
+    ["I'm renting", "Got it, solar is usually for homeowners. Do you know anyone who owns their home and might want to save?"],
+    ["My roof is too old", "Good thinking. Many of our customers replace their roof together with the install, often covered in the financing."],
+    ["I don't trust solar companies", "That's understandable, there's a lot of noise out there. Happy to share reviews from your neighbors."],
+    ["Call me later", "Sure thing! What day and time works best for you?"],
+    ["I'm moving soon", "Solar usually increases home value, so it can even help when you sell. When are you planning to move?"],
+    ["My bill is already low", "Nice! What's your average monthly bill? Even low bills tend to climb 5-8% a year."],
+    ["Is this a scam?", "Great question to ask. We're a licensed installer, and you can check our reviews on solarqueenfina.com."],
+    ["I don't have time", "I get it, life's busy. The call takes 10 minutes and I can do evenings too."],
+]
+
+
+class FakeGoogleSheets:
+    def __init__(
+        self,
+        rows: Optional[List[List[str]]] = None,
+        sheet_id: str = DEFAULT_SHEET_ID,
+        latency: float = 0.0,
+    ):
+        self.sheet_id = sheet_id
+        self.rows = rows if rows is not None else OBJECTION_ROWS
+        self.latency = latency
+        self.modified_time = datetime.now(timezone.utc)
+        self.calls: Counter = Counter()
+        self._lock = threading.Lock()
+        self.app = self._create_app()
+
+    def get_values(self) -> List[List[str]]:
+        return [["objection", "rebuttal"]] + [list(row) for row in self.rows]
+
+    async def simulate(self, endpoint: str) -> None:
+        with self._lock:
+            self.calls[endpoint] += 1
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+
+    def _check_sheet(self, sheet_id: str) -> None:
+        if sheet_id != self.sheet_id:
+            raise HTTPException(status_code=404, detail="Requested entity was not found.")
+
+    def _create_app(self) -> FastAPI:
+        app = FastAPI(title="Fake Google Sheets API")
+        fake = self
+
+        @app.get("/drive/v3/files/{file_id}")
+        async def get_file(file_id: str):
+            await fake.simulate("drive.files.get")
+            fake._check_sheet(file_id)
+            return {"modifiedTime": fake.modified_time.isoformat().replace("+00:00", "Z")}
+
+        @app.get("/v4/spreadsheets/{sheet_id}/values:batchGet")
+        async def batch_get_values(sheet_id: str, ranges: List[str] = Query(...)):
+            await fake.simulate("sheets.values.batchGet")
+            fake._check_sheet(sheet_id)
+            return {
+                "spreadsheetId": sheet_id,
+                "valueRanges": [
+                    {"range": sheet_range, "majorDimension": "ROWS", "values": fake.get_values()}
+                    for sheet_range in ranges
+                ],
+            }
+
+        @app.get("/v4/spreadsheets/{sheet_id}/values/{sheet_range}")
+        async def get_values(sheet_id: str, sheet_range: str):
+            await fake.simulate("sheets.values.get")
+            fake._check_sheet(sheet_id)
+            return {"range": sheet_range, "majorDimension": "ROWS", "values": fake.get_values()}
+
+        @app.get("/v4/spreadsheets/{sheet_id}")
+        async def get_spreadsheet(sheet_id: str):
+            await fake.simulate("sheets.get")
+            fake._check_sheet(sheet_id)
+            return {"spreadsheetId": sheet_id, "sheets": [{"properties": {"sheetId": 0, "title": "Sheet1"}}]}
+
+        return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run the fake Google Sheets API")
+    parser.add_argument("--port", type=int, default=9003)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    uvicorn.run(FakeGoogleSheets(latency=args.latency).app, host="127.0.0.1", port=args.port)
@@ -0,0 +1,397 @@
+"""
+Fake LeadConnector (GoHighLevel) API for offline load tests and benchmarks.
+
+Implements the endpoints used by `integrations.lead_connector.leadconnector`:
+locations, customFields, users, contacts, conversations/search, conversations,
+messages and the OAuth token endpoint, with configurable latency and error injection.
+
+In-process:
+
+    fake = FakeLeadConnector(latency=0.05)
+    contact_id = fake.seed_contact(messages=10)
+    lc = fake.lead_connector()  # LeadConnector talking to the fake through a TestClient
+
+As a server:
+
+    python -m benchmarks.stubs.leadconnector --port 9001 --latency 0.05 --contacts 100
+    LEADCONNECTOR_API_BASE_URL=http://127.0.0.1:9001 uvicorn main:app
+"""
+import argparse
+import asyncio
+import random
+import threading
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from fastapi import FastAPI, HTTPException, Request
+
+DEFAULT_LOCATION_ID = "hqDwtNvswsupf6BT1Qxt"
+PERMISSION_TAG = "sunny"
+
+CUSTOM_FIELD_KEYS = [
+    "contact.number_of_interactions",
+    "contact.lead_state",
+    "contact.how_old_is_your_roof",
+    "contact.is_your_credit_more_than_640",
+    "contact.what_is_your_average_electricity_bill",
+    "contact.household_income",
+    "contact.are_your_a_homeowner",
+]
+
+SAMPLE_LEAD_MESSAGES = [
+    "Hi, who is this?",
+    "How much does it cost?",
+    "I'm not sure solar is worth it for my house.",
+    "That sounds too expensive for me right now.",
+    "What kind of savings are we talking about?",
+    "ok",
+    "Can you call me tomorrow?",
+    "I already have a quote from another company.",
+]
+
+SAMPLE_AVA_MESSAGES = [
+    "Hey, this is Fina from Solar Queen! Are you still looking into solar for your home?",
+    "Totally get it. Most homeowners near you save 20-30% on their electric bill, want me to run the numbers?",
+    "Great question! It depends on your roof and usage, what's your average monthly bill?",
+]
+
+
+def _new_id() -> str:
+    return uuid.uuid4().hex[:20]
+
+
+class FakeLeadConnector:
+    """
+    In-memory LeadConnector API.
+
+    Args:
+        location_id (str): The location served by the fake.
+        latency (float): Seconds added to every response.
+        latency_jitter (float): Random extra latency, uniformly distributed in [0, latency_jitter].
+        error_rate (float): Fraction of requests failing with error_status.
+        error_status (int): Status code of injected errors.
+        endpoint_error_rates (Optional[Dict[str, float]]): Error rate overrides per endpoint name.
+        seed (Optional[int]): Seed for the latency/error random generator.
+    """
+
+    def __init__(
+        self,
+        location_id: str = DEFAULT_LOCATION_ID,
+        latency: float = 0.0,
+        latency_jitter: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 500,
+        endpoint_error_rates: Optional[Dict[str, float]] = None,
+        seed: Optional[int] = None,
+    ):
+        self.location_id = location_id
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.endpoint_error_rates = endpoint_error_rates or {}
+        self.random = random.Random(seed)
+        self.calls: Counter = Counter()
+        self._lock = threading.Lock()
+
+        self.custom_fields = [
+            {
+                "id": _new_id(),
+                "name": key.split(".", 1)[1],
+                "fieldKey": key,
+                "dataType": "TEXT",
+                "locationId": location_id,
+                "model": "contact",
+            }
+            for key in CUSTOM_FIELD_KEYS
+        ]
+        self.custom_field_ids = {field["fieldKey"]: field["id"] for field in self.custom_fields}
+        self.contacts: Dict[str, dict] = {}
+        self.conversations: Dict[str, dict] = {}
+        self.messages: Dict[str, List[dict]] = {}
+        self.app = self._create_app()
+
+    # state helpers ----------------
+
+    def seed_contact(
+        self,
+        contact_id: Optional[str] = None,
+        messages: int = 0,
+        tags: Optional[List[str]] = None,
+        city: Optional[str] = "Springfield",
+        timezone_name: Optional[str] = None,
+        message_type: str = "TYPE_SMS",
+    ) -> str:
+        """Create a contact with a conversation of alternating outbound/inbound messages, ending inbound."""
+        contact_id = contact_id or _new_id()
+        self.contacts[contact_id] = {
+            "id": contact_id,
+            "locationId": self.location_id,
+            "firstName": "Taylor",
+            "lastName": "Johnson",
+            "name": "Taylor Johnson",
+            "email": f"{contact_id.lower()}@example.com",
+            "phone": "+12175550164",
+            "address1": "1472 Prairie Lane",
+            "city": city,
+            "state": "IL",
+            "timezone": timezone_name,
+            "tags": list(tags) if tags is not None else [PERMISSION_TAG],
+            "customFields": [
+                {"id": self.custom_field_ids["contact.number_of_interactions"], "value": "0"},
+                {"id": self.custom_field_ids["contact.how_old_is_your_roof"], "value": "5_to_10_years"},
+                {"id": self.custom_field_ids["contact.household_income"], "value": "$60,000_to_$80,000"},
+                {"id": self.custom_field_ids["contact.are_your_a_homeowner"], "value": "yes"},
+            ],
+        }
+        conversation_id = self._create_conversation(contact_id)
+
+        start = datetime.now(timezone.utc) - timedelta(minutes=messages)
+        for i in range(messages):
+            # count backwards so the last message is always from the lead
+            inbound = (messages - i) % 2 == 1
+            pool = SAMPLE_LEAD_MESSAGES if inbound else SAMPLE_AVA_MESSAGES
+            self._add_message(
+                conversation_id,
+                body=pool[i % len(pool)],
+                direction="inbound" if inbound else "outbound",
+                message_type=message_type,
+                date_added=start + timedelta(minutes=i),
+            )
+        return contact_id
+
+    def add_inbound_message(self, contact_id: str, body: str, message_type: str = "TYPE_SMS") -> dict:
+        conversation_id = self.get_conversation_id(contact_id)
+        return self._add_message(conversation_id, body=body, direction="inbound", message_type=message_type)
+
+    def get_conversation_id(self, contact_id: str) -> Optional[str]:
+        for conversation in self.conversations.values():
+            if conversation["contactId"] == contact_id:
+                return conversation["id"]
+        return None
+
+    def _create_conversation(self, contact_id: str) -> str:
+        conversation_id = _new_id()
+        self.conversations[conversation_id] = {
+            "id": conversation_id,
+            "contactId": contact_id,
+            "locationId": self.location_id,
+        }
+        self.messages[conversation_id] = []
+        return conversation_id
+
+    def _add_message(
+        self,
+        conversation_id: str,
+        body: str,
+        direction: str,
+        message_type: str = "TYPE_SMS",
+        date_added: Optional[datetime] = None,
+    ) -> dict:
+        message = {
+            "id": _new_id(),
+            "direction": direction,
+            "status": "delivered",
+            "type": 2,
+            "messageType": message_type,
+            "body": body,
+            "contentType": "text/plain",
+            "dateAdded": (date_added or datetime.now(timezone.utc)).isoformat(),
+            "conversationId": conversation_id,
+        }
+        with self._lock:
+            self.messages[conversation_id].append(message)
+        return message
+
+    def lead_connector(self, location_id: Optional[str] = None):
+        """Return a LeadConnector wired to this fake through an in-process TestClient."""
+        from starlette.testclient import TestClient
+
+        from integrations.lead_connector.leadconnector import LeadConnector
+
+        return LeadConnector(
+            location_id=location_id or self.location_id,
+            config=fake_leadconnector_config(self.location_id),
+            client=TestClient(self.app),
+        )
+
+    # simulation ----------------
+
+    async def simulate(self, endpoint: str) -> None:
+        with self._lock:
+            self.calls[endpoint] += 1
+            delay = self.latency + self.random.uniform(0, self.latency_jitter)
+            error_rate = self.endpoint_error_rates.get(endpoint, self.error_rate)
+            fail = error_rate > 0 and self.random.random() < error_rate
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if fail:
+            raise HTTPException(status_code=self.error_status, detail="Injected error")
+
+    def _get_contact_or_404(self, contact_id: str) -> dict:
+        contact = self.contacts.get(contact_id)
+        if contact is None:
+            raise HTTPException(status_code=404, detail="Contact not found")
+        return contact
+
+    def _create_app(self) -> FastAPI:
+        app = FastAPI(title="Fake LeadConnector API")
+        fake = self
+
+        @app.post("/oauth/token")
+        async def token():
+            await fake.simulate("oauth.token")
+            return {
+                "access_token": _new_id(),
+                "refresh_token": _new_id(),
+                "expires_in": 86399,
+                "token_type": "Bearer",
+                "scope": "contacts.readonly contacts.write",
+                "userType": "Location",
+                "companyId": "fake-company",
+                "locationId": fake.location_id,
+                "userId": "fake-user",
+            }
+
+        @app.get("/locations/{location_id}")
+        async def get_location(location_id: str):
+            await fake.simulate("locations.get")
+            return {"location": {"id": location_id, "name": "Fake location", "timezone": "America/Chicago"}}
+
+        @app.get("/locations/{location_id}/customFields")
+        async def get_custom_fields(location_id: str):
+            await fake.simulate("locations.customFields")
+            return {"customFields": fake.custom_fields}
+
+        @app.get("/users/")
+        async def get_users(locationId: str):
+            await fake.simulate("users.list")
+            return {"users": []}
+
+        @app.get("/contacts/")
+        async def search_contacts(locationId: str, query: str = ""):
+            await fake.simulate("contacts.search")
+            contacts = [
+                contact
+                for contact in fake.contacts.values()
+                if query in (contact.get("email") or "") or query in contact["id"]
+            ]
+            return {"contacts": contacts}
+
+        @app.get("/contacts/{contact_id}")
+        async def get_contact(contact_id: str):
+            await fake.simulate("contacts.get")
+            return {"contact": fake._get_contact_or_404(contact_id)}
+
+        @app.put("/contacts/{contact_id}")
+        async def update_contact(contact_id: str, request: Request):
+            await fake.simulate("contacts.update")
+            contact = fake._get_contact_or_404(contact_id)
+            data = await request.json()
+            with fake._lock:
+                for field in data.pop("customFields", []):
+                    field_id = field.get("id") or fake.custom_field_ids.get(field.get("key"))
+                    existing = [f for f in contact["customFields"] if f["id"] == field_id]
+                    if existing:
+                        existing[0]["value"] = field["value"]
+                    else:
+                        contact["customFields"].append({"id": field_id, "value": field["value"]})
+                contact.update(data)
+            return {"succeded": True, "contact": contact}
+
+        @app.get("/conversations/search")
+        async def search_conversations(locationId: str, contactId: str):
+            await fake.simulate("conversations.search")
+            conversations = [
+                conversation
+                for conversation in fake.conversations.values()
+                if conversation["contactId"] == contactId
+            ]
+            return {"conversations": conversations, "total": len(conversations)}
+
+        @app.post("/conversations/messages")
+        async def send_message(request: Request):
+            await fake.simulate("conversations.messages.send")
+            data = await request.json()
+            contact_id = data["contactId"]
+            fake._get_contact_or_404(contact_id)
+            conversation_id = fake.get_conversation_id(contact_id) or fake._create_conversation(contact_id)
+            message = fake._add_message(conversation_id, body=data["message"], direction="outbound")
+            return {"conversationId": conversation_id, "messageId": message["id"], "message": message["id"]}
+
+        @app.get("/conversations/{conversation_id}/messages")
+        async def get_messages(conversation_id: str, limit: int = 50):
+            await fake.simulate("conversations.messages.list")
+            if conversation_id not in fake.messages:
+                raise HTTPException(status_code=404, detail="Conversation not found")
+            # the api returns the most recent messages first
+            messages = list(reversed(fake.messages[conversation_id]))[:limit]
+            return {
+                "messages": {
+                    "lastMessageId": messages[-1]["id"] if messages else None,
+                    "nextPage": len(fake.messages[conversation_id]) > limit,
+                    "messages": messages,
+                }
+            }
+
+        @app.get("/conversations/{conversation_id}")
+        async def get_conversation(conversation_id: str):
+            await fake.simulate("conversations.get")
+            if conversation_id not in fake.conversations:
+                raise HTTPException(status_code=404, detail="Conversation not found")
+            return fake.conversations[conversation_id]
+
+        @app.delete("/conversations/{conversation_id}")
+        async def delete_conversation(conversation_id: str):
+            await fake.simulate("conversations.delete")
+            fake.conversations.pop(conversation_id, None)
+            fake.messages.pop(conversation_id, None)
+            return {"success": True}
+
+        @app.post("/conversations/")
+        async def create_conversation(request: Request):
+            await fake.simulate("conversations.create")
+            data = await request.json()
+            conversation_id = fake._create_conversation(data["contactId"])
+            return {"success": True, "conversation": fake.conversations[conversation_id]}
+
+        return app
+
+
+def fake_leadconnector_config(location_id: str = DEFAULT_LOCATION_ID):
+    from integrations.lead_connector.models import LeadConnectorConfig
+
+    return LeadConnectorConfig(
+        access_token="fake-access-token",
+        refresh_token="fake-refresh-token",
+        expires_in=86399,
+        token_type="Bearer",
+        scope=["contacts.readonly", "contacts.write"],
+        user_type="Location",
+        company_id="fake-company",
+        location_id=location_id,
+        user_id="fake-user",
+        token_expiry=datetime.now() + timedelta(seconds=86399),
+    )
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run the fake LeadConnector API")
+    parser.add_argument("--port", type=int, default=9001)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--latency-jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--contacts", type=int, default=10, help="number of contacts to seed")
+    parser.add_argument("--messages", type=int, default=10, help="messages per seeded contact")
+    args = parser.parse_args()
+
+    fake = FakeLeadConnector(
+        latency=args.latency, latency_jitter=args.latency_jitter, error_rate=args.error_rate
+    )
+    for _ in range(args.contacts):
+        print(fake.seed_contact(messages=args.messages))
+    uvicorn.run(fake.app, host="127.0.0.1", port=args.port)
@@ -0,0 +1,143 @@
+"""
+Microbenchmarks for the CPU work done on every webhook turn, at a realistic
+conversation size and at 10x that size.
+
+    poetry install --with dev
+    pytest benchmarks/test_hot_path.py --benchmark-autosave
+    pytest benchmarks/test_hot_path.py --benchmark-compare --benchmark-compare-fail=mean:20%
+"""
+import json
+import os
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+os.environ.setdefault("LEADCONNECTOR_CLIENT_ID", "benchmark-client-id")
+os.environ.setdefault("LEADCONNECTOR_CLIENT_SECRET", "benchmark-client-secret")
+
+from benchmarks.stubs import APP_DIR
+from benchmarks.stubs.leadconnector import FakeLeadConnector
+from integrations.lead_connector.models import LCContactInfo, LCMessage, LCMessageType
+from integrations.lead_connector.utils import convert_lcmessage_to_chatmessage, filter_messages_by_type
+from services.ava_service import ContactInfo, get_context, load_prompt_template
+from utils.history import format_history
+
+# a typical conversation fetched from LeadConnector is around 20 messages
+CONVERSATION_SIZES = [20, 200]
+
+ALLOWED_MESSAGE_TYPES = [LCMessageType.TYPE_SMS]
+
+
+@pytest.fixture(scope="module")
+def fake_lc():
+    return FakeLeadConnector(seed=0)
+
+
+@pytest.fixture(scope="module", params=CONVERSATION_SIZES, ids=lambda size: f"{size}_messages")
+def raw_messages(request, fake_lc):
+    contact_id = fake_lc.seed_contact(messages=request.param)
+    return list(fake_lc.messages[fake_lc.get_conversation_id(contact_id)])
+
+
+@pytest.fixture(scope="module")
+def lc_messages(raw_messages):
+    return [LCMessage(**message) for message in raw_messages]
+
+
+@pytest.fixture(scope="module")
+def chat_messages(lc_messages):
+    return convert_lcmessage_to_chatmessage(lc_messages)
+
+
+@pytest.fixture(scope="module")
+def contact_info():
+    return ContactInfo(
+        id="3fnq8LpXHRtBvMzS5Ykd",
+        full_name="Taylor Johnson",
+        first_name="Taylor",
+        last_name="Johnson",
+        address="1472 Prairie Lane, Springfield, IL, 62701, United States",
+        city="Springfield",
+        state="IL",
+        pre_qualification_qa={
+            "roof_age": "5_to_10_years",
+            "credit_score": "680_to_719",
+            "average_monthly_electric_bill": "$100_to_$150",
+            "annual_household_income": "$60,000_to_$80,000",
+            "homeowner": "yes",
+        },
+    )
+
+
+def test_validate_contact_info(benchmark, fake_lc):
+    contact_id = fake_lc.seed_contact()
+    raw_contact = fake_lc.contacts[contact_id]
+
+    contact = benchmark(LCContactInfo, **raw_contact)
+
+    assert contact.id == contact_id
+
+
+def test_validate_messages(benchmark, raw_messages):
+    messages = benchmark(lambda: [LCMessage(**message) for message in raw_messages])
+
+    assert len(messages) == len(raw_messages)
+
+
+def test_filter_messages_by_type(benchmark, lc_messages):
+    messages = benchmark(filter_messages_by_type, lc_messages, ALLOWED_MESSAGE_TYPES)
+
+    assert len(messages) == len(lc_messages)
+
+
+def test_convert_lcmessage_to_chatmessage(benchmark, lc_messages):
+    messages = benchmark(convert_lcmessage_to_chatmessage, lc_messages)
+
+    assert len(messages) == len(lc_messages)
+
+
+def test_debug_dump_chat_messages(benchmark, chat_messages):
+    dump = benchmark(lambda: json.dumps([message.dict() for message in chat_messages], indent=4))
+
+    assert dump.startswith("[")
+
+
+def test_build_lead_state_prompt(benchmark, chat_messages):
+    # determine_lead_state gets the history as dicts and formats them into its prompt
+    def build():
+        conversation_history = [message.dict() for message in chat_messages]
+        return f"Conversation history:\n{format_history(conversation_history, max_tokens=1500)}"
+
+    prompt = benchmark(build)
+
+    assert "Conversation history" in prompt
+
+
+def test_build_system_message(benchmark, contact_info):
+    prompt_template = load_prompt_template(os.path.join(APP_DIR, "prompt", "lead_engage_sms.txt"))
+
+    system_message = benchmark(
+        lambda: prompt_template.format(context=get_context(contact_info, None, "WARMING_UP"))
+    )
+
+    assert "Taylor" in system_message
+
+
+def test_build_followup_system_message(benchmark, chat_messages):
+    # mirrors the follow-up branch of Ava.respond, which inlines the last messages into the system message
+    system_message = "You are AVA."
+
+    def build():
+        last_messages = chat_messages[-min(5, len(chat_messages)):]
+        conversation_messages_str = format_history(last_messages)
+        return (
+            system_message
+            + "\n\nLast few message from you conversation with the lead:\n"
+            + conversation_messages_str
+            + "\n please create a follow-up message."
+        )
+
+    prompt = benchmark(build)
+
+    assert "follow-up" in prompt
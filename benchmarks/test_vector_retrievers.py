@@ -0,0 +1,101 @@
+"""
+Microbenchmarks of the objection retriever backends, the in-memory Qdrant
+collection behind llama_index and the NumPy brute force matrix, at the size of
+the objection sheet and at 10x that size. Both use the same precomputed node
+embeddings and an in-process embedding model. The llama_index embedding call
+itself costs ~2ms, test_numpy_search measures the search alone.
+
+    poetry install --with dev
+    pytest benchmarks/test_vector_retrievers.py --benchmark-autosave
+    pytest benchmarks/test_vector_retrievers.py --benchmark-compare --benchmark-compare-fail=mean:20%
+"""
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+import numpy as np
+import qdrant_client
+from llama_index.core import StorageContext, VectorStoreIndex
+from llama_index.core.schema import MetadataMode, TextNode
+from llama_index.vector_stores.qdrant import QdrantVectorStore
+
+from benchmarks.stubs.embeddings import HashEmbedding
+from ava.retriever.numpy_retriever import NumpyVectorRetriever
+
+# the objection sheet has a few hundred rows
+COLLECTION_SIZES = [300, 3000]
+SIMILARITY_TOP_K = 2
+QUERY = "that sounds too expensive for me"
+
+
+@pytest.fixture(scope="module")
+def embed_model():
+    return HashEmbedding()
+
+
+@pytest.fixture(scope="module", params=COLLECTION_SIZES, ids=lambda size: f"{size}_nodes")
+def nodes(request, embed_model):
+    nodes = [
+        TextNode(
+            text=f"objection {i}",
+            metadata={"rebuttal": f"rebuttal {i}", "collection_name": "objection_handelling"},
+        )
+        for i in range(request.param)
+    ]
+    for node in nodes:
+        node.embedding = embed_model.get_text_embedding(node.get_content(metadata_mode=MetadataMode.EMBED))
+    return nodes
+
+
+@pytest.fixture(scope="module")
+def qdrant_retriever(nodes, embed_model):
+    vector_store = QdrantVectorStore(
+        client=qdrant_client.QdrantClient(location=":memory:"), collection_name="objection_handelling"
+    )
+    index = VectorStoreIndex(
+        nodes=nodes,
+        storage_context=StorageContext.from_defaults(vector_store=vector_store),
+        embed_model=embed_model,
+    )
+    return index.as_retriever(similarity_top_k=SIMILARITY_TOP_K)
+
+
+@pytest.fixture(scope="module")
+def numpy_retriever(nodes, embed_model):
+    return NumpyVectorRetriever(
+        nodes=nodes,
+        embed_model=embed_model,
+        collection_name="objection_handelling",
+        similarity_top_k=SIMILARITY_TOP_K,
+        embeddings=[node.embedding for node in nodes],
+    )
+
+
+def test_qdrant_retrieve(benchmark, qdrant_retriever, numpy_retriever):
+    results = benchmark(qdrant_retriever.retrieve, QUERY)
+
+    assert [result.node.node_id for result in results] == [
+        result.node.node_id for result in numpy_retriever.retrieve(QUERY)
+    ]
+
+
+def test_numpy_retrieve(benchmark, numpy_retriever):
+    results = benchmark(numpy_retriever.retrieve, QUERY)
+
+    assert len(results) == SIMILARITY_TOP_K
+
+
+def test_numpy_search(benchmark, numpy_retriever, embed_model):
+    query_embedding = np.asarray(embed_model.get_query_embedding(QUERY), dtype=np.float32)
+
+    results = benchmark(numpy_retriever.retrieve_by_embeddings, query_embedding)
+
+    assert len(results[0]) == SIMILARITY_TOP_K
+
+
+def test_numpy_retrieve_batch(benchmark, numpy_retriever):
+    queries = [f"{QUERY} {i}" for i in range(32)]
+
+    results = benchmark(numpy_retriever.retrieve_batch, queries)
+
+    assert len(results) == len(queries)
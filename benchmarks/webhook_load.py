@@ -0,0 +1,371 @@
+"""
+End-to-end load test of the LeadConnector webhook.
+
+Starts the local stand-ins (fake LeadConnector, Azure OpenAI and Google Sheets) in
+this process, runs the real app with uvicorn in a subprocess pointed at them, and
+fires synthetic InboundMessage/OutboundMessage webhook events at
+/webhook/leadconnector at a fixed rate.
+
+Reports p50/p95/p99 end-to-end latency, upstream calls per message and the CPU
+time and memory of the app process per request. Reports can be saved as a
+baseline and later runs compared against it:
+
+    python -m benchmarks.webhook_load --rps 5 --messages 100 --save-baseline benchmarks/baselines/webhook_load.json
+    python -m benchmarks.webhook_load --rps 5 --messages 100 --compare benchmarks/baselines/webhook_load.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+
+from benchmarks.stubs import APP_DIR, get_free_port, run_in_thread
+from benchmarks.stubs.azure_openai import FakeAzureOpenAI
+from benchmarks.stubs.google_sheets import FakeGoogleSheets
+from benchmarks.stubs.leadconnector import SAMPLE_LEAD_MESSAGES, FakeLeadConnector
+
+# contact the messaging service notifies about hot leads, seeded so notifications succeed
+NOTIFY_CONTACT_ID = "n66TIjUfMUrSQCZzypK6"
+
+# metrics where a higher value is a regression, checked against the baseline
+REGRESSION_METRICS = [
+    "latency_ms.p50",
+    "latency_ms.p95",
+    "latency_ms.p99",
+    "upstream_calls_per_message.total",
+    "app_cpu_ms_per_request",
+]
+
+
+class ProcessSampler:
+    """Reads the CPU time and RSS of a process, with psutil if installed and /proc otherwise."""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        try:
+            import psutil
+
+            self._process = psutil.Process(pid)
+        except ImportError:
+            self._process = None
+        self._clock_ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+    def cpu_seconds(self) -> float:
+        if self._process is not None:
+            times = self._process.cpu_times()
+            return times.user + times.system
+        with open(f"/proc/{self.pid}/stat", encoding="utf-8") as file:
+            fields = file.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / self._clock_ticks
+
+    def rss_kb(self) -> int:
+        if self._process is not None:
+            return self._process.memory_info().rss // 1024
+        with open(f"/proc/{self.pid}/status", encoding="utf-8") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+        return 0
+
+
+def prepare_workdir(workdir: str, env: Dict[str, str], location_id: str) -> str:
+    """Write the dotenv file and LeadConnector token config the app expects in its working dir."""
+    env_file = os.path.join(workdir, ".env")
+    with open(env_file, "w", encoding="utf-8") as file:
+        for key, value in env.items():
+            file.write(f"{key}={value}\n")
+
+    os.makedirs(os.path.join(workdir, ".config"), exist_ok=True)
+    with open(os.path.join(workdir, ".config", "leadconnector_config.json"), "w", encoding="utf-8") as file:
+        json.dump(
+            {
+                "access_token": "fake-access-token",
+                "refresh_token": "fake-refresh-token",
+                "expires_in": 86399,
+                "token_type": "Bearer",
+                "scope": ["contacts.readonly", "contacts.write"],
+                "user_type": "Location",
+                "company_id": "fake-company",
+                "location_id": location_id,
+                "user_id": "fake-user",
+            },
+            file,
+        )
+
+    # prompts are loaded relative to the working dir
+    os.symlink(os.path.join(APP_DIR, "prompt"), os.path.join(workdir, "prompt"))
+    return env_file
+
+
+def start_app(workdir: str, env_file: str, port: int, workers: int) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({"ENV": "dev", "ENV_FILE": env_file, "PYTHONPATH": APP_DIR})
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=workdir,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=open(os.path.join(workdir, "app.log"), "w", encoding="utf-8"),
+    )
+
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"App exited during startup, see {workdir}/app.log")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("App did not become healthy in 120s")
+
+
+def build_event(fake_lc: FakeLeadConnector, contact_id: str, outbound: bool, rng: random.Random) -> dict:
+    conversation_id = fake_lc.get_conversation_id(contact_id)
+    if outbound:
+        return {
+            "type": "OutboundMessage",
+            "locationId": fake_lc.location_id,
+            "contactId": contact_id,
+            "conversationId": conversation_id,
+            "messageType": "Email",  # SMS outbound events tag the contact as agent engaged
+            "direction": "outbound",
+        }
+
+    message = fake_lc.add_inbound_message(contact_id, rng.choice(SAMPLE_LEAD_MESSAGES))
+    return {
+        "type": "InboundMessage",
+        "locationId": fake_lc.location_id,
+        "contactId": contact_id,
+        "conversationId": conversation_id,
+        "body": message["body"],
+        "contentType": "text/plain",
+        "dateAdded": datetime.now(timezone.utc).isoformat(),
+        "direction": "inbound",
+        "messageType": "SMS",
+        "status": "delivered",
+        "attachments": [],
+    }
+
+
+async def fire(
+    url: str,
+    fake_lc: FakeLeadConnector,
+    contact_ids: List[str],
+    rps: float,
+    messages: int,
+    outbound_ratio: float,
+    timeout: float,
+    seed: int,
+) -> List[dict]:
+    """Fires webhook events open loop at the given rate and returns per request results."""
+    rng = random.Random(seed)
+    results: List[dict] = []
+
+    async with httpx.AsyncClient(timeout=timeout, limits=httpx.Limits(max_connections=None)) as client:
+
+        async def send(event: dict):
+            start = time.perf_counter()
+            try:
+                response = await client.post(url, json=event)
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            results.append({"type": event["type"], "status": status, "latency_ms": (time.perf_counter() - start) * 1000})
+
+        tasks = []
+        start = time.perf_counter()
+        for i in range(messages):
+            delay = start + i / rps - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            event = build_event(fake_lc, rng.choice(contact_ids), rng.random() < outbound_ratio, rng)
+            tasks.append(asyncio.create_task(send(event)))
+        await asyncio.gather(*tasks)
+
+    return results
+
+
+def get_metric(report: dict, path: str) -> Optional[float]:
+    value = report
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def compare_to_baseline(report: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Returns the metrics that regressed by more than tolerance (a fraction) against the baseline."""
+    regressions = []
+    for metric in REGRESSION_METRICS:
+        current, previous = get_metric(report, metric), get_metric(baseline, metric)
+        if current is None or not previous:
+            continue
+        if current > previous * (1 + tolerance):
+            regressions.append(f"{metric}: {previous:.2f} -> {current:.2f} (+{(current / previous - 1) * 100:.0f}%)")
+    return regressions
+
+
+def summarize(results: List[dict], fakes: Dict[str, object], cpu_seconds: float, rss_before_kb: int, rss_after_kb: int, duration: float, args) -> dict:
+    latencies = np.array([r["latency_ms"] for r in results])
+    ok = [r for r in results if r["status"] == 200]
+    inbound = max(1, sum(1 for r in results if r["type"] == "InboundMessage"))
+
+    upstream = {}
+    for name, fake in fakes.items():
+        for endpoint, count in sorted(fake.calls.items()):
+            upstream[f"{name}.{endpoint}"] = round(count / inbound, 2)
+    upstream["total"] = round(sum(sum(fake.calls.values()) for fake in fakes.values()) / inbound, 2)
+
+    return {
+        "config": {
+            "rps": args.rps,
+            "messages": args.messages,
+            "conversations": args.conversations,
+            "history": args.history,
+            "outbound_ratio": args.outbound_ratio,
+            "openai_latency": args.openai_latency,
+            "ghl_latency": args.ghl_latency,
+            "workers": args.workers,
+        },
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "error_statuses": dict(Counter(str(r["status"]) for r in results if r["status"] != 200)),
+        "throughput_rps": round(len(results) / duration, 2),
+        "latency_ms": {
+            "p50": round(float(np.percentile(latencies, 50)), 1),
+            "p95": round(float(np.percentile(latencies, 95)), 1),
+            "p99": round(float(np.percentile(latencies, 99)), 1),
+            "max": round(float(latencies.max()), 1),
+        },
+        "upstream_calls_per_message": upstream,
+        "openai_tokens_per_message": {
+            key: round(count / inbound, 1) for key, count in sorted(fakes["azure_openai"].usage.items())
+        },
+        "app_cpu_ms_per_request": round(cpu_seconds * 1000 / max(1, len(results)), 2),
+        "app_rss_kb": {"before": rss_before_kb, "after": rss_after_kb, "per_request": round((rss_after_kb - rss_before_kb) / max(1, len(results)), 1)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Webhook load test against local stand-ins")
+    parser.add_argument("--rps", type=float, default=2.0, help="webhook events per second")
+    parser.add_argument("--messages", type=int, default=50, help="number of webhook events to send")
+    parser.add_argument("--conversations", type=int, default=20, help="number of synthetic contacts")
+    parser.add_argument("--history", type=int, default=10, help="messages already in each conversation")
+    parser.add_argument("--outbound-ratio", type=float, default=0.0, help="fraction of OutboundMessage events")
+    parser.add_argument("--openai-latency", type=float, default=0.0, help="seconds per OpenAI call")
+    parser.add_argument("--ghl-latency", type=float, default=0.0, help="seconds per LeadConnector call")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the app")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep-log", action="store_true", help="print the app log to stderr when done")
+    parser.add_argument("--save-baseline", help="write the report to this JSON file")
+    parser.add_argument("--compare", help="compare the report to this baseline JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed regression against the baseline")
+    args = parser.parse_args()
+
+    fake_lc = FakeLeadConnector(latency=args.ghl_latency, seed=args.seed)
+    fake_openai = FakeAzureOpenAI(latency=args.openai_latency, seed=args.seed)
+    fake_sheets = FakeGoogleSheets()
+    servers = [run_in_thread(fake.app) for fake in (fake_lc, fake_openai, fake_sheets)]
+    lc_server, openai_server, sheets_server = servers
+
+    contact_ids = [fake_lc.seed_contact(messages=args.history) for _ in range(args.conversations)]
+    fake_lc.seed_contact(contact_id=NOTIFY_CONTACT_ID, tags=[])
+
+    with tempfile.TemporaryDirectory(prefix="ava-load-") as workdir:
+        env_file = prepare_workdir(
+            workdir,
+            {
+                "API_KEY1": "load-test-key-1",
+                "API_KEY2": "load-test-key-2",
+                "LEADCONNECTOR_CLIENT_ID": "fake-client-id",
+                "LEADCONNECTOR_CLIENT_SECRET": "fake-client-secret",
+                "LEADCONNECTOR_API_BASE_URL": lc_server.url,
+                "AZURE_OPENAI_ENDPOINT": openai_server.url,
+                "AZURE_OPENAI_API_KEY": "fake-api-key",
+                "AZURE_OPENAI_DEPLOYMENT_NAME": "gpt-4o",
+                "GOOGLE_API_KEY": "fake-google-key",
+                "OBJ_HANDLE_SHEET_ID": fake_sheets.sheet_id,
+                "GOOGLE_SHEETS_API_BASE_URL": sheets_server.url,
+                "GOOGLE_DRIVE_API_BASE_URL": sheets_server.url,
+                "LOCAL_STORE_PATH": os.path.join(workdir, "local_store.db"),
+            },
+            fake_lc.location_id,
+        )
+        port = get_free_port()
+        app = start_app(workdir, env_file, port, args.workers)
+        try:
+            # startup traffic (location lookup, token refreshes) is not part of the measurement
+            for fake in (fake_lc, fake_openai, fake_sheets):
+                fake.calls.clear()
+                if hasattr(fake, "usage"):
+                    fake.usage.clear()
+
+            sampler = ProcessSampler(app.pid)
+            cpu_before, rss_before = sampler.cpu_seconds(), sampler.rss_kb()
+            start = time.perf_counter()
+            results = asyncio.run(
+                fire(
+                    f"http://127.0.0.1:{port}/webhook/leadconnector",
+                    fake_lc,
+                    contact_ids,
+                    args.rps,
+                    args.messages,
+                    args.outbound_ratio,
+                    args.timeout,
+                    args.seed,
+                )
+            )
+            duration = time.perf_counter() - start
+            cpu_seconds, rss_after = sampler.cpu_seconds() - cpu_before, sampler.rss_kb()
+        finally:
+            if args.keep_log:
+                with open(os.path.join(workdir, "app.log"), "r", encoding="utf-8") as file:
+                    sys.stderr.write(file.read())
+            app.terminate()
+            app.wait(timeout=10)
+            for server in servers:
+                server.stop()
+
+    report = summarize(
+        results,
+        {"leadconnector": fake_lc, "azure_openai": fake_openai, "google_sheets": fake_sheets},
+        cpu_seconds,
+        rss_before,
+        rss_after,
+        duration,
+        args,
+    )
+    print(json.dumps(report, indent=2))
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            regressions = compare_to_baseline(report, json.load(file), args.tolerance)
+        if regressions:
+            print("Regressions against baseline:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+from typing import List
+
+from llama_index.core.embeddings import MockEmbedding
+
+from ava.embeddings.cached_embedding import CachedQueryEmbedding
+from utils.local_store import LocalStore
+
+
+class CountingEmbedding(MockEmbedding):
+    queries: List[str] = []
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        self.queries.append(query)
+        return [float(len(self.queries))] * self.embed_dim
+
+
+def test_query_embeddings_are_cached_by_normalized_text():
+    """Test that recurring lead messages are only embedded once."""
+    inner = CountingEmbedding(embed_dim=4, queries=[])
+    embed_model = CachedQueryEmbedding(inner)
+
+    first = embed_model.get_query_embedding("Too expensive!")
+    assert embed_model.get_query_embedding("too   expensive") == first
+    assert embed_model.get_query_embedding("not interested") != first
+    assert inner.queries == ["Too expensive!", "not interested"]
+
+
+def test_text_embeddings_are_not_cached():
+    """Test that node embeddings go straight to the wrapped model."""
+    embed_model = CachedQueryEmbedding(CountingEmbedding(embed_dim=4, queries=[]))
+
+    assert embed_model.get_text_embedding_batch(["a", "b"]) == [[0.5] * 4, [0.5] * 4]
+    assert len(embed_model._cache) == 0
+
+
+def test_persisted_query_embeddings_survive_restarts():
+    """Test that embeddings persisted to the local store are reused by a new process."""
+    store = LocalStore(":memory:")
+    CachedQueryEmbedding(CountingEmbedding(embed_dim=4, queries=[]), store=store).get_query_embedding("ok")
+
+    inner = CountingEmbedding(embed_dim=4, queries=[])
+    assert CachedQueryEmbedding(inner, store=store).get_query_embedding("OK") == [1.0] * 4
+    assert inner.queries == []
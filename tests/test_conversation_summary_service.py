@@ -0,0 +1,81 @@
+from unittest.mock import MagicMock
+
+import pytest
+from llama_index.core.base.llms.types import ChatMessage, MessageRole
+
+from services.conversation_summary_service import SUMMARY_UPDATE_BATCH, ConversationSummaryService
+from utils.local_store import LocalStore
+
+
+def make_messages(n):
+    return [
+        ChatMessage(
+            role=MessageRole.USER if i % 2 else MessageRole.ASSISTANT,
+            content=f"message {i}",
+            additional_kwargs={"id": f"msg-{i}"},
+        )
+        for i in range(n)
+    ]
+
+
+@pytest.fixture
+def service():
+    openai_service = MagicMock()
+    openai_service.summarize_conversation.side_effect = lambda new_messages, summary=None: (
+        f"{summary or ''}|{len(new_messages)}"
+    )
+    return ConversationSummaryService(openai_service, store=LocalStore(":memory:"), recent_messages=4)
+
+
+def test_short_conversations_are_not_summarized(service):
+    """Test that conversations within the recent window are sent as is."""
+    messages = make_messages(4)
+    assert service.update("contact", messages) is None
+    assert service.get_context("contact", messages) == (None, messages)
+    service.openai_service.summarize_conversation.assert_not_called()
+
+
+def test_summary_replaces_older_messages(service):
+    """Test that the summary covers everything but the recent window."""
+    messages = make_messages(10)
+    summary = service.update("contact", messages)
+
+    assert summary.last_message_id == "msg-5"
+    assert service.get_context("contact", messages) == ("|6", messages[6:])
+
+
+def test_summary_is_updated_incrementally_in_batches(service):
+    """Test that only new messages are summarized, once a batch of them fell out of the window."""
+    messages = make_messages(10)
+    service.update("contact", messages)
+
+    # fewer than a batch of new messages, the summary is reused
+    service.update("contact", make_messages(10 + SUMMARY_UPDATE_BATCH - 1))
+    assert service.openai_service.summarize_conversation.call_count == 1
+
+    messages = make_messages(10 + SUMMARY_UPDATE_BATCH)
+    summary = service.update("contact", messages)
+    assert summary.summary == f"|6|{SUMMARY_UPDATE_BATCH}"
+    assert summary.summarized_messages == 6 + SUMMARY_UPDATE_BATCH
+
+
+def test_messages_without_ids_are_not_summarized(service):
+    """Test that conversations that cannot be keyed by message id are left alone."""
+    messages = [ChatMessage(role=MessageRole.USER, content=f"message {i}") for i in range(10)]
+    assert service.update("contact", messages) is None
+    assert service.get_context("contact", messages) == (None, messages)
+
+
+def test_summary_update_runs_in_the_background_per_channel(service, monkeypatch):
+    """Test that the scheduled update folds the messages into the summary of the contact's channel."""
+    from services.ava_service import AvaService
+
+    monkeypatch.setenv("CONVERSATION_SUMMARY_ENABLED", "true")
+    ava_service = AvaService.__new__(AvaService)
+    ava_service.summary_service = service
+    messages = make_messages(10)
+
+    ava_service.schedule_summary_update("contact", messages, channel="TYPE_SMS").result(timeout=5)
+
+    assert service.get_summary("contact:TYPE_SMS").last_message_id == "msg-5"
+    assert service.get_summary("contact:TYPE_EMAIL") is None
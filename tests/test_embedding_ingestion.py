@@ -0,0 +1,95 @@
+from typing import List
+
+import pytest
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.schema import TextNode
+
+from ava.embeddings.ingestion import RateLimitGuard, embed_nodes, embed_texts
+from config import LOCAL_STORE_EMBEDDING_NAMESPACE
+from utils.local_store import LocalStore
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+class FlakyEmbedding(MockEmbedding):
+    batches: List[List[str]] = []
+    failing_text: str = ""
+    rate_limits: int = 0
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        if self.rate_limits > 0:
+            self.rate_limits -= 1
+            raise RateLimitError("Too many requests")
+        if self.failing_text in texts:
+            raise ValueError("Bad request")
+        self.batches.append(texts)
+        return [[float(len(text))] * self.embed_dim for text in texts]
+
+
+def make_model(**kwargs):
+    return FlakyEmbedding(embed_dim=4, embed_batch_size=100, batches=[], **kwargs)
+
+
+def test_texts_are_embedded_in_batches_once():
+    """Test batching, and that duplicate texts are only embedded once."""
+    model = make_model()
+    texts = [f"text {i}" for i in range(10)] + ["text 0"]
+
+    embeddings = embed_texts(texts, model, batch_size=4, max_concurrency=2)
+
+    assert embeddings[0] == embeddings[10] == [6.0] * 4
+    assert sorted(len(batch) for batch in model.batches) == [2, 4, 4]
+
+
+def test_failed_ingestion_resumes_where_it_stopped():
+    """Test that batches done before a failure are not embedded again."""
+    store = LocalStore(":memory:")
+    texts = [f"text {i}" for i in range(8)]
+
+    with pytest.raises(ValueError):
+        embed_texts(texts, make_model(failing_text="text 7"), store=store, batch_size=4, max_attempts=1)
+
+    model = make_model()
+    embeddings = embed_texts(texts, model, store=store, batch_size=4)
+    assert model.batches == [texts[4:]]
+    assert embeddings[0] == [6.0] * 4
+
+
+def test_stored_embeddings_no_build_uses_are_pruned(monkeypatch):
+    """Test that the store keeps the embeddings the latest builds used, and drops the ones of removed texts."""
+    monkeypatch.setenv("EMBEDDING_STORE_LIMIT", "3")
+    store = LocalStore(":memory:")
+    embed_texts(["row a", "row b", "edited row"], make_model(), store=store)
+
+    model = make_model()
+    embed_texts(["row a", "row b", "edited row v2"], model, store=store)
+
+    assert model.batches == [["edited row v2"]]
+    assert len(list(store.items(LOCAL_STORE_EMBEDDING_NAMESPACE))) == 3
+    embed_texts(["row a", "row b", "edited row v2"], model, store=store)
+    assert model.batches == [["edited row v2"]]
+
+
+def test_rate_limited_batches_are_retried():
+    """Test that a rate limited batch pauses and succeeds on a later attempt."""
+    model = make_model(rate_limits=2)
+
+    embeddings = embed_texts(["a", "b"], model, rate_limit_guard=RateLimitGuard(initial_backoff=0.01))
+
+    assert embeddings == [[1.0] * 4, [1.0] * 4]
+
+
+def test_embed_nodes_skips_nodes_with_an_embedding():
+    """Test that nodes are embedded with their metadata, and only when they have no embedding."""
+    model = make_model()
+    nodes = [
+        TextNode(text="too expensive", metadata={"rebuttal": "it pays for itself"}),
+        TextNode(text="b", embedding=[0.0] * 4),
+    ]
+
+    embed_nodes(nodes, model)
+
+    assert len(model.batches) == 1 and "it pays for itself" in model.batches[0][0]
+    assert nodes[0].embedding is not None and nodes[1].embedding == [0.0] * 4
@@ -0,0 +1,60 @@
+import json
+
+import numpy as np
+import pytest
+
+from benchmarks.stubs.azure_openai import FakeAzureOpenAI
+
+
+@pytest.fixture
+def client():
+    """Fixture providing an AzureOpenAI client backed by the fake."""
+    return FakeAzureOpenAI(seed=0).client()
+
+
+def test_lead_state_and_objection_contracts(client):
+    """Test that classifier prompts get the JSON contract they expect."""
+    resp = client.chat.completions.create(
+        model="gpt-4o",
+        messages=[{"role": "user", "content": "determine lead_state\nConversation history:\nuser: can you call me tomorrow to schedule?"}],
+    )
+    assert json.loads(resp.choices[0].message.content) == {"lead_state": "READY_FOR_APPOINTMENT"}
+    assert resp.usage.total_tokens > 0
+
+    resp = client.chat.completions.create(
+        model="gpt-4o",
+        messages=[
+            {"role": "system", "content": "respond in JSON only {is_objection: true or false}"},
+            {"role": "user", "content": "That is way too expensive"},
+        ],
+    )
+    assert json.loads(resp.choices[0].message.content) == {"is_objection": True}
+
+
+def test_streaming_response(client):
+    """Test that streamed chunks join into the full JSON response."""
+    stream = client.chat.completions.create(
+        model="gpt-4o",
+        messages=[{"role": "system", "content": "Respond in JSON { response: 'your message' }"}],
+        stream=True,
+    )
+    content = "".join(chunk.choices[0].delta.content or "" for chunk in stream if chunk.choices)
+    assert "response" in json.loads(content)
+
+
+def test_embeddings_are_deterministic(client):
+    """Test that embeddings are normalised, deterministic and similar for similar texts."""
+    resp = client.embeddings.create(model="text-embedding-ada-002", input=["too expensive", "too expensive", "way too expensive", "call me"])
+    vectors = np.array([d.embedding for d in resp.data])
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0, atol=1e-5)
+    assert np.allclose(vectors[0], vectors[1])
+    assert vectors[0] @ vectors[2] > vectors[0] @ vectors[3]
+
+
+def test_rate_limit_injection():
+    """Test that injected 429s surface as RateLimitError."""
+    from openai import RateLimitError
+
+    client = FakeAzureOpenAI(rate_limit_rate=1.0, seed=0).client()
+    with pytest.raises(RateLimitError):
+        client.chat.completions.create(model="gpt-4o", messages=[{"role": "user", "content": "hi"}])
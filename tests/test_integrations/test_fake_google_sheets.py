@@ -0,0 +1,60 @@
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import pytest
+from starlette.testclient import TestClient
+
+from ava.utils import google_drive_utils
+from benchmarks.stubs.google_sheets import OBJECTION_ROWS, FakeGoogleSheets
+
+
+@pytest.fixture
+def fake(tmp_path, monkeypatch):
+    """Fixture routing the Google APIs to a fake spreadsheet, with an empty sheets cache."""
+    fake = FakeGoogleSheets()
+    client = TestClient(fake.app)
+    monkeypatch.setenv("GOOGLE_SHEETS_CACHE_DIR", str(tmp_path))
+    with patch.object(google_drive_utils, "SHEETS_API_BASE_URL", "http://testserver"), patch.object(
+        google_drive_utils, "DRIVE_API_BASE_URL", "http://testserver"
+    ), patch.object(
+        google_drive_utils.requests, "get", lambda url, params=None, timeout=None: client.get(url, params=params)
+    ):
+        yield fake
+
+
+def test_cold_load_batches_every_tab(fake):
+    """Test that all tabs are fetched with one values:batchGet request."""
+    sheets = google_drive_utils.get_google_sheets_values(fake.sheet_id, "api-key")
+
+    assert sheets[0].sheet_name == "Sheet1"
+    assert sheets[0].values[1:] == OBJECTION_ROWS
+    assert fake.calls == {"drive.files.get": 1, "sheets.get": 1, "sheets.values.batchGet": 1}
+
+
+def test_warm_load_only_checks_the_modified_time(fake):
+    """Test that the cached values are used until the spreadsheet is modified."""
+    google_drive_utils.get_google_sheets_values(fake.sheet_id, "api-key")
+    fake.calls.clear()
+
+    google_drive_utils.get_google_sheets_values(fake.sheet_id, "api-key")
+    assert fake.calls == {"drive.files.get": 1}
+
+    fake.rows = OBJECTION_ROWS[:2]
+    fake.modified_time = datetime.now(timezone.utc)
+    sheets = google_drive_utils.get_google_sheets_values(fake.sheet_id, "api-key")
+    assert sheets[0].values[1:] == OBJECTION_ROWS[:2]
+    assert fake.calls["sheets.values.batchGet"] == 1
+
+
+def test_objection_nodes_are_streamed_from_the_sheet_rows(fake, monkeypatch):
+    """Test that objection nodes are built from the row tuples, skipping rows without a rebuttal."""
+    from ava.retriever.utils import get_nodes_from_objection_handelling_sheet
+
+    monkeypatch.setenv("GOOGLE_API_KEY", "api-key")
+    monkeypatch.setenv("OBJ_HANDLE_SHEET_ID", fake.sheet_id)
+    fake.rows = OBJECTION_ROWS[:2] + [["no rebuttal yet"], ["", "orphan rebuttal"]]
+
+    nodes = get_nodes_from_objection_handelling_sheet("objections")
+
+    assert [node.text for node in nodes] == [row[0] for row in OBJECTION_ROWS[:2]]
+    assert nodes[0].metadata == {"rebuttal": OBJECTION_ROWS[0][1], "collection_name": "objections"}
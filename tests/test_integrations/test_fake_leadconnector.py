@@ -0,0 +1,60 @@
+import os
+
+import httpx
+import pytest
+
+os.environ.setdefault("LEADCONNECTOR_CLIENT_ID", "test-client-id")
+os.environ.setdefault("LEADCONNECTOR_CLIENT_SECRET", "test-client-secret")
+
+from benchmarks.stubs.leadconnector import FakeLeadConnector
+from integrations.lead_connector.models import LCMessageType
+
+
+@pytest.fixture
+def fake():
+    """Fixture providing a fake LeadConnector API with one seeded contact."""
+    return FakeLeadConnector(seed=0)
+
+
+def test_contact_and_messages_round_trip(fake):
+    """Test that LeadConnector can read a seeded contact and its conversation."""
+    contact_id = fake.seed_contact(messages=5)
+    lc = fake.lead_connector()
+
+    contact = lc.get_contact_info(contact_id)
+    assert contact.id == contact_id
+    assert "sunny" in contact.tags
+
+    conversation_id = lc.get_conversation_id(contact_id)
+    messages = lc.get_all_messages(conversation_id)
+    assert len(messages) == 5
+    assert messages == sorted(messages, key=lambda m: m.dateAdded)
+    assert messages[-1].direction == "inbound"
+    assert messages[-1].messageType == LCMessageType.TYPE_SMS
+
+
+def test_updates_and_sends_are_recorded(fake):
+    """Test that contact updates and sent messages change the fake's state."""
+    contact_id = fake.seed_contact(messages=1)
+    lc = fake.lead_connector()
+    field_id = fake.custom_field_ids["contact.lead_state"]
+
+    lc.update_contact(contact_id, {"timezone": "America/Chicago", "customFields": [{"id": field_id, "value": "cold"}]})
+    lc.send_message(contact_id=contact_id, message="Hello!", message_channel="SMS")
+
+    contact = lc.get_contact_info(contact_id)
+    assert contact.timezone == "America/Chicago"
+    assert {"id": field_id, "value": "cold"} in [f.model_dump() for f in contact.customFields]
+    assert fake.messages[fake.get_conversation_id(contact_id)][-1]["body"] == "Hello!"
+    assert fake.calls["contacts.update"] == 1
+    assert fake.calls["conversations.messages.send"] == 1
+
+
+def test_error_injection(fake):
+    """Test that injected errors surface as HTTP errors."""
+    contact_id = fake.seed_contact()
+    lc = fake.lead_connector()
+    fake.endpoint_error_rates["contacts.get"] = 1.0
+
+    with pytest.raises(httpx.HTTPStatusError):
+        lc.get_contact_info(contact_id)
@@ -0,0 +1,139 @@
+from typing import List
+
+import threading
+
+import pytest
+from llama_index.core.embeddings import MockEmbedding
+
+from ava.retriever.bm25 import BM25Index
+from ava.retriever.knowledge_base_retriever import KnowledgeBaseRetriever, KnowledgeDocument, chunk_text
+from utils.local_store import LocalStore
+
+TOPICS = ["panel warranty", "financing loan", "battery storage"]
+
+
+class TopicEmbedding(MockEmbedding):
+    """Embeds a text as a one-hot vector of the topics it mentions."""
+
+    texts: List[str] = []
+
+    def _embed(self, text: str) -> List[float]:
+        text = text.lower()
+        return [1.0 if any(word in text for word in topic.split()) else 0.0 for topic in TOPICS]
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embed(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        self.texts.append(text)
+        return self._embed(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return [self._get_text_embedding(text) for text in texts]
+
+
+DOCUMENTS = [
+    KnowledgeDocument(id="warranty", text="Our panels come with a 25 year warranty on parts and labor."),
+    KnowledgeDocument(id="financing", text="Financing: a zero down loan with terms from 10 to 25 years."),
+    KnowledgeDocument(id="battery", text="The Powerwall battery stores energy for outages."),
+]
+
+
+@pytest.fixture
+def embed_model():
+    return TopicEmbedding(embed_dim=len(TOPICS), texts=[])
+
+
+def test_bm25_ranks_documents_sharing_rare_terms_first():
+    """Test BM25 scoring and incremental removal."""
+    index = BM25Index()
+    for document in DOCUMENTS:
+        index.add(document.id, document.text)
+
+    assert index.search("what is the powerwall", top_k=3)[0][0] == "battery"
+    index.remove("battery")
+    assert index.search("what is the powerwall", top_k=3) == []
+
+
+def test_chunk_text_keeps_paragraphs_within_the_budget():
+    """Test that paragraphs are grouped up to the token budget."""
+    text = "\n\n".join(["word " * 40] * 5)
+    chunks = chunk_text(text, max_tokens=100)
+    assert len(chunks) == 3
+    assert all(chunk.count("\n\n") <= 1 for chunk in chunks)
+
+
+def test_hybrid_retrieval_fuses_keyword_and_vector_matches(embed_model):
+    """Test that a chunk found by keywords or by similarity is retrieved."""
+    retriever = KnowledgeBaseRetriever(
+        embed_model=embed_model, similarity_top_k=1, similarity_cutoff=0.5, min_keyword_score=0.5
+    )
+    retriever.ingest(DOCUMENTS)
+
+    # only BM25 knows about the Powerwall, "guarantee" matches neither ranking
+    assert retriever.retrieve("do you sell the powerwall?")[0].node.node_id == "battery#0"
+    assert retriever.retrieve("how long is the warranty")[0].node.node_id == "warranty#0"
+    assert retriever.retrieve("how long is the guarantee") == []
+
+
+def test_ingestion_is_incremental_and_persisted(embed_model):
+    """Test that only changed documents are embedded again, and the index survives restarts."""
+    store = LocalStore(":memory:")
+    retriever = KnowledgeBaseRetriever(embed_model=embed_model, store=store)
+    assert retriever.ingest(DOCUMENTS) == (3, 0, 0)
+
+    changed = DOCUMENTS[0].model_copy(update={"text": "Our panels come with a 30 year warranty."})
+    embed_model.texts.clear()
+    assert retriever.ingest([changed, DOCUMENTS[1]]) == (0, 1, 1)
+    assert embed_model.texts == [changed.text]
+
+    embed_model.texts.clear()
+    restarted = KnowledgeBaseRetriever(embed_model=embed_model, store=store)
+    assert len(restarted) == 2
+    assert embed_model.texts == []
+    assert "30 year" in restarted.retrieve("warranty")[0].node.get_content()
+
+
+def test_weak_keyword_matches_are_not_retrieved(embed_model):
+    """Test that a chunk only sharing a word with the query needs the minimum BM25 score."""
+    retriever = KnowledgeBaseRetriever(embed_model=embed_model, similarity_cutoff=0.5, min_keyword_score=1.0)
+    retriever.ingest(DOCUMENTS)
+
+    assert retriever.retrieve("who does the labor") == []
+    retriever.min_keyword_score = 0.5
+    assert retriever.retrieve("who does the labor")[0].node.node_id == "warranty#0"
+
+
+class BlockingEmbedding(TopicEmbedding):
+    """Topic embedding whose document embeddings wait until released."""
+
+    started: threading.Event
+    release: threading.Event
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        self.started.set()
+        self.release.wait(5)
+        return super()._get_text_embeddings(texts)
+
+
+def test_retrieval_uses_the_previous_index_during_an_ingestion():
+    """Test that a retrieval does not wait for an ingestion embedding new documents."""
+    embed_model = BlockingEmbedding(
+        embed_dim=len(TOPICS), texts=[], started=threading.Event(), release=threading.Event()
+    )
+    embed_model.release.set()
+    retriever = KnowledgeBaseRetriever(embed_model=embed_model, similarity_cutoff=0.5)
+    retriever.ingest(DOCUMENTS[:1])
+
+    embed_model.started.clear()
+    embed_model.release.clear()
+    ingestion = threading.Thread(target=retriever.ingest, args=(DOCUMENTS,))
+    ingestion.start()
+    assert embed_model.started.wait(5)
+
+    assert [node.node.node_id for node in retriever.retrieve("warranty")] == ["warranty#0"]
+    assert len(retriever) == 1
+
+    embed_model.release.set()
+    ingestion.join(5)
+    assert len(retriever) == 3
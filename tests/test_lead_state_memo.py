@@ -0,0 +1,73 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+from llama_index.core.base.llms.types import ChatMessage, MessageRole
+
+from services.ava_service import (
+    AvaService,
+    ContactInfo,
+    LeadState,
+    get_lead_state_fingerprint,
+    get_memoized_lead_state,
+    memoize_lead_state,
+)
+from utils.local_store import LocalStore
+
+CONTACT = ContactInfo(id="contact-1", full_name="Taylor Johnson", lead_state="interested")
+
+
+@pytest.fixture(autouse=True)
+def local_store():
+    store = LocalStore(":memory:")
+    with patch("services.ava_service.get_local_store", return_value=store):
+        yield store
+
+
+def test_fingerprint_only_depends_on_lead_messages():
+    """Test that AVA's own messages do not change the fingerprint, a new lead message does."""
+    messages = [
+        ChatMessage(role=MessageRole.ASSISTANT, content="Hi! Interested in solar?"),
+        ChatMessage(role=MessageRole.USER, content="How much does it cost?"),
+    ]
+    fingerprint = get_lead_state_fingerprint(messages)
+
+    follow_up = messages + [ChatMessage(role=MessageRole.ASSISTANT, content="Just checking in!")]
+    assert get_lead_state_fingerprint(follow_up) == fingerprint
+
+    new_inbound = messages + [ChatMessage(role=MessageRole.USER, content="Call me tomorrow")]
+    assert get_lead_state_fingerprint(new_inbound) != fingerprint
+
+
+def test_memoized_lead_state_is_reused_until_the_fingerprint_changes():
+    """Test memoization, invalidation and expiry."""
+    assert get_memoized_lead_state(CONTACT, "fp-1") is None
+
+    memoize_lead_state(CONTACT.id, "fp-1", LeadState.READY_FOR_APPOINTMENT)
+    assert get_memoized_lead_state(CONTACT, "fp-1") == LeadState.READY_FOR_APPOINTMENT
+    assert get_memoized_lead_state(CONTACT, "fp-2") is None
+
+    with patch.dict("os.environ", {"LEAD_STATE_TTL_SECONDS": "-1"}):
+        assert get_memoized_lead_state(CONTACT, "fp-1") is None
+
+
+def test_lead_state_falls_back_to_the_contact_custom_field(local_store):
+    """Test that the lead state stored in GHL is used when the local store only has the fingerprint."""
+    memoize_lead_state(CONTACT.id, "fp-1", LeadState.COLD)
+    local_store.update("contact", CONTACT.id, lead_state=None)
+
+    assert get_memoized_lead_state(CONTACT, "fp-1") == LeadState.INTERESTED
+
+
+def test_failed_classification_is_not_memoized():
+    """Test that a turn whose classification failed uses the GHL lead state and is classified again next turn."""
+    ava_service = AvaService.__new__(AvaService)
+    ava_service.openai_service = MagicMock()
+    ava_service.openai_service.determine_lead_state.return_value = None
+
+    with patch.object(ava_service, "get_analysis_model", return_value=None):
+        assert ava_service.determine_lead_state(CONTACT, [], lead_state_fingerprint="fp-1") == LeadState.INTERESTED
+        assert get_memoized_lead_state(CONTACT, "fp-1") is None
+
+        ava_service.openai_service.determine_lead_state.return_value = LeadState.WARMING_UP
+        assert ava_service.determine_lead_state(CONTACT, [], lead_state_fingerprint="fp-1") == LeadState.WARMING_UP
+        assert get_memoized_lead_state(CONTACT, "fp-1") == LeadState.WARMING_UP
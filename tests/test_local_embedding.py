@@ -0,0 +1,43 @@
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from ava.embeddings.cached_embedding import get_embedding_provider
+from ava.embeddings.local_embedding import LocalEmbedding
+
+
+class FakeSentenceTransformer:
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, batch_size, normalize_embeddings, convert_to_numpy):
+        self.calls.append((list(texts), batch_size))
+        return np.array([[float(len(text)), 0.0, 0.0] for text in texts])
+
+
+def test_local_embeddings_are_batched_and_unit_length():
+    """Test the batched encode API and the llama_index embedding methods on top of it."""
+    embed_model = LocalEmbedding(backend="sentence_transformers", embed_batch_size=8)
+    embed_model._model = FakeSentenceTransformer()
+
+    embeddings = embed_model.encode(["too expensive", "ok"])
+    assert embeddings.dtype == np.float32
+    assert np.allclose(np.linalg.norm(embeddings, axis=1), 1.0)
+    assert embed_model._model.calls == [(["too expensive", "ok"], 8)]
+
+    assert embed_model.get_query_embedding("ok") == [1.0, 0.0, 0.0]
+    assert len(embed_model.get_text_embedding_batch(["a", "b", "c"])) == 3
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        LocalEmbedding(backend="tensorflow")
+
+
+def test_embedding_provider_can_be_selected_per_purpose():
+    """Test that a retriever specific provider overrides the default one."""
+    with patch.dict("os.environ", {"EMBEDDING_PROVIDER": "azure", "KNOWLEDGE_BASE_EMBEDDING_PROVIDER": "local"}):
+        assert get_embedding_provider("knowledge_base") == "local"
+        assert get_embedding_provider("objection") == "azure"
+        assert get_embedding_provider() == "azure"
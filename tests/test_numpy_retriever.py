@@ -0,0 +1,57 @@
+from unittest.mock import MagicMock
+
+import pytest
+from llama_index.core.schema import TextNode
+
+from ava.retriever.numpy_retriever import NumpyVectorRetriever
+
+VECTORS = {
+    "too expensive": [1.0, 0.0, 0.0],
+    "not interested": [0.0, 2.0, 0.0],
+    "need to ask my wife": [0.0, 0.0, 1.0],
+}
+
+
+@pytest.fixture
+def retriever():
+    embed_model = MagicMock()
+    embed_model.get_query_embedding.side_effect = lambda query: VECTORS[query]
+    embed_model.get_text_embedding_batch.side_effect = lambda texts: [VECTORS[text] for text in texts]
+    nodes = [TextNode(text=text, metadata={"rebuttal": f"{text} rebuttal"}) for text in VECTORS]
+    return NumpyVectorRetriever(
+        nodes=nodes,
+        embed_model=embed_model,
+        collection_name="objection_handelling",
+        similarity_top_k=2,
+        embeddings=[[0.9, 0.1, 0.0], [0.0, 1.0, 0.1], [0.5, 0.0, 0.5]],
+    )
+
+
+def test_retrieve_returns_top_k_by_cosine_similarity(retriever):
+    """Test that scores are cosine similarities and nodes are sorted by them."""
+    results = retriever.retrieve("too expensive")
+
+    assert [result.node.text for result in results] == ["too expensive", "need to ask my wife"]
+    assert results[0].score == pytest.approx(0.9 / (0.82**0.5))
+    assert results[1].score == pytest.approx(0.5 / (0.5**0.5))
+
+
+def test_retrieve_batch_matches_retrieve(retriever):
+    """Test that batched queries give the same results as single queries."""
+    queries = ["not interested", "need to ask my wife"]
+    batch = retriever.retrieve_batch(queries)
+
+    for query, results in zip(queries, batch):
+        assert [r.node.node_id for r in results] == [r.node.node_id for r in retriever.retrieve(query)]
+
+
+def test_nodes_are_embedded_when_no_embeddings_are_given():
+    """Test that the nodes are embedded with their metadata, like a VectorStoreIndex does."""
+    embed_model = MagicMock()
+    embed_model.get_text_embedding_batch.side_effect = lambda texts: [[1.0, float(i)] for i in range(len(texts))]
+    node = TextNode(text="too expensive", metadata={"rebuttal": "it pays for itself"})
+
+    retriever = NumpyVectorRetriever(nodes=[node], embed_model=embed_model, collection_name="objection_handelling")
+
+    assert "it pays for itself" in embed_model.get_text_embedding_batch.call_args[0][0][0]
+    assert retriever.embeddings.shape == (1, 2)
@@ -0,0 +1,75 @@
+from unittest.mock import MagicMock
+
+import numpy as np
+
+from ava.objection_cache import ObjectionCache
+from utils.local_store import LocalStore
+from utils.text import normalize_text
+
+EMBEDDINGS = {
+    "too expensive for me": [1.0, 0.0, 0.0],
+    "its too expensive": [0.99, 0.1, 0.0],
+    "call me tomorrow": [0.0, 1.0, 0.0],
+}
+
+
+def make_embed_model():
+    embed_model = MagicMock()
+    embed_model.get_query_embedding.side_effect = lambda text: EMBEDDINGS[normalize_text(text)]
+    return embed_model
+
+
+def test_normalize_text():
+    """Test that case, punctuation and whitespace do not change the key."""
+    assert normalize_text("  It's TOO expensive!! ") == "its too expensive"
+    assert normalize_text("ok.") == normalize_text("OK")
+
+
+def test_exact_and_semantic_hits():
+    """Test both tiers, and that dissimilar messages fall through to the LLM."""
+    embed_model = make_embed_model()
+    cache = ObjectionCache(embed_model=embed_model, similarity_threshold=0.95)
+
+    assert cache.lookup("Too expensive for me") is None
+    cache.add("Too expensive for me", True)
+    # the embedding computed by the lookup is reused
+    assert embed_model.get_query_embedding.call_count == 1
+
+    assert cache.lookup("too expensive for me!") is True
+    assert cache.lookup("It's too expensive") is True
+    assert cache.lookup("Call me tomorrow") is None
+
+
+def test_labels_survive_restarts():
+    """Test that LLM labels are logged to the local store and loaded back."""
+    store = LocalStore(":memory:")
+    ObjectionCache(embed_model=make_embed_model(), store=store).add("Too expensive for me", True)
+
+    cache = ObjectionCache(embed_model=make_embed_model(), store=store)
+    assert cache.lookup("too expensive for me") is True
+    assert cache.lookup("its too expensive", embedding=np.array(EMBEDDINGS["its too expensive"])) is True
+
+
+def test_semantic_tier_evicts_the_oldest_messages():
+    """Test that the ring buffer keeps the maxsize most recent messages."""
+    cache = ObjectionCache(similarity_threshold=0.95, maxsize=2)
+    cache.add("too expensive for me", True, embedding=np.array(EMBEDDINGS["too expensive for me"]))
+    cache.add("call me tomorrow", False, embedding=np.array(EMBEDDINGS["call me tomorrow"]))
+    cache.add("not interested", True, embedding=np.array([0.0, 0.0, 1.0]))
+
+    assert len(cache) == 2
+    assert cache.lookup("its too expensive", embedding=np.array(EMBEDDINGS["its too expensive"])) is None
+    assert cache.lookup("call me tmrw", embedding=np.array(EMBEDDINGS["call me tomorrow"])) is False
+
+
+def test_label_store_is_pruned_to_the_limit():
+    """Test that only the most recent labels are kept in the local store."""
+    store = LocalStore(":memory:")
+    for i in range(5):
+        store.set("objection_label", f"message {i}", {"text": f"message {i}", "is_objection": False})
+
+    cache = ObjectionCache(store=store, label_store_limit=3)
+
+    assert [key for key, _ in store.items("objection_label")] == ["message 2", "message 3", "message 4"]
+    assert cache.lookup("message 0") is None
+    assert cache.lookup("message 4") is False
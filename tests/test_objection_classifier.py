@@ -0,0 +1,149 @@
+import json
+from unittest.mock import MagicMock
+
+import numpy as np
+from llama_index.core.base.llms.types import ChatMessage
+from llama_index.core.llms.llm import LLM
+
+from ava.objection_classifier import MIN_TRAINING_LABELS, ObjectionClassifier
+from utils.local_store import LocalStore
+
+OBJECTION = np.array([1.0, 0.2, 0.0, 0.1], dtype=np.float32)
+NOT_OBJECTION = np.array([0.1, 0.0, 1.0, 0.2], dtype=np.float32)
+
+
+def make_labels(n, seed=0):
+    rng = np.random.default_rng(seed)
+    for i in range(n):
+        is_objection = i % 2 == 0
+        center = OBJECTION if is_objection else NOT_OBJECTION
+        yield center + rng.normal(0, 0.05, size=center.shape), is_objection
+
+
+def test_untrained_classifier_abstains():
+    """Test that the LLM keeps answering until there are enough labels."""
+    classifier = ObjectionClassifier()
+    for embedding, is_objection in make_labels(MIN_TRAINING_LABELS - 1):
+        classifier.add_label(embedding, is_objection)
+
+    assert not classifier.is_trained
+    assert classifier.classify(OBJECTION)[0] is None
+
+
+def test_classifier_answers_confidently_away_from_the_boundary():
+    """Test that clear cases are answered and the boundary is left to the LLM."""
+    classifier = ObjectionClassifier(confidence=0.9)
+    for embedding, is_objection in make_labels(MIN_TRAINING_LABELS):
+        classifier.add_label(embedding, is_objection)
+    classifier.wait_for_training(timeout=10)
+
+    assert classifier.is_trained and classifier.is_trusted
+    is_objection, confidence = classifier.classify(OBJECTION)
+    assert is_objection is True and confidence >= 0.9
+    assert classifier.classify(NOT_OBJECTION)[0] is False
+    assert classifier.classify((OBJECTION + NOT_OBJECTION) / 2)[0] is None
+
+
+def test_classifier_is_trained_from_logged_labels():
+    """Test that labels logged by the objection cache are used for training."""
+    store = LocalStore(":memory:")
+    for i, (embedding, is_objection) in enumerate(make_labels(MIN_TRAINING_LABELS)):
+        store.set(
+            "objection_label",
+            f"message {i}",
+            {"text": f"message {i}", "is_objection": is_objection, "embedding": embedding.tolist()},
+        )
+
+    classifier = ObjectionClassifier()
+    classifier.load(store)
+    classifier.wait_for_training(timeout=10)
+    assert classifier.classify(OBJECTION)[0] is True
+
+
+def test_labels_without_an_embedding_model_are_azure_labels():
+    """Test that labels logged before the embedding model was recorded are only used with ada-002."""
+    store = LocalStore(":memory:")
+    for i, (embedding, is_objection) in enumerate(make_labels(MIN_TRAINING_LABELS)):
+        store.set(
+            "objection_label",
+            f"message {i}",
+            {"text": f"message {i}", "is_objection": is_objection, "embedding": embedding.tolist()},
+        )
+
+    azure = ObjectionClassifier()
+    azure.load(store, embedding_model="text-embedding-ada-002")
+    local = ObjectionClassifier()
+    local.load(store, embedding_model="BAAI/bge-small-en-v1.5")
+
+    azure.wait_for_training(timeout=10)
+    local.wait_for_training(timeout=10)
+
+    assert azure.classify(OBJECTION)[0] is True
+    assert not local.is_trained
+
+
+def test_classifier_abstains_when_inaccurate_on_held_out_labels():
+    """Test that a fit that does not generalize never answers, however confident it is."""
+    rng = np.random.default_rng(1)
+    classifier = ObjectionClassifier(confidence=0.6)
+    for _ in range(MIN_TRAINING_LABELS):
+        # more dimensions than labels and random labels, the fit memorizes noise
+        classifier.add_label(rng.normal(size=256), bool(rng.integers(2)))
+    classifier.train()
+
+    assert classifier.is_trained and not classifier.is_trusted
+    assert classifier.classify(rng.normal(size=256))[0] is None
+
+
+def test_classifier_trains_on_the_most_recent_labels():
+    """Test that the training set is a window of the latest labels."""
+    classifier = ObjectionClassifier(max_labels=MIN_TRAINING_LABELS)
+    for embedding, is_objection in make_labels(MIN_TRAINING_LABELS):
+        classifier.add_label(embedding, not is_objection)
+    for embedding, is_objection in make_labels(MIN_TRAINING_LABELS, seed=1):
+        classifier.add_label(embedding, is_objection)
+    classifier.wait_for_training(timeout=10)
+    classifier.train()
+
+    assert classifier.classify(OBJECTION)[0] is True
+
+
+def test_classifier_learns_without_the_objection_cache():
+    """Test that with the cache disabled the classifier embeds messages itself and trains on the LLM's answers."""
+    from ava.ava import is_message_an_objection
+
+    rng = np.random.default_rng(2)
+    centers = {"too expensive": OBJECTION, "sounds good": NOT_OBJECTION}
+    embed_model = MagicMock()
+    embed_model.get_query_embedding.side_effect = lambda text: centers[text] + rng.normal(0, 0.05, size=4)
+    llm = MagicMock(spec=LLM)
+    llm.chat.side_effect = lambda messages, **kwargs: MagicMock(
+        message=MagicMock(content=json.dumps({"is_objection": messages[-1].content == "too expensive"})), raw=None
+    )
+    classifier = ObjectionClassifier(embed_model=embed_model)
+
+    for i in range(MIN_TRAINING_LABELS):
+        text = "too expensive" if i % 2 == 0 else "sounds good"
+        is_message_an_objection([ChatMessage(role="user", content=text)], llm, cache=None, classifier=classifier)
+    classifier.wait_for_training(timeout=10)
+    llm.chat.reset_mock()
+
+    assert is_message_an_objection([ChatMessage(role="user", content="too expensive")], llm, classifier=classifier)
+    assert llm.chat.call_count == 0
+
+
+def test_training_replaces_the_fitted_model():
+    """Test that a training swaps in a new fitted model instead of changing the one readers hold."""
+    classifier = ObjectionClassifier()
+    for embedding, is_objection in make_labels(MIN_TRAINING_LABELS):
+        classifier.add_label(embedding, is_objection)
+    classifier.wait_for_training(timeout=10)
+    model = classifier.model
+    weights = model.weights.copy()
+
+    for embedding, is_objection in make_labels(MIN_TRAINING_LABELS, seed=1):
+        classifier.add_label(embedding, not is_objection)
+    classifier.train()
+
+    assert classifier.model is not model
+    assert np.array_equal(model.weights, weights)
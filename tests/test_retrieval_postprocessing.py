@@ -0,0 +1,60 @@
+from unittest.mock import MagicMock
+
+from llama_index.core.base.llms.types import ChatMessage
+from llama_index.core.schema import NodeWithScore, TextNode
+
+from ava.ava import add_obj_handelling_examples_to_system_messsage
+from ava.retriever.postprocessing import PostprocessingConfig, postprocess_nodes, truncate_to_token_budget
+
+
+def make_node(text, score, embedding=None):
+    node = TextNode(text=text, metadata={"rebuttal": f"{text} rebuttal"}, embedding=embedding)
+    return NodeWithScore(node=node, score=score)
+
+
+def test_nodes_below_the_cutoff_are_dropped():
+    """Test the similarity cutoff."""
+    nodes = [make_node("too expensive", 0.9), make_node("what is solar", 0.3)]
+    kept = postprocess_nodes(nodes, PostprocessingConfig(similarity_cutoff=0.5))
+    assert [node.text for node in kept] == ["too expensive"]
+
+
+def test_near_duplicates_give_way_to_diverse_nodes():
+    """Test that MMR picks a different objection over a near duplicate of the best one."""
+    nodes = [
+        make_node("too expensive", 0.90, [1.0, 0.0]),
+        make_node("its too pricey", 0.89, [0.99, 0.05]),
+        make_node("cant afford the monthly payment", 0.80, [0.6, 0.8]),
+    ]
+    kept = postprocess_nodes(nodes, PostprocessingConfig(max_nodes=2))
+    assert [node.text for node in kept] == ["too expensive", "cant afford the monthly payment"]
+
+
+def test_nodes_without_embeddings_are_deduplicated_by_text():
+    """Test deduplication of nodes returned without embeddings."""
+    nodes = [make_node("Too expensive!", 0.9), make_node("too expensive", 0.8), make_node("not now", 0.7)]
+    kept = postprocess_nodes(nodes, PostprocessingConfig(max_nodes=3))
+    assert [node.text for node in kept] == ["Too expensive!", "not now"]
+
+
+def test_token_budget():
+    """Test that entries are kept in order while they fit the budget."""
+    entries = ["short", "a much longer entry " * 20, "short again"]
+    assert truncate_to_token_budget(entries, 10) == ["short"]
+    assert truncate_to_token_budget(entries, None) == entries
+
+
+def test_only_filtered_examples_are_added_to_the_system_message():
+    """Test that examples below the cutoff do not end up in the prompt."""
+    retriever = MagicMock()
+    retriever.retrieve.return_value = [make_node("too expensive", 0.9), make_node("what is solar", 0.2)]
+
+    system_message = add_obj_handelling_examples_to_system_messsage(
+        retriever,
+        "You are AVA.",
+        ChatMessage(role="user", content="that is too expensive"),
+        PostprocessingConfig(),
+    )
+
+    assert "Objection 1: too expensive" in system_message
+    assert "what is solar" not in system_message
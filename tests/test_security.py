@@ -0,0 +1,35 @@
+import os
+
+os.environ.setdefault("API_KEY1", "test-api-key-1")
+os.environ.setdefault("API_KEY2", "test-api-key-2")
+
+from fastapi import Depends, FastAPI
+from starlette.testclient import TestClient
+
+from security import API_KEY1, get_metrics_access
+
+app = FastAPI()
+
+
+@app.get("/metrics", dependencies=[Depends(get_metrics_access)])
+def metrics():
+    return "ok"
+
+
+def test_metrics_need_the_metrics_token_or_an_api_key(monkeypatch):
+    monkeypatch.setenv("METRICS_TOKEN", "scrape-token")
+    client = TestClient(app)
+
+    assert client.get("/metrics").status_code == 403
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 403
+    assert client.get("/metrics", headers={"Authorization": "Bearer scrape-token"}).status_code == 200
+    assert client.get("/metrics", headers={"access_token": API_KEY1}).status_code == 200
+
+
+def test_metrics_without_a_metrics_token_need_an_api_key(monkeypatch):
+    """Test that without METRICS_TOKEN an empty bearer token is not accepted."""
+    monkeypatch.delenv("METRICS_TOKEN", raising=False)
+    client = TestClient(app)
+
+    assert client.get("/metrics", headers={"Authorization": "Bearer "}).status_code == 403
+    assert client.get("/metrics", headers={"access_token": API_KEY1}).status_code == 200
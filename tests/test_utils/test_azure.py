@@ -0,0 +1,84 @@
+import itertools
+import json
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceModifiedError
+
+from app.utils import azure
+
+
+class FakeBlobClient:
+    """In memory blob honouring If-Match conditions like the storage service."""
+
+    _etags = itertools.count(1)
+
+    def __init__(self):
+        self.content = None
+        self.etag = None
+        self.uploads = 0
+
+    def write(self, content: bytes) -> None:
+        self.content, self.etag = content, f'"{next(self._etags)}"'
+
+    def download_blob(self):
+        content, etag = self.content, self.etag
+        return SimpleNamespace(readall=lambda: content, properties=SimpleNamespace(etag=etag))
+
+    def upload_blob(self, data, overwrite, content_type, etag=None, match_condition=None):
+        if match_condition == MatchConditions.IfNotModified and etag != self.etag:
+            raise ResourceModifiedError("The condition specified using HTTP conditional header(s) is not met.")
+        self.uploads += 1
+        self.write(data)
+        return {"etag": self.etag}
+
+
+@pytest.fixture
+def blob():
+    blob = FakeBlobClient()
+    azure._known_blob_versions.clear()
+    with patch.object(azure, "get_blob_service_client") as get_client, patch.object(azure, "ensure_container"):
+        get_client.return_value.get_blob_client.return_value = blob
+        yield blob
+    azure._known_blob_versions.clear()
+
+
+def test_unchanged_json_is_not_uploaded_again(blob):
+    assert azure.upload_json_to_blob("conn", "container", "config.json", {"token": "a"})
+    assert azure.upload_json_to_blob("conn", "container", "config.json", {"token": "a"})
+    assert blob.uploads == 1
+
+
+def test_upload_does_not_overwrite_a_concurrent_writer(blob):
+    """Test that an upload based on a version another writer replaced fails, and the next one succeeds."""
+    assert azure.upload_json_to_blob("conn", "container", "config.json", {"token": "a"})
+    _, etag = azure.get_json_from_blob_with_etag("conn", "container", "config.json")
+    blob.write(json.dumps({"token": "from another worker"}).encode("utf-8"))
+
+    assert not azure.upload_json_to_blob("conn", "container", "config.json", {"token": "b"}, etag=etag)
+    assert json.loads(blob.content) == {"token": "from another worker"}
+
+    # after reading the other writer's version the upload goes through
+    _, etag = azure.get_json_from_blob_with_etag("conn", "container", "config.json")
+    assert azure.upload_json_to_blob("conn", "container", "config.json", {"token": "b"}, etag=etag)
+    assert json.loads(blob.content) == {"token": "b"}
+
+
+def test_stale_second_writer_in_the_same_process_fails(blob):
+    """Test that of two readers of the same version, only the first to write back succeeds."""
+    blob.write(json.dumps({"token": "a"}).encode("utf-8"))
+    first, first_etag = azure.get_json_from_blob_with_etag("conn", "container", "config.json")
+    second, second_etag = azure.get_json_from_blob_with_etag("conn", "container", "config.json")
+
+    uploaded, first_etag = azure.upload_json_to_blob_if_match(
+        "conn", "container", "config.json", {"token": "refreshed"}, etag=first_etag
+    )
+    assert uploaded and first_etag == blob.etag
+
+    assert azure.upload_json_to_blob_if_match("conn", "container", "config.json", second, etag=second_etag) == (
+        False,
+        None,
+    )
+    assert json.loads(blob.content) == {"token": "refreshed"}
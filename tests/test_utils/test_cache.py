@@ -0,0 +1,35 @@
+from unittest.mock import patch
+
+from app.utils.cache import MISSING, TTLCache
+
+
+def test_get_set_and_miss():
+    """Test hits, misses and cached None values."""
+    cache = TTLCache(maxsize=2)
+    assert cache.get("a") is MISSING
+    cache.set("a", None)
+    assert cache.get("a") is None
+    assert cache.hits == 1 and cache.misses == 1
+
+
+def test_lru_eviction():
+    """Test that the least recently used entry is evicted first."""
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+
+def test_ttl_expiry():
+    """Test that entries expire after the ttl."""
+    cache = TTLCache(ttl=10)
+    with patch("app.utils.cache.time.monotonic", return_value=100.0):
+        cache.set("a", 1)
+    with patch("app.utils.cache.time.monotonic", return_value=105.0):
+        assert cache.get("a") == 1
+    with patch("app.utils.cache.time.monotonic", return_value=111.0):
+        assert cache.get("a") is MISSING
+    assert len(cache) == 0
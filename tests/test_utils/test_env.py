@@ -0,0 +1,54 @@
+import os
+
+import pytest
+
+from app.utils import env
+
+
+@pytest.fixture
+def blob(monkeypatch):
+    """Fixture serving the env blob from a dict, bumping the ETag on every change."""
+    blob = {"content": b"", "etag": None}
+
+    def get_blob_content_if_modified(connection_string, container_name, blob_name, etag=None):
+        if etag == blob["etag"]:
+            return None, etag
+        return blob["content"], blob["etag"]
+
+    def publish(content: str):
+        blob["content"] = content.encode("utf-8")
+        blob["etag"] = str(int(blob["etag"] or 0) + 1)
+
+    monkeypatch.setattr(env, "get_blob_content_if_modified", get_blob_content_if_modified)
+    monkeypatch.setattr(env, "get_remote_env_blob_location", lambda: ("conn", "container", "env"))
+    monkeypatch.setattr(env, "_remote_env_values", {})
+    monkeypatch.setattr(env, "_remote_env_etag", None)
+    monkeypatch.setattr(env, "_remote_env_keys", set())
+    for key in ("AVA_TEST_PLATFORM", "AVA_TEST_REMOTE", "AVA_TEST_DROPPED"):
+        monkeypatch.delenv(key, raising=False)
+    return publish
+
+
+def test_refresh_keeps_variables_set_by_the_platform(blob, monkeypatch):
+    monkeypatch.setenv("AVA_TEST_PLATFORM", "platform")
+    blob("AVA_TEST_PLATFORM=blob\nAVA_TEST_REMOTE=1\n")
+    env.load_remote_env_vars()
+    assert os.environ["AVA_TEST_PLATFORM"] == "platform"
+
+    blob("AVA_TEST_PLATFORM=blob v2\nAVA_TEST_REMOTE=2\n")
+    assert env.refresh_env_vars()
+    assert os.environ["AVA_TEST_PLATFORM"] == "platform"
+    assert os.environ["AVA_TEST_REMOTE"] == "2"
+
+
+def test_refresh_unsets_variables_dropped_from_the_blob(blob):
+    blob("AVA_TEST_REMOTE=1\nAVA_TEST_DROPPED=1\n")
+    env.load_remote_env_vars()
+    assert os.environ["AVA_TEST_DROPPED"] == "1"
+
+    assert not env.refresh_env_vars()
+
+    blob("AVA_TEST_REMOTE=1\n")
+    assert env.refresh_env_vars()
+    assert "AVA_TEST_DROPPED" not in os.environ
+    assert os.environ["AVA_TEST_REMOTE"] == "1"
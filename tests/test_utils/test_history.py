@@ -0,0 +1,44 @@
+from llama_index.core.base.llms.types import ChatMessage, MessageRole
+
+from utils.history import format_history, format_message
+from utils.tokens import count_tokens
+
+
+def make_messages(n):
+    return [
+        ChatMessage(
+            role=MessageRole.USER if i % 2 else MessageRole.ASSISTANT,
+            content=f"message {i}\nabout solar panels",
+            additional_kwargs={"id": f"msg-{i}"},
+        )
+        for i in range(n)
+    ]
+
+
+def test_format_message_is_role_and_content_only():
+    """Test that enum roles, extra kwargs and newlines do not leak into the line."""
+    message = make_messages(2)[1]
+    assert format_message(message) == "user: message 1 about solar panels"
+    assert format_message(message.dict()) == "user: message 1 about solar panels"
+
+
+def test_format_history_without_budget_keeps_everything():
+    """Test the formatting of a full history with a summary."""
+    history = format_history(make_messages(3), summary="Lead asked about pricing.")
+    assert history.splitlines() == [
+        "Summary of the earlier conversation: Lead asked about pricing.",
+        "assistant: message 0 about solar panels",
+        "user: message 1 about solar panels",
+        "assistant: message 2 about solar panels",
+    ]
+
+
+def test_format_history_is_bounded_by_the_budget():
+    """Test that the history stays within the token budget however long the conversation gets."""
+    short = format_history(make_messages(10), max_tokens=200)
+    long = format_history(make_messages(2000), max_tokens=200)
+
+    assert count_tokens(long) <= 220
+    assert long.splitlines()[0].endswith("earlier messages omitted]")
+    assert long.splitlines()[-1] == "user: message 1999 about solar panels"
+    assert "omitted" not in short
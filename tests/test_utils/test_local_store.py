@@ -0,0 +1,64 @@
+import time
+from unittest.mock import patch
+
+import pytest
+
+from app.utils.local_store import LocalStore
+
+
+@pytest.fixture
+def store():
+    """Fixture providing an in-memory LocalStore."""
+    return LocalStore(":memory:")
+
+
+def test_set_and_get(store):
+    """Test that stored values round trip through JSON."""
+    store.set("contact", "abc", {"timezone": "America/Chicago"})
+    assert store.get("contact", "abc") == {"timezone": "America/Chicago"}
+    assert store.get("contact", "missing") is None
+    assert store.get("other", "abc") is None
+
+
+def test_update_merges_fields(store):
+    """Test that update merges fields into an existing value."""
+    store.update("contact", "abc", timezone="America/Chicago")
+    merged = store.update("contact", "abc", lead_state="cold")
+    assert merged == {"timezone": "America/Chicago", "lead_state": "cold"}
+    assert store.get("contact", "abc") == merged
+
+
+def test_get_respects_max_age(store):
+    """Test that values older than max_age are treated as missing."""
+    store.set("contact", "abc", {"timezone": "America/Chicago"})
+    with patch("app.utils.local_store.time.time", return_value=time.time() + 120):
+        assert store.get("contact", "abc", max_age=60) is None
+        assert store.get("contact", "abc") is not None
+
+
+def test_delete_and_items(store):
+    """Test deleting and listing values in a namespace."""
+    store.set("contact", "a", 1)
+    store.set("contact", "b", 2)
+    store.delete("contact", "a")
+    assert dict(store.items("contact")) == {"b": 2}
+
+
+def test_prune_keeps_the_most_recently_written(store):
+    for i in range(5):
+        store.set("labels", f"key-{i}", i)
+    store.set("labels", "key-0", 0)
+    store.set("other", "key", 1)
+
+    assert store.prune("labels", 2) == 3
+    assert [key for key, _ in store.items("labels")] == ["key-4", "key-0"]
+    assert store.get("other", "key") == 1
+
+
+def test_touched_values_survive_pruning(store):
+    store.set("labels", "old", 0)
+    store.set("labels", "new", 1)
+    store.touch("labels", ["old"])
+
+    assert store.prune("labels", 1) == 1
+    assert store.get("labels", "old") == 0
@@ -0,0 +1,53 @@
+import pytest
+
+from utils.cache import TTLCache
+from utils.metrics import is_metrics_enabled, record_openai_usage, render_metrics
+
+pytestmark = pytest.mark.skipif(not is_metrics_enabled(), reason="prometheus_client is not installed")
+
+
+def get_sample(name, labels):
+    from prometheus_client import REGISTRY
+
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_record_openai_usage_counts_requests_and_tokens():
+    """Test that requests and prompt/completion tokens are counted per purpose."""
+    labels = {"purpose": "test_purpose", "model": "gpt-4o"}
+    requests_before = get_sample("ava_openai_requests_total", labels)
+    prompt_before = get_sample("ava_openai_tokens_total", {**labels, "kind": "prompt"})
+
+    record_openai_usage("test_purpose", "gpt-4o", {"prompt_tokens": 120, "completion_tokens": 8})
+    record_openai_usage("test_purpose", "gpt-4o")
+
+    assert get_sample("ava_openai_requests_total", labels) == requests_before + 2
+    assert get_sample("ava_openai_tokens_total", {**labels, "kind": "prompt"}) == prompt_before + 120
+
+
+def test_named_caches_are_reported():
+    """Test that hits, misses and size of named caches show up in the rendered metrics."""
+    cache = TTLCache(name="test_metrics_cache")
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("b")
+
+    payload, content_type = render_metrics()
+
+    assert content_type.startswith("text/plain")
+    assert b'ava_cache_hits_total{cache="test_metrics_cache"} 1.0' in payload
+    assert b'ava_cache_misses_total{cache="test_metrics_cache"} 1.0' in payload
+    assert b'ava_cache_entries{cache="test_metrics_cache"} 1.0' in payload
+
+
+def test_multiprocess_mode_reads_the_metrics_directory(tmp_path, monkeypatch):
+    """Test that in multiprocess mode metrics are collected from PROMETHEUS_MULTIPROC_DIR."""
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    cache = TTLCache(name="test_multiprocess_cache")
+    cache.set("a", 1)
+
+    payload, _ = render_metrics()
+
+    # nothing was written to the empty directory, only the caches of this process are reported
+    assert b'ava_cache_entries{cache="test_multiprocess_cache"} 1.0' in payload
+    assert b"ava_openai_requests_total" not in payload
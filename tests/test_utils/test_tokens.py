@@ -0,0 +1,53 @@
+from unittest.mock import patch
+
+from utils.tokens import (
+    count_messages_tokens,
+    count_tokens,
+    get_turn_budget,
+    record_turn_usage,
+    start_turn_budget,
+    trim_messages_to_budget,
+)
+
+
+def make_messages(n):
+    return [{"role": "user" if i % 2 else "assistant", "content": f"message number {i} about solar"} for i in range(n)]
+
+
+def test_count_tokens_without_tokenizer():
+    """Test the character based estimate used when no tokenizer is available."""
+    with patch("utils.tokens.get_encoding", return_value=None):
+        assert count_tokens("") == 0
+        assert count_tokens("a" * 10) == 3
+
+
+def test_trim_keeps_most_recent_messages():
+    """Test that trimming drops the oldest messages first and keeps the order."""
+    messages = make_messages(20)
+    budget = count_messages_tokens(messages[-5:])
+
+    trimmed = trim_messages_to_budget(messages, budget)
+
+    assert trimmed == messages[-5:]
+    assert trim_messages_to_budget(messages, None) is messages
+
+
+def test_trim_always_keeps_last_message():
+    """Test that the latest message is kept even if it alone exceeds the budget."""
+    messages = make_messages(3)
+    assert trim_messages_to_budget(messages, 1) == messages[-1:]
+
+
+def test_turn_budget_accounting():
+    """Test that usage is recorded against the current turn only."""
+    record_turn_usage("chat", 100, 10)  # no turn, ignored
+
+    with start_turn_budget(limit=500) as budget:
+        assert get_turn_budget() is budget
+        record_turn_usage("lead_state", 300, 5)
+        record_turn_usage("chat", 100, 20)
+        assert budget.usage.total_tokens == 425
+        assert budget.usage.by_purpose == {"lead_state": 305, "chat": 120}
+        assert budget.can_afford(75) and not budget.can_afford(76)
+
+    assert get_turn_budget() is None
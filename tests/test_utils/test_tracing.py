@@ -0,0 +1,64 @@
+import pytest
+
+from app.utils.tracing import SpanExporter, format_waterfall, get_current_span, set_exporter, start_span, traced
+
+
+class RecordingExporter(SpanExporter):
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+
+@pytest.fixture
+def exporter():
+    exporter = RecordingExporter()
+    set_exporter(exporter)
+    yield exporter
+    set_exporter(None)
+
+
+def test_spans_nest_and_root_is_exported(exporter):
+    """Test that nested spans become children and only the root span is exported."""
+
+    @traced("inner")
+    def inner():
+        return get_current_span().name
+
+    with start_span("turn", contact_id="abc") as root:
+        with start_span("stage"):
+            assert inner() == "inner"
+
+    assert get_current_span() is None
+    assert exporter.spans == [root]
+    assert root.attributes == {"contact_id": "abc"}
+    assert [child.name for child in root.children] == ["stage"]
+    assert [child.name for child in root.children[0].children] == ["inner"]
+
+
+def test_error_is_recorded_and_reraised(exporter):
+    """Test that a failing stage is marked with the exception type."""
+    with pytest.raises(ValueError):
+        with start_span("turn"):
+            with start_span("stage"):
+                raise ValueError("boom")
+
+    root = exporter.spans[0]
+    assert root.error == "ValueError"
+    assert root.children[0].error == "ValueError"
+    assert "!ValueError" in format_waterfall(root)
+
+
+def test_waterfall_has_a_line_per_span(exporter):
+    """Test the waterfall rendering."""
+    with start_span("turn") as root:
+        with start_span("fetch_contact"):
+            pass
+        with start_span("engage_ava"):
+            with start_span("llm.chat"):
+                pass
+
+    lines = format_waterfall(root).splitlines()
+    assert [line.split()[0] for line in lines] == ["turn", "fetch_contact", "engage_ava", "llm.chat"]
+    assert lines[3].startswith("    llm.chat")
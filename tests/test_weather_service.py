@@ -0,0 +1,72 @@
+import threading
+import time
+
+import httpx
+
+from services import ava_service, geocoding_service, weather_service
+from services.geocoding_service import geocode_cache
+from services.weather_service import AsyncWeatherService, weather_cache
+
+
+def test_slow_geocode_does_not_outlive_the_latency_budget(monkeypatch):
+    """Test that a geocode still running after the budget does not hold up the caller."""
+    geocode_timeouts = []
+    release = threading.Event()
+
+    def slow_geocode(city, timeout):
+        geocode_timeouts.append(timeout)
+        release.wait(5)
+        return None
+
+    monkeypatch.setattr(weather_service, "get_city_coordinates_within", slow_geocode)
+    service = AsyncWeatherService("api-key", latency_budget=0.2)
+
+    start = time.perf_counter()
+    assert service.get_weather_by_city_sync("Springfield") is None
+    elapsed = time.perf_counter() - start
+    release.set()
+
+    assert elapsed < 1.0
+    assert geocode_timeouts == [0.2]
+
+
+def test_weather_is_fetched_with_the_shared_client_and_cached(monkeypatch):
+    """Test a lookup within the budget, and that the observation is cached per grid cell."""
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200, json={"current": {"temp": 71.5, "weather": [{"description": "clear sky"}]}})
+
+    weather_cache.clear()
+    monkeypatch.setattr(weather_service, "get_city_coordinates_within", lambda city, timeout: (41.88, -87.63))
+    service = AsyncWeatherService("api-key", client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    expected = {"description": "clear sky", "temperature": 71.5}
+    assert service.get_weather_by_city_sync("Chicago") == expected
+    assert service.get_weather_by_city_sync("Chicago") == expected
+    assert len(requests) == 1
+    assert requests[0].url.params["lat"] == "41.9"
+
+
+def test_timezone_and_weather_lookups_share_the_geocode(monkeypatch):
+    """Test that the timezone resolver and the weather service geocode a city once between them."""
+    geocodes = []
+
+    class FakeGeolocator:
+        def geocode(self, city, **kwargs):
+            geocodes.append((city, kwargs.get("country_codes")))
+            return type("Location", (), {"latitude": 30.27, "longitude": -97.74})()
+
+    geocode_cache.clear()
+    weather_cache.clear()
+    monkeypatch.setattr(geocoding_service, "get_geolocator", FakeGeolocator)
+    monkeypatch.setattr(ava_service, "get_timezone_by_coordinates", lambda lat, lon: "America/Chicago")
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={"current": {"temp": 90.0, "weather": [{"description": "sunny"}]}})
+
+    service = AsyncWeatherService("api-key", client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    assert ava_service.get_timezone_by_city("Austin") == "America/Chicago"
+    assert service.get_weather_by_city_sync("Austin") == {"description": "sunny", "temperature": 90.0}
+    assert geocodes == [("Austin", "US")]